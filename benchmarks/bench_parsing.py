@@ -0,0 +1,38 @@
+"""Benchmarks of the card parsing hot paths: bundle parsing, metainfo decoding and issue mode validation."""
+
+from copy import copy
+
+import pytest
+
+from pypeerassets.protocol import IssueMode, validate_card_issue_modes
+from pypeerassets.pautils import card_bundle_parser, read_tx_opreturn, parse_card_transfer_metainfo
+
+
+def parse_bundles(bundles):
+    return [card for bundle in bundles for card in card_bundle_parser(bundle)]
+
+
+def test_card_bundle_parser(benchmark, chain):
+    raw_txes = chain.raw_txes("pa")
+    # the bundles are consumed by card_bundle_parser, so they're created for each round outside the measurement.
+    cards = benchmark.pedantic(parse_bundles, setup=lambda: ((chain.bundles("pa", raw_txes),), {}), rounds=5)
+
+    assert len(cards) >= len(raw_txes)
+
+
+def test_read_and_parse_metainfo(benchmark, chain):
+    vouts = [tx["vout"][1] for tx in chain.raw_txes("pa")]
+    version = chain.decks["pa"].version
+
+    def parse_metainfo():
+        return [parse_card_transfer_metainfo(read_tx_opreturn(vout), version) for vout in vouts]
+
+    metainfo = benchmark(parse_metainfo)
+    assert len(metainfo) == len(vouts)
+
+
+@pytest.mark.parametrize("issue_mode", [IssueMode.ONCE, IssueMode.MULTI, IssueMode.MONO, IssueMode.UNFLUSHABLE, IssueMode.SINGLET])
+def test_validate_card_issue_modes(benchmark, chain, issue_mode):
+    cards = chain.cards("pa")
+    # some parsers (e.g. MONO) modify the cards, so each round gets copies.
+    benchmark.pedantic(validate_card_issue_modes, setup=lambda: ((issue_mode.value, [copy(c) for c in cards]), {}), rounds=5)
@@ -0,0 +1,60 @@
+"""Benchmarks of the state calculations: DeckState, the AT and DT parsers and the donation states of proposals."""
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.protocol import DeckState
+from pypeerassets.at.at_parser import at_parser
+
+
+@pytest.mark.parametrize("deck_name", ["pa", "locks"])
+def test_deckstate(benchmark, chain, deck_name):
+    cards = chain.valid_cards(deck_name)
+    state = benchmark(DeckState, cards)
+
+    expected = chain.generator.balances[chain.decks[deck_name].id]
+    assert all(state.balances.get(address, 0) == balance for address, balance in expected.items())
+
+
+def test_at_parser(benchmark, chain):
+    deck = chain.decks["at"]
+    cards = chain.cards("at")
+    valid_cards = benchmark(at_parser, cards, chain.provider, deck)
+
+    assert len(valid_cards) == len(cards)
+
+
+def test_dt_parser(benchmark, chain):
+    # end-to-end: card discovery, bundle parsing, dt_parser (including the ProposalStates) and DeckState.
+    deck = chain.decks["dt"]
+
+    def dt_deckstate():
+        return DeckState(pa.find_all_valid_cards(chain.provider, deck))
+
+    state = benchmark.pedantic(dt_deckstate, rounds=3)
+    expected = chain.generator.balances[deck.id]
+    assert all(state.balances.get(address, 0) == balance for address, balance in expected.items())
+
+
+def test_set_donation_states(benchmark, chain):
+
+    def set_donation_states(pst):
+        for proposal_state in pst.proposal_states.values():
+            proposal_state.set_donation_states(pst.current_blockheight)
+        return pst
+
+    # the ProposalStates are modified by set_donation_states, so each round gets a new ParserState.
+    pst = benchmark.pedantic(set_donation_states, setup=lambda: ((chain.dt_parser_state(),), {}), rounds=5)
+    assert all(len(p.donation_states[0]) > 0 for p in pst.proposal_states.values())
+
+
+def test_locks_end_to_end(benchmark, chain):
+    # lock-heavy deck from card discovery to DeckState, including all network and PA parameter lookups.
+    deck = chain.decks["locks"]
+
+    def locks_deckstate():
+        return DeckState(pa.find_all_valid_cards(chain.provider, deck))
+
+    state = benchmark.pedantic(locks_deckstate, rounds=3)
+    expected = chain.generator.balances[deck.id]
+    assert all(state.balances.get(address, 0) == balance for address, balance in expected.items())
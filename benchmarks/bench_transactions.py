@@ -0,0 +1,31 @@
+"""Benchmarks of transaction building and signing."""
+
+from decimal import Decimal
+
+import pypeerassets as pa
+from pypeerassets.transactions import sign_transaction, sign_transactions
+
+
+def card_transfer_tx(chain, key, receivers=10):
+    deck = chain.decks["pa"]
+    card = pa.CardTransfer(deck=deck, receiver=chain.generator.addresses[:receivers], amount=[100] * receivers)
+    inputs = chain.provider.select_inputs(key.address, Decimal("9.5"))
+    return pa.card_transfer(chain.provider, card, inputs, key.address)
+
+
+def test_card_transfer_building(benchmark, chain, funded_key):
+    unsigned = benchmark(card_transfer_tx, chain, funded_key)
+    assert len(unsigned.ins) == 10
+
+
+def test_card_transfer_signing(benchmark, chain, funded_key):
+    unsigned = card_transfer_tx(chain, funded_key)
+    signed = benchmark(sign_transaction, chain.provider, unsigned, funded_key)
+    assert len(signed.ins) == 10
+
+
+def test_bulk_signing(benchmark, chain, funded_key):
+    # prefetch of all parent outputs, then sequential signing.
+    unsigned_txes = [card_transfer_tx(chain, funded_key, receivers=1) for i in range(10)]
+    signed = benchmark(sign_transactions, chain.provider, unsigned_txes, funded_key)
+    assert len(signed) == 10
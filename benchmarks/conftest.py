@@ -0,0 +1,103 @@
+"""Fixtures for the pytest-benchmark suite (benchmarks/bench_*.py).
+All benchmarks run on a synthetic chain generated by pypeerassets.chain_generator, so no client daemon is needed.
+
+Usage: python -m pytest benchmarks [--bench-size N] [--bench-seed S]
+--bench-size is the number of card transfers of the PA decks (default: 10000); the AT donations
+and DT proposals scale with it. The results of each run are stored as JSON in .benchmarks/
+(named after the current commit, see pytest.ini). Runs can be compared with
+--benchmark-compare[=NUM] and --benchmark-compare-fail=mean:10%, or with pytest-benchmark compare."""
+
+import sys
+import os
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pypeerassets as pa
+from pypeerassets.pautils import ProviderCache
+from pypeerassets.__main__ import find_card_txes, card_bundler
+from pypeerassets.at.dt_parser_state import ParserState
+
+from pypeerassets.chain_generator import ChainGenerator
+
+
+def pytest_addoption(parser):
+    parser.addoption("--bench-size", type=int, default=10000, help="number of card transfers of the synthetic PA decks")
+    parser.addoption("--bench-seed", type=int, default=0, help="seed of the synthetic chain")
+
+
+class BenchChain(object):
+    """The synthetic chain with its decks: "pa" (transfers without locks), "locks" (transfers, 20% of them locks),
+       "at" (donations and issuances), "sdp" and "dt" (proposals with donations and claims)."""
+
+    def __init__(self, size: int, seed: int) -> None:
+
+        generator = ChainGenerator(seed=seed)
+        self.generator = generator
+        self.provider = generator.provider
+        self.decks = {"pa" : generator.spawn_deck("bench_pa"),
+                      "locks" : generator.spawn_deck("bench_locks"),
+                      "at" : generator.spawn_at_deck("bench_at"),
+                      "sdp" : generator.spawn_deck("bench_sdp")}
+        self.decks["dt"] = generator.spawn_dt_deck("bench_dt", self.decks["sdp"])
+        generator.mine()
+
+        generator.issue_cards(self.decks["sdp"], generator.addresses[:50], [10 ** 8] * 50)
+        generator.mine()
+
+        generator.add_card_transfers(self.decks["pa"], size)
+        generator.add_card_transfers(self.decks["locks"], size, lock_ratio=0.2)
+        generator.add_at_donations(self.decks["at"], max(size // 100, 10))
+
+        epoch_length = self.decks["dt"].epoch_length
+        for i in range(max(size // 2500, 2)):
+            generator.add_proposal(self.decks["dt"], height=epoch_length * (1 + i // 2) + i % 2,
+                                   locking_donors=4, direct_donors=4, max_voters=20)
+
+        generator.run()
+        self.cache = ProviderCache(self.provider)
+
+    def raw_txes(self, deck_name: str) -> list:
+        return list(find_card_txes(self.provider, self.decks[deck_name]))
+
+    def bundles(self, deck_name: str, raw_txes: list=None) -> list:
+        """CardBundles of the deck. card_bundle_parser consumes the bundles, so a new list is needed for each run."""
+
+        deck = self.decks[deck_name]
+        if raw_txes is None:
+            raw_txes = self.raw_txes(deck_name)
+        return [card_bundler(self.provider, deck, tx, cache=self.cache) for tx in raw_txes]
+
+    def cards(self, deck_name: str) -> list:
+        """All cards of the deck, before validation."""
+        return [card for bundle in self.bundles(deck_name) for card in pa.pautils.card_bundle_parser(bundle)]
+
+    def valid_cards(self, deck_name: str) -> list:
+        return list(pa.find_all_valid_cards(self.provider, self.decks[deck_name]))
+
+    def dt_parser_state(self) -> ParserState:
+        """Initialized ParserState of the DT deck, with the ProposalStates and their tracked transactions.
+           The donation states are not set yet; set_donation_states can only be called once per ProposalState."""
+
+        deck = self.decks["dt"]
+        pst = ParserState(deck, self.cards("dt"), self.provider, current_blockheight=self.provider.getblockcount())
+        pst.init_parser()
+        return pst
+
+
+@pytest.fixture(scope="session")
+def chain(request):
+    return BenchChain(request.config.getoption("--bench-size"), request.config.getoption("--bench-seed"))
+
+
+@pytest.fixture(scope="session")
+def funded_key(chain):
+    """Kutil with 100 UTXOs of 1 coin, so transactions with several inputs can be built and signed."""
+
+    key = pa.Kutil(network=chain.provider.network, from_string="benchmark")
+    for i in range(100):
+        chain.generator.pay(key.address, Decimal(1))
+    chain.generator.mine()
+    return key
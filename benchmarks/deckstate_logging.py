@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the debug output overhead of DeckState.
+Calculates the DeckState of a synthetic deck with many locks (see pypeerassets.chain_generator), with debug disabled
+and with debug enabled. In the debug run the log records are formatted but discarded,
+so only the cost of producing them is measured.
+Usage: python benchmarks/deckstate_logging.py [number_of_transfers] [rounds] (default: 5000, 5). Needs no client daemon."""
+
+import sys
+import os
+import io
+import logging
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pypeerassets as pa
+from pypeerassets.protocol import DeckState
+
+from pypeerassets.chain_generator import ChainGenerator
+
+
+class DiscardHandler(logging.Handler):
+    """Formats the records (like a real handler) without writing them."""
+
+    def emit(self, record):
+        self.format(record)
+
+
+def best_time(function, rounds: int) -> float:
+
+    times = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+
+    n_transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    generator = ChainGenerator()
+    deck = generator.spawn_deck("locks")
+    generator.add_card_transfers(deck, n_transfers, lock_ratio=0.1)
+    generator.run()
+    cards = list(pa.find_all_valid_cards(generator.provider, deck))
+    print("Cards:", len(cards))
+
+    print("debug=False: {:.4f} s".format(best_time(lambda: DeckState(cards), rounds)))
+
+    logger = logging.getLogger("pypeerassets")
+    logger.addHandler(DiscardHandler())
+    logger.setLevel(logging.DEBUG)
+    with redirect_stdout(io.StringIO()): # print based debug output
+        debug_time = best_time(lambda: DeckState(cards, debug=True), rounds)
+    print("debug=True:  {:.4f} s".format(debug_time))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""Memory benchmark: full TrackedTransactions vs. compact TrackedTxRecords.
+Creates N copies (with distinct txids) of the dummy DT transactions used in the unit tests
+and measures the memory held by the resulting objects with tracemalloc.
+The JSON of each tx is decoded inside the measurement and then discarded, as in the parser,
+so all memory still referenced by the objects is counted.
+Usage: python benchmarks/ttx_memory.py [number_of_txes] (default: 100000). Needs no client daemon."""
+
+import sys
+import os
+import json
+import time
+import tracemalloc
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pypeerassets.at.ttx_base import BaseTrackedTransaction
+from pypeerassets.at.ttx_record import TrackedTxRecord
+
+DUMMY_TXES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test", "dt_dummy_txes.json")
+
+
+class BlockProvider:
+    """Only provides what the TrackedTransaction constructor needs."""
+
+    network = "tslm"
+
+    def getblock(self, blockhash):
+        return {"height" : 100} # no tx list: blockseq is not needed here
+
+
+def get_tx_jsons(number):
+
+    with open(DUMMY_TXES, "r") as dummyfile:
+        templates = json.load(dummyfile)
+
+    tx_jsons = []
+    for n in range(number):
+        tx_json = deepcopy(templates[n % len(templates)])
+        tx_json["txid"] = "{:064x}".format(n)
+        tx_jsons.append(json.dumps(tx_json))
+    return tx_jsons
+
+def measure(label, constructor, tx_jsons):
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    objects = [constructor(json.loads(j)) for j in tx_jsons]
+    elapsed = time.perf_counter() - start_time
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{}: {} objects, {:.1f} MB held, {:.1f} MB peak, {:.1f} bytes/tx, {:.2f} s".format(label, len(objects), size / 1e6, peak / 1e6, size / len(objects), elapsed))
+    return size
+
+def main():
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tx_jsons = get_tx_jsons(number)
+    provider = BlockProvider()
+
+    record_size = measure("TrackedTxRecord", TrackedTxRecord.from_json, tx_jsons)
+    full_size = measure("BaseTrackedTransaction", lambda j: BaseTrackedTransaction.from_json(j, provider=provider), tx_jsons)
+    print("Ratio: {:.2f}".format(full_size / record_size))
+
+if __name__ == "__main__":
+    main()
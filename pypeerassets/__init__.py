@@ -1,10 +1,16 @@
 from pypeerassets.kutil import Kutil
 from pypeerassets.__main__ import (deck_parser,
                                    find_all_valid_cards,
+                                   find_all_valid_cards_multi,
+                                   get_deckstates,
                                    find_all_valid_decks,
                                    find_deck,
                                    deck_spawn,
                                    deck_transfer,
                                    get_card_bundles,
-                                   card_transfer)
+                                   card_transfer,
+                                   bulk_card_transfer,
+                                   pack_card_transfers)
 from pypeerassets.protocol import Deck, CardTransfer, DeckState
+from pypeerassets.indexer import DeckIndexer
+from pypeerassets.blockscan import BlockScan, BlockScanProvider
@@ -7,25 +7,37 @@ from typing import Iterator, Generator, Optional
 from pypeerassets.protocol import (Deck,
                                    CardBundle,
                                    CardTransfer,
+                                   DeckState,
                                    validate_card_issue_modes
                                    )
 
-from pypeerassets.provider import Provider, RpcNode
+from pypeerassets.provider import Provider, RpcNode, UtxoSet
+from pypeerassets.blockscan import BlockScanProvider
 
 from pypeerassets.pautils import (deck_parser,
                                   find_deck_spawns,
                                   card_bundle_parser,
                                   tx_serialization_order,
-                                  find_tx_sender
+                                  find_tx_sender,
+                                  ProviderCache
                                   )
 
-from pypeerassets.exceptions import EmptyP2THDirectory
+from pypeerassets.exceptions import EmptyP2THDirectory, OverSizeOPReturn, RecieverAmountMismatch
 
 from pypeerassets.transactions import (nulldata_script, tx_output,
                                        p2pkh_script,
                                        make_raw_transaction,
                                        Transaction,
-                                       Locktime)
+                                       TxOut,
+                                       Locktime,
+                                       prefetch_parent_outputs,
+                                       sign_transaction,
+                                       estimate_tx_size,
+                                       estimate_output_size,
+                                       estimate_tx_fee,
+                                       varint_size,
+                                       MAX_STANDARD_TX_SIZE)
+from pypeerassets.kutil import Kutil
 
 from pypeerassets.pa_constants import param_query
 from pypeerassets.networks import net_query
@@ -48,7 +60,10 @@ def find_all_valid_decks(provider: Provider, deck_version: int,
     else:
         p2th = pa_params.test_P2TH_addr
 
-    if isinstance(provider, RpcNode):
+    if isinstance(provider, BlockScanProvider):
+        deck_spawns = provider.block_scan.get_txes(p2th)
+
+    elif isinstance(provider, RpcNode):
         deck_spawns = (provider.getrawtransaction(i, 1)
                        for i in find_deck_spawns(provider))
 
@@ -146,29 +161,40 @@ def deck_transfer(provider: Provider, deck: Deck,
     raise NotImplementedError
 
 
-def card_bundler(provider: Provider, deck: Deck, tx: dict) -> CardBundle:
+def card_bundler(provider: Provider, deck: Deck, tx: dict, cache: ProviderCache=None) -> CardBundle:
     '''each blockchain transaction can contain multiple cards,
-       wrapped in bundles. This method finds and returns those bundles.'''
+       wrapped in bundles. This method finds and returns those bundles.
+       With a ProviderCache, block and sender lookups are shared with other bundles.'''
+
+    if cache is not None:
+        blockseq = cache.tx_serialization_order(tx["blockhash"], tx["txid"])
+        blocknum = cache.block_height(tx["blockhash"])
+        sender = cache.find_tx_sender(tx)
+    else:
+        blockseq = tx_serialization_order(provider, tx["blockhash"], tx["txid"])
+        blocknum = provider.getblock(tx["blockhash"], decode=True)["height"]
+        sender = find_tx_sender(provider, tx)
 
     return CardBundle(deck=deck,
                       blockhash=tx['blockhash'],
                       txid=tx['txid'],
                       timestamp=tx['time'],
-                      blockseq=tx_serialization_order(provider,
-                                                      tx["blockhash"],
-                                                      tx["txid"]),
-                      blocknum=provider.getblock(tx["blockhash"], decode=True)["height"],
-                      sender=find_tx_sender(provider, tx),
+                      blockseq=blockseq,
+                      blocknum=blocknum,
+                      sender=sender,
                       vouts=tx['vout'],
                       tx_confirmations=tx['confirmations']
                       ) ### BUGFIX ###
 
 
-def find_card_bundles(provider: Provider, deck: Deck) -> Optional[Iterator]:
-    '''each blockchain transaction can contain multiple cards,
-       wrapped in bundles. This method finds and returns those bundles.'''
+def find_card_txes(provider: Provider, deck: Deck) -> Iterator:
+    '''finds the raw transactions sent to the P2TH address of the deck.'''
+
+    if isinstance(provider, BlockScanProvider):
+        # only confirmed txes are scanned, so no filtering is necessary.
+        raw_txns = provider.block_scan.get_txes(deck.p2th_address)
 
-    if isinstance(provider, RpcNode):
+    elif isinstance(provider, RpcNode):
         if deck.id is None:
             raise Exception("deck.id required to listtransactions")
 
@@ -193,7 +219,14 @@ def find_card_bundles(provider: Provider, deck: Deck) -> Optional[Iterator]:
         except TypeError:
             raise EmptyP2THDirectory({'error': 'No cards found on this deck.'})
 
-    return (card_bundler(provider, deck, i) for i in raw_txns)
+    return raw_txns
+
+
+def find_card_bundles(provider: Provider, deck: Deck) -> Optional[Iterator]:
+    '''each blockchain transaction can contain multiple cards,
+       wrapped in bundles. This method finds and returns those bundles.'''
+
+    return (card_bundler(provider, deck, i) for i in find_card_txes(provider, deck))
 
 
 def get_card_bundles(provider: Provider, deck: Deck) -> Generator:
@@ -231,65 +264,262 @@ def find_all_valid_cards(provider: Provider, deck: Deck) -> Generator:
         yield card
 
 
-def card_transfer(provider: Provider, card: CardTransfer, inputs: dict,
-                  change_address: str, locktime: int=0) -> Transaction:
+def find_all_valid_cards_multi(provider: Provider, decks: list, cache: ProviderCache=None) -> dict:
+    '''find all the valid cards of several decks at once.
+       Block and sender lookups (and transactions found in several decks) are shared between the decks.
+       Returns a dict: deck id -> list of valid cards.'''
 
-    '''Prepare the CardTransfer Transaction object
+    if cache is None:
+        cache = ProviderCache(provider)
 
-       : card - CardTransfer object
-       : inputs - utxos (has to be owned by deck issuer)
-       : change_address - address to send the change to
-       : locktime - tx locked until block n=int
-       '''
+    valid_cards = {}
+    for deck in decks:
+        raw_txns = [tx for tx in find_card_txes(provider, deck) if "blockhash" in tx]
+        cache.add_txes(raw_txns)
 
-    network_params = net_query(provider.network)
-    pa_params = param_query(provider.network)
+        unfiltered = (card for tx in raw_txns
+                      for card in card_bundle_parser(card_bundler(provider, deck, tx, cache=cache)))
+
+        valid_cards.update({deck.id : list(validate_card_issue_modes(deck.issue_mode, list(unfiltered), provider, deck))})
+
+    return valid_cards
+
+
+def get_deckstates(provider: Provider, decks: list, cache: ProviderCache=None, debug: bool=False) -> dict:
+    '''calculates the DeckStates of several decks, parsing them together with find_all_valid_cards_multi.
+       Returns a dict: deck id -> DeckState.'''
+
+    valid_cards = find_all_valid_cards_multi(provider, decks, cache=cache)
+    return {deckid : DeckState(cards, debug=debug) for deckid, cards in valid_cards.items()}
+
+
+def _min_output_value(network_params: object) -> Decimal:
 
     ### LEGACY SUPPORT for blockchains where no 0-value output is permitted ###
     from pypeerassets.legacy import is_legacy_blockchain
 
     if is_legacy_blockchain(network_params.shortname, "nulldata"):
-        min_value = network_params.min_tx_fee
+        return network_params.min_tx_fee
     else:
-        min_value = Decimal(0)
+        return Decimal(0)
+
 
+def _card_transfer_outputs(network: str, card: CardTransfer, min_value: Decimal) -> list:
+    # P2TH, OP_RETURN and receiver outputs of a CardTransfer transaction.
+    # network is resolved by the caller, as provider.network is a RPC call in some providers.
+
+    pa_params = param_query(network)
 
     if card.deck_p2th is None:
         raise Exception("card.deck_p2th required for tx_output")
 
     outs = [
-        tx_output(network=provider.network,
+        tx_output(network=network,
                   value=pa_params.P2TH_fee,
                   n=0, script=p2pkh_script(address=card.deck_p2th,
-                                           network=provider.network)),  # deck p2th
-        tx_output(network=provider.network,
-                  value=min_value, n=1,
-                  script=nulldata_script(card.metainfo_to_protobuf))  # op_return
+                                           network=network)),  # deck p2th
+        _op_return_output(network, card, min_value)
     ]
 
     for addr, index in zip(card.receiver, range(len(card.receiver))):
         outs.append(   # TxOut for each receiver, index + 2 because we have two outs already
-            tx_output(network=provider.network, value=min_value, n=index+2,
-                      script=p2pkh_script(address=addr,
-                                          network=provider.network))
+            _receiver_output(network, addr, min_value, index + 2)
         )
 
+    return outs
+
+
+def _op_return_output(network: str, card: CardTransfer, min_value: Decimal) -> TxOut:
+
+    return tx_output(network=network, value=min_value, n=1,
+                     script=nulldata_script(card.metainfo_to_protobuf))
+
+
+def _receiver_output(network: str, address: str, min_value: Decimal, n: int) -> TxOut:
+
+    return tx_output(network=network, value=min_value, n=n,
+                     script=p2pkh_script(address=address, network=network))
+
+
+def card_transfer_fee(provider: Provider, card: CardTransfer, n_inputs: int=1, outs: list=None, network: str=None) -> Decimal:
+
+    '''Estimated fee of the CardTransfer transaction with n_inputs P2PKH inputs and a change output.
+       It's min_tx_fee per started kB of the signed transaction (see transactions.estimate_tx_fee).
+       network can be given to avoid the lookup of provider.network, which is a RPC call in some providers.'''
+
+    if network is None:
+        network = provider.network
+    network_params = net_query(network)
+
+    if outs is None:
+        outs = _card_transfer_outputs(network, card, _min_output_value(network_params))
+
+    # the change output is a P2PKH output like the P2TH output.
+    change_output = outs[0]
+    tx_size = estimate_tx_size(network, ["p2pkh"] * n_inputs, outs + [change_output])
+
+    return Decimal(estimate_tx_fee(tx_size, network)) / network_params.to_unit
+
+
+def card_transfer(provider: Provider, card: CardTransfer, inputs: dict,
+                  change_address: str, locktime: int=0, network: str=None) -> Transaction:
+
+    '''Prepare the CardTransfer Transaction object
+
+       : card - CardTransfer object
+       : inputs - utxos (has to be owned by deck issuer)
+       : change_address - address to send the change to
+       : locktime - tx locked until block n=int
+       : network - network name, to avoid the lookup of provider.network (a RPC call in some providers)
+       '''
+
+    if network is None:
+        network = provider.network
+    network_params = net_query(network)
+    pa_params = param_query(network)
+
+    min_value = _min_output_value(network_params)
+    outs = _card_transfer_outputs(network, card, min_value)
+
     ### LEGACY
     total_min_values = (1 + len(card.receiver)) * min_value # includes P2TH output + zero outputs to receivers
 
-    #  first round of txn making is done by presuming minimal fee
-    change_sum = Decimal(inputs['total'] - network_params.min_tx_fee - pa_params.P2TH_fee - total_min_values)
+    # the fee depends on the size of the signed transaction.
+    tx_fee = card_transfer_fee(provider, card, len(inputs['utxos']), outs, network)
+    change_sum = Decimal(inputs['total'] - tx_fee - pa_params.P2TH_fee - total_min_values)
 
     outs.append(
-        tx_output(network=provider.network,
+        tx_output(network=network,
                   value=change_sum, n=len(outs)+1,
                   script=p2pkh_script(address=change_address,
-                                      network=provider.network))
+                                      network=network))
         )
 
-    unsigned_tx = make_raw_transaction(network=provider.network,
+    unsigned_tx = make_raw_transaction(network=network,
                                        inputs=inputs['utxos'],
                                        outputs=outs,
                                        locktime=Locktime(locktime)
                                        )
     return unsigned_tx
+
+
+def pack_card_transfers(provider: Provider, deck: Deck, receivers: list, amounts: list,
+                        max_tx_size: int=MAX_STANDARD_TX_SIZE, **card_args) -> list:
+
+    '''Distribute the transfers to many receivers on as few CardTransfers as possible.
+       Each CardTransfer gets as many receivers as fit into the OP_RETURN output of the network
+       and into max_tx_size (estimated with one input), so fewer transactions and fees are needed.
+
+       : receivers - list of receiver addresses
+       : amounts - list of amounts (int), one per receiver
+       : card_args - further arguments of the CardTransfers, e.g. locktime
+       '''
+
+    if len(receivers) != len(amounts):
+        raise RecieverAmountMismatch
+
+    network = provider.network
+    min_value = _min_output_value(net_query(network))
+
+    cards = []
+    start = 0
+    while start < len(receivers):
+        end = start + 1
+        card = CardTransfer(deck=deck, receiver=receivers[start:end], amount=amounts[start:end], **card_args)
+        outs = _card_transfer_outputs(network, card, min_value) # raises OverSizeOPReturn if not even a single transfer fits
+
+        # the size (with one input and the change output) is updated with each added receiver:
+        # its output, the size change of the OP_RETURN output and of the output count.
+        n_outs = len(outs) + 1
+        tx_size = estimate_tx_size(network, ["p2pkh"], outs + [outs[0]])
+        op_return_size = estimate_output_size(outs[1])
+
+        while end < len(receivers):
+            candidate = CardTransfer(deck=deck, receiver=receivers[start:end + 1], amount=amounts[start:end + 1], **card_args)
+            try:
+                candidate_op_return_size = estimate_output_size(_op_return_output(network, candidate, min_value))
+            except OverSizeOPReturn:
+                break
+
+            candidate_size = (tx_size + estimate_output_size(_receiver_output(network, receivers[end], min_value, n_outs))
+                              + candidate_op_return_size - op_return_size + varint_size(n_outs + 1) - varint_size(n_outs))
+            if candidate_size > max_tx_size:
+                break
+
+            card, tx_size, op_return_size = candidate, candidate_size, candidate_op_return_size
+            n_outs += 1
+            end += 1
+
+        cards.append(card)
+        start = end
+
+    return cards
+
+
+def bulk_card_transfer(provider: Provider, cards: list, utxo_set: UtxoSet,
+                       change_address: str=None, locktime: int=0, key: Kutil=None) -> list:
+
+    '''Prepare the transactions of many CardTransfers at once.
+
+       : cards - list of CardTransfer objects
+       : utxo_set - UtxoSet of the deck issuer's address; the selected UTXOs are reserved
+       : change_address - address to send the change to, by default the address of utxo_set
+       : locktime - txes locked until block n=int
+       : key - if given, the transactions are signed, and their change outputs are added to utxo_set,
+               so the following transactions can spend them if the confirmed UTXOs don't suffice
+
+       Returns the transactions in the order of the cards. If one can't be built, all reservations are released
+       and the change outputs added to utxo_set are removed again.'''
+
+    network = provider.network
+    network_params = net_query(network)
+    pa_params = param_query(network)
+
+    min_value = _min_output_value(network_params)
+
+    if change_address is None:
+        change_address = utxo_set.address
+
+    parent_outputs = {}
+    reserved = []
+    added = [] # change outputs added to utxo_set
+    txes = []
+
+    try:
+        for card in cards:
+            # the fee depends on the number of inputs, so the selection is repeated if more inputs are needed.
+            n_inputs = 1
+            while True:
+                amount = card_transfer_fee(provider, card, n_inputs, network=network) + pa_params.P2TH_fee + (1 + len(card.receiver)) * min_value
+                inputs = utxo_set.select(amount, locktime)
+                if len(inputs['utxos']) <= n_inputs:
+                    break
+                utxo_set.release(inputs['utxos'])
+                n_inputs = len(inputs['utxos'])
+
+            reserved.extend(inputs['utxos'])
+            unsigned = card_transfer(provider, card, inputs, change_address, locktime, network)
+
+            if key is None:
+                txes.append(unsigned)
+                continue
+
+            prefetch_parent_outputs(provider, [unsigned], utxos=utxo_set.listunspent(), parent_outputs=parent_outputs, network=network)
+            signed = sign_transaction(provider, unsigned, key, parent_outputs)
+            txes.append(signed)
+
+            if change_address == utxo_set.address:
+                change_n = len(signed.outs) - 1
+                change = signed.outs[change_n]
+                utxo_set.add(signed.txid, change_n, Decimal(change.value) / network_params.to_unit,
+                             change.script_pubkey.hexlify())
+                added.append((signed.txid, change_n))
+                parent_outputs[(signed.txid, change_n)] = change
+
+    except Exception:
+        utxo_set.release(reserved)
+        for (txid, n) in added:
+            utxo_set.remove(txid, n)
+        raise
+
+    return txes
@@ -0,0 +1,87 @@
+"""Cache for decks and their parsed card states, shared between parser runs.
+Parsing a deck (find_all_valid_cards + DeckState) is expensive, and DT decks parse their SDP (voting token) deck
+every time they are parsed themselves. With a DeckCache, several DT decks sharing the same voting token,
+or repeated parser runs of the same DT deck, reuse the result.
+
+Card states are keyed by deck id and chain tip (height and blockhash). They are only valid for the tip
+they were calculated at, so when new blocks arrive (or a reorg changes the tip) they're recalculated.
+NOTE: The cards and DeckStates returned are shared between all consumers and must not be modified."""
+
+from pypeerassets.provider import Provider
+
+
+class DeckCache(object):
+    """Stores Deck objects, valid cards and DeckStates of already parsed decks."""
+
+    def __init__(self, debug: bool=False):
+
+        self.decks = {} # deck id -> Deck. Deck spawns are immutable, thus never invalidated.
+        self.states = {} # deck id -> dict with keys "tip", "cards" and "state".
+        self.debug = debug
+
+    @staticmethod
+    def get_chain_tip(provider: Provider) -> tuple:
+        """Returns height and blockhash of the current chain tip."""
+
+        height = provider.getblockcount()
+        return (height, provider.getblockhash(height))
+
+    def get_deck(self, provider: Provider, deckid: str, version: int=1, prod: bool=True) -> object:
+        """Returns the Deck object, using find_deck only the first time. Invalid decks (None) are not stored."""
+
+        if deckid not in self.decks:
+            from pypeerassets.__main__ import find_deck
+
+            deck = find_deck(provider, deckid, version, prod)
+            if deck is None:
+                return None
+            self.decks.update({deckid : deck})
+
+        return self.decks[deckid]
+
+    def get_deckstate(self, provider: Provider, deck: object, tip: tuple=None) -> object:
+        """Returns the DeckState of the deck at the chain tip. Recalculated only if the tip has changed."""
+
+        if tip is None:
+            tip = self.get_chain_tip(provider)
+
+        entry = self.states.get(deck.id)
+        if (entry is None) or (entry["tip"] != tip):
+            if self.debug: print("CACHE: Parsing deck {} at height {}.".format(deck.id, tip[0]))
+            entry = self._parse_deck(provider, deck, tip)
+        elif self.debug:
+            print("CACHE: Using cached state of deck {} at height {}.".format(deck.id, tip[0]))
+
+        return entry["state"]
+
+    def get_valid_cards(self, provider: Provider, deck: object, tip: tuple=None) -> list:
+        """Returns the valid cards of the deck (after DeckState validation) at the chain tip."""
+
+        return self.get_deckstate(provider, deck, tip=tip).valid_cards
+
+    def _parse_deck(self, provider: Provider, deck: object, tip: tuple) -> dict:
+
+        from pypeerassets.__main__ import find_all_valid_cards
+        from pypeerassets.protocol import DeckState
+
+        cards = list(find_all_valid_cards(provider, deck))
+        entry = {"tip" : tip, "cards" : cards, "state" : DeckState(cards)}
+        self.states.update({deck.id : entry})
+
+        return entry
+
+    def update_tip(self, provider: Provider) -> None:
+        """Drops all card states calculated at another chain tip. Should be called when new blocks arrive."""
+
+        tip = self.get_chain_tip(provider)
+
+        for deckid in [d for d, entry in self.states.items() if entry["tip"] != tip]:
+            del self.states[deckid]
+
+    def invalidate(self, deckid: str=None) -> None:
+        """Drops the card state of a deck, or of all decks if no deck id is given."""
+
+        if deckid is None:
+            self.states.clear()
+        else:
+            self.states.pop(deckid, None)
@@ -13,6 +13,7 @@ from pypeerassets.at.ttx_base import BaseTrackedTransaction, InvalidTrackedTrans
 from pypeerassets.networks import net_query
 from pypeerassets.hash_encoding import hash_to_address
 from pypeerassets.at.constants import P2TH_OUTPUT, DATASTR_OUTPUT, DONATION_OUTPUT, RESERVED_OUTPUT
+from bisect import insort
 
 
 class TrackedTransaction(BaseTrackedTransaction):
@@ -56,8 +57,12 @@ class TrackedTransaction(BaseTrackedTransaction):
         epoch = self.blockheight // self.deck.epoch_length if deck is not None else None
         object.__setattr__(self, 'epoch', epoch) # Epoch in which the transaction was sent. Epochs begin with 0.
 
-    def get_direct_successors(self, tx_list):
-        """all TrackedTransactions of a list which have one of the outputs of the current tx as input."""
+    def get_direct_successors(self, tx_list, index: object=None):
+        """all TrackedTransactions of a list which have one of the outputs of the current tx as input.
+           If a TrackedTxIndex of the list is given, the successors are looked up instead of searched."""
+
+        if index is not None:
+            return list(index.spenders_by_txid.get(self.txid, []))
 
         successors = []
         for tx in tx_list:
@@ -65,13 +70,16 @@ class TrackedTransaction(BaseTrackedTransaction):
                 successors.append(tx)
         return successors
 
-    def get_indirect_successors(self, tx_list: list, reserve_mode: bool=False):
+    def get_indirect_successors(self, tx_list: list, reserve_mode: bool=False, index: object=None):
         """all TrackedTransactions of a list, where one output address is used as one of the input addresses."""
         # This has to be called always _after_ set_dist_round/validate_round.
 
         successors = []
         address = self.reserve_address if reserve_mode else self.address
 
+        if index is not None:
+            return index.get_donor_txes(address, predecessor=self)
+
         for tx in tx_list:
             # MODIF: we don't search in all input_addresses but compare to the specific donor address.
             # DonationTransactions which don't have direct predecessors and thus no donor_address, get the donor_address set
@@ -82,11 +90,19 @@ class TrackedTransaction(BaseTrackedTransaction):
                 successors.append(tx)
         return successors
 
-    def set_direct_successor(self, tx_list: list, reserve_mode: bool=False):
+    def set_direct_successor(self, tx_list: list, reserve_mode: bool=False, index: object=None):
         # the direct successor is a Locking/Donation transaction that spends the input 2.
         # MODIF: returned True or False according to if a successor was added or not
 
         (output, attribute) = (3, "reserve_successor") if reserve_mode else (2, "direct_successor")
+
+        if index is not None:
+            tx = index.first_input_spenders.get((self.txid, output))
+            if tx is None:
+                return False
+            object.__setattr__(self, attribute, tx)
+            return True
+
         for tx in tx_list:
             if (self.txid == tx.ins[0].txid) and (tx.ins[0].txout == output):
                 object.__setattr__(self, attribute, tx)
@@ -99,6 +115,66 @@ class TrackedTransaction(BaseTrackedTransaction):
         object.__setattr__(self, 'dist_round', dist_round)
 
 
+class TrackedTxIndex(object):
+    """Lookup tables for a list of TrackedTransactions (e.g. the locking txes of a round),
+    so successors can be found without comparing each transaction with the whole list.
+    All lookups return the transactions in the order of the original list.
+
+    - first_input_spenders: (txid, vout) of the first input -> first transaction spending it.
+    - spenders_by_txid: txid -> transactions with any input spending an output of this txid.
+    - donor buckets: donor address -> positions of the transactions with this donor address.
+
+    The donor address of DonationTransactions can change after the index was built (set_donor_address).
+    These changes must be registered with update_donor_address."""
+
+    def __init__(self, tx_list: list):
+
+        self.tx_list = tx_list
+        self.first_input_spenders = {}
+        self.spenders_by_txid = {}
+        self.positions = {} # txid -> position in tx_list
+        self.donor_buckets = {}
+        self.indexed_donors = [] # donor address under which each tx is indexed
+
+        for pos, tx in enumerate(tx_list):
+            self.positions.update({tx.txid : pos})
+            self.first_input_spenders.setdefault((tx.ins[0].txid, tx.ins[0].txout), tx)
+            for input_txid in set([t.txid for t in tx.ins]):
+                self.spenders_by_txid.setdefault(input_txid, []).append(tx)
+
+            # DonationTransactions without donor address are indexed under None until it's set.
+            donor_address = getattr(tx, "donor_address", None)
+            self.donor_buckets.setdefault(donor_address, []).append(pos)
+            self.indexed_donors.append(donor_address)
+
+    def update_donor_address(self, tx: TrackedTransaction) -> None:
+        """Moves a transaction to the bucket of its current donor address."""
+
+        pos = self.positions.get(tx.txid)
+        if pos is None:
+            return
+
+        old_address, new_address = self.indexed_donors[pos], getattr(tx, "donor_address", None)
+        if old_address == new_address:
+            return
+
+        self.donor_buckets[old_address].remove(pos)
+        insort(self.donor_buckets.setdefault(new_address, []), pos)
+        self.indexed_donors[pos] = new_address
+
+    def get_donor_txes(self, address: str, predecessor: TrackedTransaction) -> list:
+        """Equivalent to the loop in TrackedTransaction.get_indirect_successors:
+        DonationTransactions without donor address get it set first, using the dist round of the predecessor."""
+
+        for pos in list(self.donor_buckets.get(None, [])):
+            tx = self.tx_list[pos]
+            if (type(tx) == DonationTransaction) and (tx.donor_address is None):
+                tx.set_donor_address(dist_round=predecessor.dist_round)
+            self.update_donor_address(tx)
+
+        return [self.tx_list[pos] for pos in self.donor_buckets.get(address, [])]
+
+
 class LockingTransaction(TrackedTransaction):
     """A LockingTransaction is a transaction which locks the donation amount until the end of the
        working period of the Proposer. They are only necessary in the first phase (round 1-4)."""
@@ -13,7 +13,8 @@ from pypeerassets.provider import Provider
 from pypeerassets.protocol import Deck
 from pypeerassets.pautils import read_tx_opreturn
 from pypeerassets.kutil import Kutil
-from pypeerassets.transactions import make_raw_transaction, p2pkh_script, find_parent_outputs, nulldata_script, MutableTxIn, TxIn, TxOut, Transaction, MutableTransaction, MutableTxIn, ScriptSig, Locktime
+from pypeerassets.transactions import make_raw_transaction, p2pkh_script, get_parent_outputs, nulldata_script, MutableTxIn, TxIn, TxOut, Transaction, MutableTransaction, MutableTxIn, ScriptSig, Locktime
+from pypeerassets.transactions import estimate_input_size, estimate_tx_size, estimate_tx_fee, MAX_STANDARD_TX_SIZE
 from pypeerassets.networks import net_query
 from pypeerassets.provider.rpcnode import Sequence
 from pypeerassets.at.dt_entities import InvalidTrackedTransactionError
@@ -225,6 +226,8 @@ def get_parser_state(provider, deck=None, deckid=None, lastblock=None, force_con
     valid_cards = dt_parser(unfiltered_cards, provider, deck, current_blockheight=lastblock, initial_parser_state=pst, force_continue=force_continue, force_dstates=force_dstates)
 
     # NOTE: we don't need to return valid_cards as it is saved in pst.
+    # The returned state contains all tracked txes, also those of proposals the parser didn't need.
+    pst.materialize_all_tracked_txes()
     return pst
 
 def get_proposal_state(provider, proposal_id=None, proposal_tx=None, deck=None, debug=False, debug_donations=False, debug_voting=False):
@@ -311,7 +314,7 @@ def deck_from_p2th(tx: dict, tx_type: str, provider: Provider): # we could do th
 
 def create_p2pkh_txout(value: int, address: str, n: int, network: namedtuple):
 
-    script = p2pkh_script(network.shortname, address) # we need the shortname here
+    script = p2pkh_script(network, address) # net_query accepts the resolved network
     return TxOut(value=value, n=n, script_pubkey=script, network=network)
 
 def create_p2sh_txout(value: int, redeem_script: DonationTimeLockScript, n: int, network: namedtuple):
@@ -347,13 +350,11 @@ def create_unsigned_tx(deck: Deck, provider: Provider, tx_type: str, network_nam
 
     try:
         network = net_query(network_name)
-        if not tx_fee:
-            # We use a flat fee, as tx will be mostly under 1 kB (check would be complicated). If it's bigger, an error will be thrown.
-            # In coins without min_tx_fee, the fee must be set manually.
-            if network.min_tx_fee > 0:
-                tx_fee = coins_to_sats(network.min_tx_fee, network=network)
-            else:
-                raise ValueError("This coin has no minimum transaction fee. You must provide the fee manually.")
+        # Without manual fee, the fee is calculated from the estimated size of the signed transaction.
+        # In coins without min_tx_fee, the fee must be set manually.
+        fixed_fee = bool(tx_fee)
+        if (not fixed_fee) and (network.min_tx_fee == 0):
+            raise ValueError("This coin has no minimum transaction fee. You must provide the fee manually.")
         if not p2th_fee:
             p2th_fee = coins_to_sats(min_p2th_fee(network), network=network)
 
@@ -389,6 +390,19 @@ def create_unsigned_tx(deck: Deck, provider: Provider, tx_type: str, network_nam
         else:
             reserved_amount = 0
 
+        if input_redeem_script is not None:
+            input_size = estimate_input_size("p2sh", input_redeem_script)
+        else:
+            input_size = estimate_input_size("p2pkh")
+
+        def size_fee(n_inputs: int) -> int:
+            # the P2TH output serves as placeholder for the P2PKH change output.
+            tx_size = estimate_tx_size(network.shortname, [input_size] * n_inputs, outputs + [p2th_output])
+            return estimate_tx_fee(tx_size, network.shortname)
+
+        if not fixed_fee:
+            tx_fee = size_fee(1)
+
         complete_amount = amount + reserved_amount + p2th_output.value + data_output.value + tx_fee
 
         if network_name in ("slm", "tslm") and input_redeem_script is not None:
@@ -405,10 +419,22 @@ def create_unsigned_tx(deck: Deck, provider: Provider, tx_type: str, network_nam
             inputs = [inp]
             input_value = coins_to_sats(Decimal(input_tx["vout"][input_vout]["value"]), network=network)
         elif input_address:
-            dec_complete_amount = sats_to_coins(Decimal(complete_amount), network=network)
-            input_query = provider.select_inputs(input_address, dec_complete_amount)
-            inputs = input_query["utxos"]
-            input_value = coins_to_sats(Decimal(input_query["total"]), network=network)
+            # the fee depends on the number of inputs, so the inputs are selected again with the adjusted fee
+            # until they cover it. Only the last selection is used; select_inputs doesn't reserve UTXOs
+            # (also with a UtxoCache), so the discarded selections don't need to be released.
+            while True:
+                dec_complete_amount = sats_to_coins(Decimal(complete_amount), network=network)
+                input_query = provider.select_inputs(input_address, dec_complete_amount)
+                inputs = input_query["utxos"]
+                input_value = coins_to_sats(Decimal(input_query["total"]), network=network)
+                needed_fee = size_fee(len(inputs))
+                if fixed_fee or needed_fee <= tx_fee:
+                    break
+                # more inputs than estimated: the fee is adjusted, and the inputs selected again if they don't cover it.
+                complete_amount += needed_fee - tx_fee
+                tx_fee = needed_fee
+                if input_value >= complete_amount:
+                    break
         else:
             raise ValueError("No input information provided.") # we need input address or input txid/vout
 
@@ -436,23 +462,26 @@ def create_unsigned_tx(deck: Deck, provider: Provider, tx_type: str, network_nam
                                        locktime=Locktime(locktime)
                                        )
 
-        if (unsigned_tx.size > 1000) and (network.min_tx_fee > 0):
-            # For now we don't change the fee/change value if the size is higher as 1 kB. May change in future versions.
-            raise Exception("Transaction too big (max: 1 kB). Please use other inputs or another address.")
+        tx_size = estimate_tx_size(network.shortname, [input_size] * len(inputs), outputs)
+        if tx_size > MAX_STANDARD_TX_SIZE:
+            raise Exception("Transaction too big (max: {} bytes). Please use other inputs or another address.".format(MAX_STANDARD_TX_SIZE))
+        if fixed_fee and (tx_fee < estimate_tx_fee(tx_size, network.shortname)):
+            raise Exception("Transaction fee too low for a transaction of about {} bytes.".format(tx_size))
         return unsigned_tx
 
     except IndexError: # (IndexError, AttributeError, ValueError):
         raise InvalidTrackedTransactionError("Invalid Transaction creation.")
 
 
-def sign_p2sh_transaction(provider: Provider, unsigned: MutableTransaction, redeem_script: AbsoluteTimelockScript, key: Kutil):
+def sign_p2sh_transaction(provider: Provider, unsigned: MutableTransaction, redeem_script: AbsoluteTimelockScript, key: Kutil, parent_outputs: dict=None):
 
     # This signs P2SH inputs (solving P2SH scripts).
     # Original for P2PKH uses Kutil.
     # from pypeerassets kutil:
     # "due to design of the btcpy library, TxIn object must be converted to TxOut object before signing"
+    # parent_outputs (from transactions.prefetch_parent_outputs) avoids the lookup of the parent txes.
 
-    txins = [find_parent_outputs(provider, i) for i in unsigned.ins]
+    txins = get_parent_outputs(provider, unsigned, parent_outputs)
     inner_solver = P2pkhSolver(key._private_key)
     redeem_script_solver = AbsoluteTimelockSolver(redeem_script.locktime, inner_solver)
     solver = P2shSolver(redeem_script, redeem_script_solver)
@@ -460,17 +489,17 @@ def sign_p2sh_transaction(provider: Provider, unsigned: MutableTransaction, rede
     return unsigned.spend(txins, [solver for i in txins])
 
 
-def sign_p2pk_transaction(provider: Provider, unsigned: MutableTransaction, key: Kutil):
+def sign_p2pk_transaction(provider: Provider, unsigned: MutableTransaction, key: Kutil, parent_outputs: dict=None):
 
-    txins = [find_parent_outputs(provider, i) for i in unsigned.ins]
+    txins = get_parent_outputs(provider, unsigned, parent_outputs)
     solver = P2pkSolver(key._private_key)
     return unsigned.spend(txins, [solver for i in txins])
 
-def sign_mixed_transaction(provider: Provider, unsigned: MutableTransaction, key: Kutil, input_types: list, sighash: Sighash=Sighash('ALL')):
+def sign_mixed_transaction(provider: Provider, unsigned: MutableTransaction, key: Kutil, input_types: list, sighash: Sighash=Sighash('ALL'), parent_outputs: dict=None):
     # this one can sign P2PK and P2PKH inputs
     # should be extended later to allow segwit etc.
 
-    txins = [find_parent_outputs(provider, i) for i in unsigned.ins]
+    txins = get_parent_outputs(provider, unsigned, parent_outputs)
     solver_list = []
     for index, inp in enumerate(txins):
         if input_types[index] == "pubkey":
@@ -5,11 +5,16 @@ It loops through the cards by epoch and then by card. This allows to update the
 and so calculate the valid proposals which were selected from the next epoch.
 Minor functions are in dt_parser_utils. """
 
+import time
+
 from pypeerassets.at.dt_parser_state import ParserState
 from pypeerassets.at.extended_utils import process_cards_by_bundle
 
-def dt_parser(cards: list, provider: object, deck: object, current_blockheight: int=None, initial_parser_state: object=None, force_dstates: bool=False, force_continue: bool=False, start_epoch: int=None, end_epoch: int=None, debug: bool=False, debug_voting: bool=False, debug_donations: bool=False):
-    """Basic parser loop. Loops through all cards, and processes epochs."""
+def dt_parser(cards: list, provider: object, deck: object, current_blockheight: int=None, initial_parser_state: object=None, force_dstates: bool=False, force_continue: bool=False, start_epoch: int=None, end_epoch: int=None, debug: bool=False, debug_voting: bool=False, debug_donations: bool=False, deck_cache: object=None, parallel_dstates: bool=False, tracer: object=None):
+    """Basic parser loop. Loops through all cards, and processes epochs.
+       deck_cache (a DeckCache object) allows to reuse SDP deck results between parser runs.
+       parallel_dstates calculates the donation states of several proposals in a process pool.
+       tracer (a ParserTracer) records timed spans of the parser steps; the card validation is recorded once per epoch."""
 
     cards.sort(key=lambda x: (x.blocknum, x.blockseq, x.cardseq))
 
@@ -20,12 +25,19 @@ def dt_parser(cards: list, provider: object, deck: object, current_blockheight:
         pst = initial_parser_state
         debug = pst.debug
         if debug: print("PARSER: Using initial parser state provided.")
+        if tracer is not None:
+            pst.tracer = tracer
         if pst.start_epoch is None: # workaround, should be done more elegant. Better move the whole section to ParserState.__init__.
             pst.start_epoch = start_epoch # normally start when the deck was spawned.
     else:
-        pst = ParserState(deck, cards, provider, current_blockheight=current_blockheight, start_epoch=start_epoch, end_epoch=end_epoch, debug=debug, debug_voting=debug_voting, debug_donations=debug_donations)
+        pst = ParserState(deck, cards, provider, current_blockheight=current_blockheight, start_epoch=start_epoch, end_epoch=end_epoch, debug=debug, debug_voting=debug_voting, debug_donations=debug_donations, deck_cache=deck_cache, parallel_dstates=parallel_dstates, tracer=tracer)
+
+    tracer = pst.tracer
+    trace_cards = tracer.enabled
+    card_stats = [0, 0, 0.0] # checked cards, valid cards, validation time in the current epoch
 
-    pst.init_parser()
+    with tracer.span("init_parser", cards=len(cards)):
+        pst.init_parser()
     if debug: print("PARSER: Starting parser.")
     if pst.current_blockheight is None:
         pst.current_blockheight = provider.getblockcount()
@@ -61,6 +73,9 @@ def dt_parser(cards: list, provider: object, deck: object, current_blockheight:
             # 2) almost always in the first loop iteration,
             # 3) between epochs where no new cards were transferred.
 
+            if trace_cards:
+                card_stats = emit_card_stats(tracer, pst.epoch, card_stats)
+
             if len(valid_epoch_cards) > 0:
                 # epoch_postprocess updates voters and valid_cards
                 if debug: print("PARSER: Postprocessing cards of epoch {} ...".format(pst.epoch))
@@ -90,12 +105,21 @@ def dt_parser(cards: list, provider: object, deck: object, current_blockheight:
                 # parts of valid CardIssue CardBundles which were already processed.
                 valid_epoch_cards.append(card)
 
-            if pst.check_card(card, issued_amount):
+            if trace_cards:
+                check_start = time.perf_counter()
+            valid_card = pst.check_card(card, issued_amount)
+            if trace_cards:
+                card_stats = [card_stats[0] + 1, card_stats[1] + int(valid_card), card_stats[2] + time.perf_counter() - check_start]
+
+            if valid_card:
                 # yield card  # original idea was to transform this into a generator, maybe later.
                 valid_epoch_cards.append(card)
                 if bundle_amount is not None:
                     valid_bundles.append(card.txid)
 
+    if trace_cards:
+        emit_card_stats(tracer, pst.epoch, card_stats)
+
     if len(valid_epoch_cards) > 0:
         if debug: print("PARSER: Postprocessing cards of FINAL epoch {} ...".format(pst.epoch))
         pst.epoch_postprocess(valid_epoch_cards)
@@ -115,3 +139,11 @@ def dt_parser(cards: list, provider: object, deck: object, current_blockheight:
         pst.force_dstates()
 
     return pst.valid_cards
+
+
+def emit_card_stats(tracer: object, epoch: int, card_stats: list) -> list:
+    """Records the validation of the cards of an epoch as a single span (if any card was checked) and returns reset stats."""
+
+    if card_stats[0] > 0:
+        tracer.emit("validate_cards", card_stats[2], epoch=epoch, cards=card_stats[0], valid_cards=card_stats[1])
+    return [0, 0, 0.0]
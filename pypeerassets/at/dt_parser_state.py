@@ -7,25 +7,43 @@ from decimal import Decimal
 
 from pypeerassets.at.dt_entities import ProposalTransaction, SignallingTransaction, DonationTransaction, LockingTransaction, VotingTransaction
 from pypeerassets.at.dt_entities import InvalidTrackedTransactionError
+from pypeerassets.at.ttx_base import prefetch_parent_txes
+from pypeerassets.at.ttx_record import TrackedTxRecord
 from pypeerassets.at.dt_states import ProposalState, DonationState
 from pypeerassets.at.extended_utils import get_issuance_bundle
 import pypeerassets.at.constants as c
 import pypeerassets as pa
 import pypeerassets.at.dt_parser_utils as dpu
+from pypeerassets.at.dt_tracing import get_tracer
+from pypeerassets.networks import net_query
 from copy import deepcopy
 
+TRACKED_TX_CLASSES = {"donation" : DonationTransaction, "locking" : LockingTransaction, "signalling" : SignallingTransaction, "voting" : VotingTransaction}
+
 class ParserState(object):
     """A ParserState contains the current state of all important variables for a single dPoD (DT) deck,
        while the card parser is running.
        A sub_state is a dict to allow to create a ParserState in a pre-processed state.
-       Currently not used but useful for further updates."""
+       Currently not used but useful for further updates.
+       A DeckCache (deck_cache) can be provided to reuse the SDP deck and its cards between parser runs.
+       With parallel_dstates, donation states of several proposals are calculated in a process pool.
+       A ParserTracer (tracer) records timed spans of the parser steps (see dt_tracing)."""
 
-    def __init__(self, deck: object, initial_cards: list, provider: object, epoch: int=None, start_epoch: int=None, end_epoch: int=None,  current_blockheight: int=None, debug: bool=False, debug_voting: bool=False, debug_donations: bool=False, epochs_with_completed_proposals: int=0, **sub_state):
+    def __init__(self, deck: object, initial_cards: list, provider: object, epoch: int=None, start_epoch: int=None, end_epoch: int=None,  current_blockheight: int=None, debug: bool=False, debug_voting: bool=False, debug_donations: bool=False, epochs_with_completed_proposals: int=0, deck_cache: object=None, parallel_dstates: bool=False, tracer: object=None, **sub_state):
         """Initializing is done in two parts: main attributes and sub-state attributes (keyword arguments)."""
 
         self.deck = deck
         self.initial_cards = initial_cards
         self.provider = provider
+        self.deck_cache = deck_cache
+        self.parallel_dstates = parallel_dstates
+        self.tracer = get_tracer(tracer)
+        self.parent_txes = {} # parent txes needed for input addresses, shared by all TrackedTransactions
+        # TrackedTxRecords (proposal txid -> tx type -> records), materialized when the proposal needs its txes.
+        # donation_tx_proposals: txid -> proposal txid of the donation txes which are still records.
+        self.tracked_tx_records = {}
+        self.donation_tx_proposals = {}
+        self._network = None
 
         # new debugging system: divided into donations processing and voting
         # self.debug stays for general messages
@@ -44,7 +62,10 @@ class ParserState(object):
         # SDP voters/balances are stored as CardTransfers, so they can be easily retrieved with PeerAsset standard methods.
         if self.deck.sdp_deckid:
             # self.sdp_deck = deck_from_tx(self.deck.sdp_deckid, self.provider)
-            self.sdp_deck = pa.find_deck(provider=self.provider, key=self.deck.sdp_deckid, version=c.DECK_VERSION)
+            if self.deck_cache is not None:
+                self.sdp_deck = self.deck_cache.get_deck(self.provider, self.deck.sdp_deckid, c.DECK_VERSION)
+            else:
+                self.sdp_deck = pa.find_deck(provider=self.provider, key=self.deck.sdp_deckid, version=c.DECK_VERSION)
             # The SDP Decimal Diff is the difference between the number of decimals of the main token and the voting token.
             self.sdp_decimal_diff = self.deck.number_of_decimals - self.sdp_deck.number_of_decimals
         else:
@@ -72,7 +93,8 @@ class ParserState(object):
         # enabled_voters are all voters with valid balances, and their balance.
         # used_issuance_tuples list joins all issuances of sender, txid, vout
         # MODIF: added sdp_voters and dpod_voters, need to be segregated.
-        dict_items = ("proposal_states", "approved_proposals", "valid_proposals", "donation_txes", "enabled_voters", "sdp_voters", "dpod_voters")
+        # start_epoch_index/end_epoch_index: epoch -> list of proposal ids starting/ending in this epoch.
+        dict_items = ("proposal_states", "approved_proposals", "valid_proposals", "donation_txes", "enabled_voters", "sdp_voters", "dpod_voters", "start_epoch_index", "end_epoch_index")
         list_items = ("signalling_txes", "locking_txes", "voting_txes", "used_issuance_tuples", "valid_cards", "sdp_cards")
 
         for key in dict_items + list_items:
@@ -88,40 +110,80 @@ class ParserState(object):
 
         if self.debug: print("PARSER: Initial cards:", len(self.initial_cards))
 
+    @property
+    def network(self):
+        """Network parameters, resolved once and passed to all TrackedTransactions (provider.network can be an RPC call)."""
+        if self._network is None:
+            self._network = net_query(self.provider.network)
+        return self._network
+
     def init_parser(self):
         """Bundles all on-chain transaction retrievals (SDP cards and TrackedTransactions)."""
 
         # Initial balance of SDP cards
         if self.sdp_deck != None:
-            self.sdp_cards = self.get_sdp_cards()
+            with self.tracer.span("get_sdp_cards") as span:
+                self.sdp_cards = self.get_sdp_cards()
+                span.set(cards=len(self.sdp_cards))
         else:
             self.sdp_cards = None
 
         if self.debug: print("PARSER: Get proposal states ...", )
-        self.proposal_states = dpu.get_proposal_states(self.provider, self.deck, self.current_blockheight, debug=self.debug)
+        with self.tracer.span("get_proposal_states") as span:
+            self.proposal_states = dpu.get_proposal_states(self.provider, self.deck, self.current_blockheight, debug=self.debug, network=self.network)
+            span.set(proposals=len(self.proposal_states))
         if self.debug: print(len(self.proposal_states), "found.")
 
         # We don't store the txes anymore in the ParserState, as they're already stored in the ProposalStates.
         # q is the number of txes for each category.
-        if self.debug: print("PARSER: Get donation txes ...", )
-        q = self.get_tracked_txes("donation")
-        if self.debug: print(q, "found.")
+        for tx_type in ("donation", "locking", "signalling", "voting"):
+            if self.debug: print("PARSER: Get {} txes ...".format(tx_type))
+            with self.tracer.span("get_tracked_txes", tx_type=tx_type) as span:
+                q = self.get_tracked_txes(tx_type)
+                span.set(txes=q)
+            if self.debug: print(q, "found.")
+
+        self.index_proposal_states()
+
+    def index_proposal_states(self):
+        """Creates the start epoch index, so each epoch only the proposals starting in it are processed.
+           The start epoch of a proposal can't be modified, so the index is built only once.
+           The end epoch index of already approved proposals (e.g. of an initial parser state) is rebuilt,
+           as their end epochs may have been modified since it was created."""
+
+        self.start_epoch_index = {}
+        for pstate in self.proposal_states.values():
+            self.start_epoch_index.setdefault(pstate.start_epoch, []).append(pstate.id)
+
+        self.end_epoch_index = {}
+        for pstate in self.approved_proposals.values():
+            self.index_end_epoch(pstate)
 
-        if self.debug: print("PARSER: Get locking txes ...", )
-        q = self.get_tracked_txes("locking")
-        if self.debug: print(q, "found.")
+    def index_end_epoch(self, pstate: object, old_end_epoch: int=None):
+        """Adds an approved proposal to the end epoch index, or moves it if its end epoch was modified."""
 
-        if self.debug: print("PARSER: Get signalling txes ...", )
-        q = self.get_tracked_txes("signalling")
-        if self.debug: print(q, "found.")
+        if old_end_epoch is not None and pstate.id in self.end_epoch_index.get(old_end_epoch, []):
+            self.end_epoch_index[old_end_epoch].remove(pstate.id)
+            if not self.end_epoch_index[old_end_epoch]:
+                del self.end_epoch_index[old_end_epoch]
 
-        if self.debug: print("PARSER: Get voting txes ...", )
-        q = self.get_tracked_txes("voting")
-        if self.debug: print(q, "found.")
+        epoch_proposals = self.end_epoch_index.setdefault(pstate.end_epoch, [])
+        if pstate.id not in epoch_proposals:
+            epoch_proposals.append(pstate.id)
+
+    def modify_proposal(self, pstate: object):
+        """Applies a Proposal Modification. All modifications go through this method,
+           so the end epoch index follows the modified end epoch."""
+
+        old_end_epoch = pstate.end_epoch
+        pstate.modify(debug=self.debug_donations)
+        if pstate.id in self.approved_proposals:
+            self.index_end_epoch(pstate, old_end_epoch=old_end_epoch)
 
     def force_dstates(self):
         """Allows to set all donation states even if no card has been issued."""
 
+        pending_pstates = []
         for p in self.proposal_states.values():
             if self.debug_donations: print("PARSER: Setting donation states for Proposal:", p.id)
 
@@ -130,7 +192,70 @@ class ParserState(object):
             # "processed" variable prevents this with a simple check.
             phase = 1 if self.epoch <= p.end_epoch else 0
             if not p.processed[phase]:
-                p.set_donation_states(self.current_blockheight, debug=self.debug_donations)
+                pending_pstates.append(p)
+
+        if self.parallel_dstates and len(pending_pstates) > 1:
+            self.set_parallel_dstates(pending_pstates)
+        else:
+            self.prefetch_parent_txes(pending_pstates)
+            for p in pending_pstates:
+                self.set_dstates(p)
+
+    def set_parallel_dstates(self, pstates: list):
+        """Calculates the donation states of several proposals in a process pool.
+        The results are merged into the original ProposalStates, so all references to them stay valid."""
+
+        if self.debug_donations: print("PARSER: Setting donation states in parallel for proposals:", [p.id for p in pstates])
+        self.prefetch_parent_txes(pstates)
+        with self.tracer.span("set_donation_states_parallel", proposals=len(pstates)) as span:
+            results = dpu.set_donation_states_parallel(pstates, self.current_blockheight, debug=self.debug_donations)
+            if self.tracer.enabled:
+                span.set(txes=sum([self.tracked_tx_count(p) for p in pstates]))
+
+        for pstate, result in zip(pstates, results):
+            pstate.__dict__.update(result.__dict__)
+            # The lookup dict must point to the processed copies of the DonationTransactions.
+            for dtx in pstate.all_donation_txes:
+                if dtx.txid in self.donation_txes:
+                    self.donation_txes.update({dtx.txid : dtx})
+
+    def set_missing_dstates(self, proposal_state: ProposalState, debug: bool=False):
+        """Sets the donation states of a valid proposal when the first card referring to it is checked.
+        With parallel_dstates, those of all other valid proposals without donation states are calculated, too."""
+
+        if self.parallel_dstates:
+            pending_pstates = [p for p in self.valid_proposals.values() if len(p.donation_states) == 0]
+            if len(pending_pstates) > 1:
+                self.set_parallel_dstates(pending_pstates)
+                return
+
+        self.prefetch_parent_txes([proposal_state])
+        self.set_dstates(proposal_state, debug=debug)
+
+    def set_dstates(self, proposal_state: ProposalState, debug: bool=None):
+        """Sets the donation states of a proposal, recording a span with the number of tracked txes and donation states."""
+
+        if debug is None:
+            debug = self.debug_donations
+
+        with self.tracer.span("set_donation_states", proposal=proposal_state.id) as span:
+            proposal_state.set_donation_states(self.current_blockheight, debug=debug)
+            if self.tracer.enabled:
+                span.set(txes=self.tracked_tx_count(proposal_state),
+                         donation_states=sum([len(rd_states) for rd_states in proposal_state.donation_states]))
+
+    @staticmethod
+    def tracked_tx_count(proposal_state: ProposalState) -> int:
+        return len(proposal_state.all_signalling_txes) + len(proposal_state.all_locking_txes) + len(proposal_state.all_donation_txes)
+
+    def prefetch_parent_txes(self, pstates: list):
+        """Retrieves at once the parent txes needed for the input addresses of signalling and donation txes,
+        before their donation states are calculated. Locking txes resolve them already when they're created."""
+
+        for p in pstates:
+            self.materialize_tracked_txes(p, ("donation", "locking", "signalling"))
+        txes = [tx for p in pstates for tx in p.all_signalling_txes + p.all_donation_txes]
+        prefetch_parent_txes(txes, self.provider, parent_txes=self.parent_txes)
 
     def get_sdp_cards(self):
         """Retrieves the SDP cards."""
@@ -138,6 +263,11 @@ class ParserState(object):
         from pypeerassets.__main__ import find_all_valid_cards
 
         if self.debug_voting: print("VOTING: Searching for SDP Token Cards ...")
+
+        # With a DeckCache, the SDP deck is only parsed again if new blocks arrived since the last parser run.
+        if self.deck_cache is not None:
+            return self.deck_cache.get_valid_cards(self.provider, self.sdp_deck)
+
         all_sdp_cards = list(find_all_valid_cards(self.provider, self.sdp_deck))
         valid_sdp_cards = self.remove_invalid_cards(all_sdp_cards)
         return valid_sdp_cards
@@ -179,15 +309,12 @@ class ParserState(object):
 
     def update_approved_proposals(self):
         """Filters proposals which were approved in the first voting phase."""
-        # TODO: To boost efficiency and avoid redundant checks, one could delete all
-        # already approved proposals from the original list (which should be renamed to "unchecked proposals")
-        # Would also allow differentiate between unchecked and unapproved proposals.
-
-        for pstate in self.proposal_states.values():
+        # Only proposals starting in the current epoch are checked, using the start epoch index.
 
-            if (pstate.start_epoch != self.epoch):
-                continue
+        for pstate_id in self.start_epoch_index.get(self.epoch, []):
 
+            pstate = self.proposal_states[pstate_id]
+            self.materialize_tracked_txes(pstate, ("voting",))
             pstate.process_votes(self.enabled_voters, phase=0, debug=self.debug_voting)
 
             if self.debug_voting: print("VOTING: Votes round 1 for Proposal", pstate.id, ":", pstate.initial_votes)
@@ -202,10 +329,10 @@ class ParserState(object):
 
             # Set rounds, req_amount etc. again if a Proposal Modification was recorded.
             # When this method is called, we already know the last (and thus valid) Proposal Modification.
-            if pstate.first_ptx.txid != pstate.valid_ptx.txid:
-                pstate.modify(debug=self.debug_donations)
-
             self.approved_proposals.update({pstate.id : pstate})
+            self.index_end_epoch(pstate)
+            if pstate.first_ptx.txid != pstate.valid_ptx.txid:
+                self.modify_proposal(pstate)
 
 
     def update_valid_ending_proposals(self):
@@ -214,10 +341,9 @@ class ParserState(object):
          Only checks round-2 votes."""
 
         ending_valid_proposals = {}
-        for pstate in self.approved_proposals.values():
+        for pstate_id in self.end_epoch_index.get(self.epoch, []):
 
-            if (pstate.end_epoch != self.epoch):
-                continue
+            pstate = self.approved_proposals[pstate_id]
             # donation address should not be possible to change (otherwise it's a headache for donors), so we use first ptx.
             pstate.process_votes(self.enabled_voters, phase=1, debug=self.debug_voting)
             if self.debug_voting: print("VOTING: Votes round 2 for Proposal", pstate.id, ":", pstate.final_votes)
@@ -254,47 +380,87 @@ class ParserState(object):
 
     def get_tracked_txes(self, tx_type, min_blockheight=None, max_blockheight=None):
         """Retrieves TrackedTransactions (except votes and proposals) for a deck from the blockchain
-           and adds them to the corresponding ProposalState."""
+           and adds them to the corresponding ProposalState.
+           They're kept as TrackedTxRecords until the ProposalState needs them (see materialize_tracked_txes)."""
 
         proposal_list = []
-        tx_attr = "all_{}_txes".format(tx_type)
         # p2th_account = self.deck.derived_p2th_address(tx_type) # OLD behaviour
         p2th_account = self.deck.id + tx_type.upper()
         txes = dpu.get_marked_txes(self.provider, p2th_account, min_blockheight=min_blockheight, max_blockheight=max_blockheight)
         for q, rawtx in enumerate(txes):
             try:
-                if tx_type == "donation":
-                    tx = DonationTransaction.from_json(tx_json=rawtx, provider=self.provider, deck=self.deck)
-                elif tx_type == "locking":
-                    tx = LockingTransaction.from_json(tx_json=rawtx, provider=self.provider, deck=self.deck)
-                elif tx_type == "signalling":
-                    tx = SignallingTransaction.from_json(tx_json=rawtx, provider=self.provider, deck=self.deck)
-                elif tx_type == "voting":
-                    tx = VotingTransaction.from_json(tx_json=rawtx, provider=self.provider, deck=self.deck)
-
-                # We add the tx directly to the corresponding ProposalState.
-                # If the ProposalState does not exist, KeyError is thrown and the tx is ignored.
-                # When we create the first instance of the state we make a deepcopy.
-                if tx.proposal_txid not in proposal_list:
-                    current_state = deepcopy(self.proposal_states[tx.proposal_txid])
-                    proposal_list.append(tx.proposal_txid)
-                    getattr(current_state, tx_attr).append(tx)
-                    self.proposal_states.update({ tx.proposal_txid : current_state })
-                else:
-                    current_state = self.proposal_states[tx.proposal_txid]
-                    getattr(current_state, tx_attr).append(tx)
-
-                # We keep a dictionary of DonationTransactions for better lookup from the Parser.
-                if tx_type == "donation":
-                    self.donation_txes.update({tx.txid : tx})
+                record = TrackedTxRecord.from_json(rawtx)
+            except (KeyError, IndexError, TypeError):
+                continue
+
+            # Txes of unknown proposals are discarded without creating btcpy objects.
+            proposal_txid = record.proposal_txid
+            if proposal_txid not in self.proposal_states:
+                continue
+
+            # When we add the first tx to a ProposalState we make a deepcopy.
+            if proposal_txid not in proposal_list:
+                self.proposal_states.update({ proposal_txid : deepcopy(self.proposal_states[proposal_txid]) })
+                proposal_list.append(proposal_txid)
 
-            except (InvalidTrackedTransactionError, KeyError):
+            if record.raw is None:
+                # Without the serialized tx (e.g. JSON of some providers) the record can't be materialized later.
+                self.add_tracked_tx(self.proposal_states[proposal_txid], tx_type, rawtx=rawtx)
                 continue
+
+            self.tracked_tx_records.setdefault(proposal_txid, {}).setdefault(tx_type, []).append(record)
+            if tx_type == "donation":
+                self.donation_tx_proposals.update({ record.txid : proposal_txid })
+
         try:
             return q
         except UnboundLocalError: # if no txes were found
             return 0
 
+    def add_tracked_tx(self, proposal_state: ProposalState, tx_type: str, rawtx: dict=None, record: TrackedTxRecord=None):
+        """Creates the TrackedTransaction from its JSON or record and adds it directly to the ProposalState.
+           Invalid txes are ignored."""
+
+        ttx_class = TRACKED_TX_CLASSES[tx_type]
+        try:
+            if record is not None:
+                tx = record.materialize(ttx_class, self.provider, deck=self.deck, network=self.network)
+            else:
+                tx = ttx_class.from_json(tx_json=rawtx, provider=self.provider, deck=self.deck, network=self.network)
+        except InvalidTrackedTransactionError:
+            return
+
+        getattr(proposal_state, "all_{}_txes".format(tx_type)).append(tx)
+        # We keep a dictionary of DonationTransactions for better lookup from the Parser.
+        if tx_type == "donation":
+            self.donation_txes.update({tx.txid : tx})
+
+    def materialize_tracked_txes(self, proposal_state: ProposalState, tx_types: tuple=tuple(TRACKED_TX_CLASSES)):
+        """Creates the TrackedTransactions of the records of a proposal, and drops the records."""
+
+        pending = self.tracked_tx_records.get(proposal_state.id)
+        if pending is None:
+            return
+
+        for tx_type in tx_types:
+            records = pending.pop(tx_type, [])
+            for record in records:
+                self.add_tracked_tx(proposal_state, tx_type, record=record)
+                if tx_type == "donation":
+                    del self.donation_tx_proposals[record.txid]
+            # Votes are grouped by epoch and sorted only once, instead of each time they're counted.
+            if tx_type == "voting" and len(records) > 0:
+                proposal_state.set_voting_buckets()
+
+        if len(pending) == 0:
+            del self.tracked_tx_records[proposal_state.id]
+
+    def materialize_all_tracked_txes(self):
+        """Creates all TrackedTransactions which are still records, e.g. to return a complete parser state."""
+
+        for proposal_txid in list(self.tracked_tx_records):
+            self.materialize_tracked_txes(self.proposal_states[proposal_txid])
+
     def validate_proposer_issuance(self, dtx_id, card_units, card_sender, card_blocknum):
         """Validation method for proposers. The dtx_id here is the ProposalTransaction's TXID."""
 
@@ -308,7 +474,7 @@ class ParserState(object):
             return False
 
         if len(proposal_state.donation_states) == 0:
-            proposal_state.set_donation_states(self.current_blockheight)
+            self.set_missing_dstates(proposal_state)
 
         # 2. Check correct amount
         if card_units != proposal_state.proposer_reward:
@@ -330,6 +496,9 @@ class ParserState(object):
         if debug: print("PARSER: Valid proposals:", self.valid_proposals)
 
         # Retrieve DonationTransaction object.
+        if dtx_id in self.donation_tx_proposals:
+            proposal_txid = self.donation_tx_proposals[dtx_id]
+            self.materialize_tracked_txes(self.proposal_states[proposal_txid], ("donation",))
         try:
             dtx = self.donation_txes[dtx_id]
             if debug: print("PARSER: Donation transaction found.")
@@ -346,7 +515,7 @@ class ParserState(object):
         # We only create donation states for Proposals where a card was issued.
         if len(proposal_state.donation_states) == 0:
             if debug: print("PARSER: Creating donation states ...")
-            proposal_state.set_donation_states(self.current_blockheight, debug=self.debug_donations)
+            self.set_missing_dstates(proposal_state, debug=self.debug_donations)
 
         if debug: print("PARSER: Number of donation txes:", len([tx for r in proposal_state.donation_txes for tx in r ]))
 
@@ -435,6 +604,12 @@ class ParserState(object):
         """Called when the card loop enters a new epoch.
            Calculates SDP voter balances, then updates states of approved and ending proposals."""
 
+        with self.tracer.span("epoch_init", epoch=self.epoch) as span:
+            self._epoch_init()
+            span.set(approved_proposals=len(self.approved_proposals), valid_proposals=len(self.valid_proposals))
+
+    def _epoch_init(self):
+
         debug = self.debug_voting
         epoch_firstblock, epoch_lastblock = self.epoch * self.deck.epoch_length, (self.epoch + 1) * self.deck.epoch_length - 1
         if debug: print("PARSER: Checking epoch:", self.epoch, ", from block", epoch_firstblock, "to", epoch_lastblock)
@@ -498,12 +673,13 @@ class ParserState(object):
         """Postprocesses epochs with cards."""
         # if debug: print("Valid cards found in this epoch:", len(valid_epoch_cards))
 
-        self.dpod_voters.update(dpu.update_voters(voters=self.dpod_voters, new_cards=valid_epoch_cards, debug=self.debug_voting))
+        with self.tracer.span("epoch_postprocess", epoch=self.epoch, cards=len(valid_epoch_cards)):
+            self.dpod_voters.update(dpu.update_voters(voters=self.dpod_voters, new_cards=valid_epoch_cards, debug=self.debug_voting))
 
-        # NEW method: updating of SDP voters in enabled_voters requires checking those in both categories.
-        self.update_enabled_voters()
+            # NEW method: updating of SDP voters in enabled_voters requires checking those in both categories.
+            self.update_enabled_voters()
 
-        self.valid_cards += valid_epoch_cards
+            self.valid_cards += valid_epoch_cards
 
 
     def process_cardless_epochs(self, start, end):
@@ -1,12 +1,15 @@
 # This file contains minor functions for the DT parser.
 
 from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 from pypeerassets.at.dt_entities import ProposalTransaction #, SignallingTransaction, DonationTransaction, LockingTransaction, VotingTransaction
 from pypeerassets.at.dt_entities import InvalidTrackedTransactionError # , DONATION_OUTPUT, DATASTR_OUTPUT
 from pypeerassets.at.dt_states import ProposalState
 from pypeerassets.provider import Provider
 from pypeerassets.pa_constants import param_query
+from pypeerassets.blockscan import BlockScanProvider
 
 ### Transaction retrieval
 
@@ -14,6 +17,10 @@ def get_marked_txes(provider, p2th_account, min_blockheight=None, max_blockheigh
     # Gets all txes sent to a P2TH address, looping through "listtransactions".
     # As listtransactions may lead to duplicates, we filter them out with set.
     # Re-check speed.
+    # In block-scan discovery mode the txes are taken from the scanned blocks.
+
+    if isinstance(provider, BlockScanProvider):
+        return provider.block_scan.get_txes(p2th_account, min_blockheight, max_blockheight)
 
     if min_blockheight is not None:
         min_blocktime = provider.getblock(provider.getblockhash(min_blockheight))["time"]
@@ -62,7 +69,7 @@ def get_marked_txes(provider, p2th_account, min_blockheight=None, max_blockheigh
             return txlist
         start += 999
 
-def get_proposal_states(provider, deck, current_blockheight=None, all_signalling_txes=[], all_donation_txes=[], all_locking_txes=[], debug=False):
+def get_proposal_states(provider, deck, current_blockheight=None, all_signalling_txes=[], all_donation_txes=[], all_locking_txes=[], debug=False, network=None):
     # Gets all proposal txes of a deck and creates the initial ProposalStates. Needs P2TH.
     # If a new Proposal Transaction referencing an earlier one is found, the ProposalState is modified.
     # If provided, then donation/signalling txes are calculated
@@ -75,7 +82,7 @@ def get_proposal_states(provider, deck, current_blockheight=None, all_signalling
         try:
             if debug:
                 print("PARSER: Found ProposalTransaction", rawtx["txid"])
-            tx = ProposalTransaction.from_json(tx_json=rawtx, provider=provider, deck=deck)
+            tx = ProposalTransaction.from_json(tx_json=rawtx, provider=provider, deck=deck, network=network)
 
             if tx.txid in used_firsttxids: # filters duplicates
                 if debug:
@@ -116,6 +123,21 @@ def get_proposal_states(provider, deck, current_blockheight=None, all_signalling
 
 ## SDP (mandatory for now)
 
+### Donation states
+
+def compute_donation_states(pstate: ProposalState, current_blockheight: int, debug: bool=False) -> ProposalState:
+    # Worker function for set_donation_states_parallel. Must be at module level to be picklable.
+    pstate.set_donation_states(current_blockheight, debug=debug)
+    return pstate
+
+def set_donation_states_parallel(pstates: list, current_blockheight: int, max_workers: int=None, debug: bool=False) -> list:
+    """Calculates the donation states of several ProposalStates in a process pool.
+    TrackedTransactions drop their provider when they're pickled, after resolving their input addresses.
+    Returns copies of the ProposalStates in the same order; they have to be merged by the caller."""
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(compute_donation_states, pstates, repeat(current_blockheight), repeat(debug)))
+
 def get_sdp_weight(epochs_from_start: int, sdp_periods: int) -> Decimal:
     # Weight calculation for SDP token holders
     # This function rounds percentages, to avoid problems with period lengths like 3.
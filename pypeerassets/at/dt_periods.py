@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from pypeerassets.at.dt_states import ProposalState
 
 
@@ -77,7 +78,81 @@ def period_query(period_dict: dict, block: int) -> tuple:
             return (key, value)
 
 def get_startendvalues(period: tuple, ps: ProposalState) -> list:
-    return get_period_dict(ps)[period]
+    # returns a copy, as the list of the cached table must not be modified by the caller.
+    return list(get_period_table(ps).period_dict[period])
+
+
+class PeriodTable(object):
+    """Sorted interval table of the periods of a ProposalState, allowing binary search lookups.
+    It is cached in the ProposalState (period_table attribute), which resets it when rounds are modified."""
+
+    def __init__(self, period_dict: dict):
+
+        self.period_dict = period_dict
+
+        # Empty periods (start after end) can never contain a block, so they're left out.
+        self.intervals = sorted([(value[0], value[1], key) for key, value in period_dict.items() if (value[1] is None) or (value[0] <= value[1])], key=lambda i: i[0])
+        self.starts = [i[0] for i in self.intervals]
+
+        # If periods overlap (should not happen with consistent rounds), the first period in the dict wins,
+        # like in period_query, so binary search can't be used.
+        self.overlapping = False
+        for (prev, nxt) in zip(self.intervals, self.intervals[1:]):
+            if (prev[1] is None) or (prev[1] >= nxt[0]):
+                self.overlapping = True
+                break
+
+    def query(self, block: int) -> tuple:
+        """Same result than period_query, but with binary search."""
+
+        if self.overlapping:
+            return period_query(self.period_dict, block)
+
+        index = bisect_right(self.starts, block) - 1
+        if index < 0:
+            return None
+
+        start, end, key = self.intervals[index]
+        if (end is None) or (block <= end):
+            return (key, self.period_dict[key])
+
+    def query_many(self, blocks: list) -> list:
+        """Returns the periods of many blocks at once, in the order of the blocks list.
+        Blocks are processed in ascending order, so the intervals are only traversed once."""
+
+        if self.overlapping:
+            return [period_query(self.period_dict, block) for block in blocks]
+
+        result = [None] * len(blocks)
+        index = 0
+
+        for pos in sorted(range(len(blocks)), key=blocks.__getitem__):
+            block = blocks[pos]
+            while (index < len(self.intervals) - 1) and (self.starts[index + 1] <= block):
+                index += 1
+
+            if self.intervals and self.starts[index] <= block:
+                start, end, key = self.intervals[index]
+                if (end is None) or (block <= end):
+                    result[pos] = (key, self.period_dict[key])
+
+        return result
+
+
+def get_period_table(ps: ProposalState) -> PeriodTable:
+    """Returns the cached PeriodTable of the ProposalState, building it if necessary."""
+
+    if getattr(ps, "period_table", None) is None:
+        ps.period_table = PeriodTable(get_period_dict(ps))
+    return ps.period_table
+
+def get_period(ps: ProposalState, block: int) -> tuple:
+    """Returns the period of a block as (period code, [start, end]), using the cached PeriodTable."""
+    return get_period_table(ps).query(block)
+
+def get_periods(ps: ProposalState, blocks: list) -> list:
+    """Returns the periods of a list of blocks, using the cached PeriodTable."""
+    return get_period_table(ps).query_many(blocks)
 
 def humanreadable_to_periodcode(period_str: str, period_index: int) -> tuple:
     """The humanreadable format is for example 'voting, 0' or 'signalling, 2' """
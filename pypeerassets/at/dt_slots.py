@@ -21,14 +21,41 @@ def get_raw_slot(tx_amount: int, av_amount: int, total_amount: int=None, round_t
     return min(tx_amount, max_slot)
 
 
-def get_first_serve_slot(stx: SignallingTransaction, round_txes: list, slot_rest: int=0) -> int:
+class SlotTable(object):
+    """Lookup tables of the valid reserve and signalling txes of a round, so the slot of each tx
+    can be calculated without rebuilding txid lists and partial sums for every transaction."""
+
+    def __init__(self, rtxes: list, stxes: list):
+
+        self.rtx_txids = set([t.txid for t in rtxes])
+        self.stx_positions = {}
+        self.stx_cumulative_amounts = [0] # amount signalled by all stxes before position n
+
+        for pos, stx in enumerate(stxes):
+            self.stx_positions.setdefault(stx.txid, pos)
+            self.stx_cumulative_amounts.append(self.stx_cumulative_amounts[-1] + stx.amount)
+
+    def amount_before(self, txid: str) -> int:
+        """Returns the sum of the amounts of the signalling txes preceding the tx."""
+
+        if txid not in self.stx_positions:
+            raise ValueError("Transaction {} not in round list.".format(txid))
+
+        return self.stx_cumulative_amounts[self.stx_positions[txid]]
+
+
+def get_first_serve_slot(stx: SignallingTransaction, round_txes: list, slot_rest: int=0, table: SlotTable=None) -> int:
     """Calculates the slot in First come first serve rounds (3, 7)
     Assumes chronological order of txes (should work, otherwise we would need a function retrieving the block).
-    Only accepts SignallingTXes, not reserve txes."""
+    Only accepts SignallingTXes, not reserve txes.
+    If a SlotTable of round_txes is given, it's used instead of searching the list."""
 
     try:
-        stx_pos = [t.txid for t in round_txes].index(stx.txid) # MODIFIED: now we use Txid as marker.
-        amount_before_stx = sum([tx.amount for tx in round_txes[:stx_pos]])
+        if table is not None:
+            amount_before_stx = table.amount_before(stx.txid)
+        else:
+            stx_pos = [t.txid for t in round_txes].index(stx.txid) # MODIFIED: now we use Txid as marker.
+            amount_before_stx = sum([tx.amount for tx in round_txes[:stx_pos]])
 
         if amount_before_stx < slot_rest:
             return min(stx.amount, slot_rest - amount_before_stx)
@@ -38,7 +65,7 @@ def get_first_serve_slot(stx: SignallingTransaction, round_txes: list, slot_rest
     except IndexError:
         return 0
 
-def get_priority_slot(tx: TrackedTransaction, rtxes: list, stxes: list, av_amount: int, ramount: int=None, samount: int=None, debug: bool=False) -> int:
+def get_priority_slot(tx: TrackedTransaction, rtxes: list, stxes: list, av_amount: int, ramount: int=None, samount: int=None, table: SlotTable=None, debug: bool=False) -> int:
     """Calculates the slot in rounds with two groups of transactions with  different priority (rd 2, 3, 5 and 6).
     Reserve transactions in these rounds have a higher priority than signalling txes."""
 
@@ -51,11 +78,16 @@ def get_priority_slot(tx: TrackedTransaction, rtxes: list, stxes: list, av_amoun
         print("SLOT: tx txid:", tx.txid)
         print("SLOT: reserved amount: {}, signalled amount: {}, total available_amount: {}".format(ramount, samount, av_amount))
 
-    if tx.txid in [r.txid for r in rtxes]:
+    if table is not None:
+        is_rtx, is_stx = (tx.txid in table.rtx_txids), (tx.txid in table.stx_positions)
+    else:
+        is_rtx, is_stx = (tx.txid in [r.txid for r in rtxes]), (tx.txid in [s.txid for s in stxes])
+
+    if is_rtx:
         slot = get_raw_slot(tx.reserved_amount, av_amount, total_amount=ramount)
         if debug: print("SLOT: tx reserved amount:", tx.reserved_amount)
 
-    elif tx.txid in [s.txid for s in stxes]:
+    elif is_stx:
 
         slot_rest = max(0, av_amount - ramount)
         if slot_rest > 0:
@@ -1,5 +1,5 @@
-from pypeerassets.at.dt_slots import get_raw_slot, get_first_serve_slot, get_priority_slot
-from pypeerassets.at.dt_entities import TrackedTransaction, ProposalTransaction, SignallingTransaction, DonationTransaction, LockingTransaction, InvalidTrackedTransactionError
+from pypeerassets.at.dt_slots import get_raw_slot, get_first_serve_slot, get_priority_slot, SlotTable
+from pypeerassets.at.dt_entities import TrackedTransaction, ProposalTransaction, SignallingTransaction, DonationTransaction, LockingTransaction, InvalidTrackedTransactionError, TrackedTxIndex
 from decimal import Decimal
 from copy import deepcopy
 
@@ -36,6 +36,8 @@ class ProposalState(object):
         self.all_locking_txes = []
         self.all_donation_txes = []
         self.all_voting_txes = []
+        # Voting txes grouped by epoch, sorted by the "last vote counts" rule. Set by set_voting_buckets.
+        self.voting_txes_by_epoch = None
 
         # The following attributes are set by the parser once a proposal ends.
         # Only valid transactions are recorded in them.
@@ -88,6 +90,9 @@ class ProposalState(object):
         # When a proposal is recorded, both phases are calculated.
         # When a proposal has been modified, phase 2 is recalculated.
 
+        # The cached period table (see dt_periods) is invalid after a change of the rounds.
+        self.period_table = None
+
         # 1. Calculate round starts
         epoch_length = self.deck.epoch_length
         rd_unit = self.deck.standard_round_unit
@@ -156,6 +161,7 @@ class ProposalState(object):
         if self.first_ptx.epoch_number != self.valid_ptx.epoch_number:
             self.set_rounds(modification=True)
             self.end_epoch = self.start_epoch + self.valid_ptx.epoch_number
+            self.period_table = None # end_epoch was changed after set_rounds.
 
         # 2. Re-setting required coin amount and derivative attributes
         if self.first_ptx.req_amount != self.valid_ptx.req_amount:
@@ -187,6 +193,8 @@ class ProposalState(object):
 
         # dstates is a list containing a dict with the txid of the signalling or reserve transaction as key
         self.donation_states = dstates = [{} for i in range(8)]
+        # SlotTables of the valid reserve/signalling txes of each round, set when the round is processed.
+        self.slot_tables = [None for i in range(8)]
 
         # Once the proposal has ended and the number of proposals is known, the reward of each donor can be set
         # TODO: not strictly necessary, could be managed with an exception thrown if dist_factor is None
@@ -283,6 +291,7 @@ class ProposalState(object):
         self.reserved_amounts[rd] = total_reserved_amount
         self.signalling_txes[rd] = valid_stxes
         self.signalled_amounts[rd] = sum([tx.amount for tx in valid_stxes])
+        self.slot_tables[rd] = SlotTable(valid_rtxes, valid_stxes)
         self.effective_slots[rd] = 0
         self.donated_amounts[rd] = 0
 
@@ -315,7 +324,7 @@ class ProposalState(object):
                 continue
 
             if rd < 4:
-                locking_tx = self._get_ttx_successor(rd, tx, self.sorted_ltxes[rd], selected_successors, debug=debug, mode="origin")
+                locking_tx = self._get_ttx_successor(rd, tx, self.sorted_ltxes[rd], selected_successors, debug=debug, mode="origin", successor_index=self.ltx_indexes[rd])
 
                 # If the timelock is not correct, the LockingTransaction is not added, and no DonationTransaction is taken into account.
                 # The DonationState will be incomplete/abandoned in this case. Only the SignallingTx is being added.
@@ -333,12 +342,12 @@ class ProposalState(object):
                     if debug: print("DONATION: Lookup Successor for locking tx:", locking_tx.txid)
 
                     # special case: all potential successors of donation transactions in rounds 0-3 are in round 0 (see above).
-                    donation_tx = self._get_ttx_successor(rd, locking_tx, self.sorted_dtxes[0], selected_successors, debug=debug)
+                    donation_tx = self._get_ttx_successor(rd, locking_tx, self.sorted_dtxes[0], selected_successors, debug=debug, successor_index=self.dtx_indexes[0])
                     if debug and donation_tx: print("DONATION: Donation tx added in locking mode", donation_tx.txid, rd)
 
             else:
                 if debug: print("DONATION: Lookup Successor for reserve/signalling tx:", tx.txid)
-                donation_tx = self._get_ttx_successor(rd, tx, self.sorted_dtxes[rd], selected_successors, debug=debug, mode="origin")
+                donation_tx = self._get_ttx_successor(rd, tx, self.sorted_dtxes[rd], selected_successors, debug=debug, mode="origin", successor_index=self.dtx_indexes[rd])
                 if debug and donation_tx: print("DONATION: Donation tx added in donation mode", donation_tx.txid, rd)
 
             if donation_tx:
@@ -417,8 +426,9 @@ class ProposalState(object):
 
         return result
 
-    def _get_ttx_successor(self, rd: int, tx: TrackedTransaction, potential_successors: list, selected_successors: list, mode: str=None, debug: bool=False) -> TrackedTransaction:
-        """This method definitively selects the successor of a SignallingTransaction or LockingTransaction."""
+    def _get_ttx_successor(self, rd: int, tx: TrackedTransaction, potential_successors: list, selected_successors: list, mode: str=None, debug: bool=False, successor_index: TrackedTxIndex=None) -> TrackedTransaction:
+        """This method definitively selects the successor of a SignallingTransaction or LockingTransaction.
+           successor_index is the TrackedTxIndex of potential_successors."""
 
         try:
             # origin mode: when Locking/Donation transactions are checked as origin transactions,
@@ -432,10 +442,11 @@ class ProposalState(object):
 
             if type(selected_tx) == DonationTransaction:
                 selected_tx.set_donor_address(direct_predecessor=tx)
+                self._update_donor_indexes(selected_tx)
 
         except AttributeError: # successor still not existing
 
-            indirect_successors = tx.get_indirect_successors(potential_successors, reserve_mode=reserve_mode)
+            indirect_successors = tx.get_indirect_successors(potential_successors, reserve_mode=reserve_mode, index=successor_index)
             if debug: print("DONATION: Indirect Successors of tx", tx.txid, ":" ,[t.txid for t in indirect_successors])
 
             for suc_tx in indirect_successors:
@@ -447,6 +458,7 @@ class ProposalState(object):
 
                     if type(selected_tx) == DonationTransaction:
                         selected_tx.set_donor_address(direct_predecessor=tx)
+                        self._update_donor_indexes(selected_tx)
                     break
                 elif debug:
                     if suc_tx.txid in selected_successors:
@@ -508,6 +520,10 @@ class ProposalState(object):
 
             result.append(sorted_tx_group)
 
+        # Lookup tables for successor search (spent outputs and donor addresses) of Locking/DonationTransactions.
+        self.ltx_indexes = [TrackedTxIndex(rd_txes) for rd_txes in result[1]]
+        self.dtx_indexes = [TrackedTxIndex(rd_txes) for rd_txes in result[2]]
+
         return result
 
     def set_direct_successors(self):
@@ -515,27 +531,33 @@ class ProposalState(object):
         for rd in range(8):
             for stx in self.sorted_stxes[rd]:
                 if rd < 4:
-                    if stx.set_direct_successor(self.sorted_ltxes[rd]):
+                    if stx.set_direct_successor(self.sorted_ltxes[rd], index=self.ltx_indexes[rd]):
                         selected_successors.append(stx.direct_successor)
                 else:
-                    if stx.set_direct_successor(self.sorted_dtxes[rd]):
+                    if stx.set_direct_successor(self.sorted_dtxes[rd], index=self.dtx_indexes[rd]):
                         selected_successors.append(stx.direct_successor)
             if rd < 4:
                 for ltx in self.sorted_ltxes[rd]:
                     if rd < 3:
-                        if ltx.set_direct_successor(self.sorted_ltxes[rd + 1], reserve_mode=True):
+                        if ltx.set_direct_successor(self.sorted_ltxes[rd + 1], reserve_mode=True, index=self.ltx_indexes[rd + 1]):
                             selected_successors.append(ltx.reserve_successor)
                     # Donation transactions of the first 4 rounds are in group 0
-                    if ltx.set_direct_successor(self.sorted_dtxes[0]):
+                    if ltx.set_direct_successor(self.sorted_dtxes[0], index=self.dtx_indexes[0]):
                         selected_successors.append(ltx.direct_successor)
 
             if rd < 7:
                 for dtx in self.sorted_dtxes[rd]:
-                    if dtx.set_direct_successor(self.sorted_dtxes[rd + 1], reserve_mode=True):
+                    if dtx.set_direct_successor(self.sorted_dtxes[rd + 1], reserve_mode=True, index=self.dtx_indexes[rd + 1]):
                         selected_successors.append(dtx.reserve_successor)
 
         return selected_successors
 
+    def _update_donor_indexes(self, tx: TrackedTransaction):
+        # The donor address of a DonationTransaction was changed: it has to be updated in all indexes containing it.
+        # (Donation transactions of rounds 1-4 are present in several round lists.)
+        if type(tx) == DonationTransaction:
+            for index in self.dtx_indexes:
+                index.update_donor_address(tx)
 
     def set_dist_factor(self, ending_proposals):
         # Proposal factor: if there is more than one proposal ending in the same epoch,
@@ -601,6 +623,7 @@ class ProposalState(object):
 
         # Locking or DonationTransactions: we simply look for the DonationState including it
         # If it's not in any of the valid states, it can't be valid.
+        dstates_by_txid, dstate_pos_by_donor = self._get_dstate_lookup_tables(valid_dstates)
 
         for tx in origin_tx_list:
 
@@ -616,16 +639,11 @@ class ProposalState(object):
             if debug: print("Checking tx:", tx.txid, type(tx))
             if type(tx) in (LockingTransaction, DonationTransaction):
 
-                for dstate in valid_dstates:
-                    if (dstate.locking_tx is not None) and (dstate.locking_tx.txid == tx.txid):
-                        break
-                    elif (dstate.donation_tx is not None) and (dstate.donation_tx.txid == tx.txid):
-                        break
-                else:
+                if tx.txid not in dstates_by_txid:
                     if debug: print("Transaction rejected by priority check:", tx.txid)
                     self._delete_invalid_successor(successor_tx, selected_successors)
                     continue
-                parent_dstate = dstate
+                parent_dstate = dstates_by_txid[tx.txid]
 
             # In the case of signalling transactions, we must look for donation/locking TXes
             # using the spending address as donor address, because the used output can be another one.
@@ -637,18 +655,16 @@ class ProposalState(object):
                     self._delete_invalid_successor(successor_tx, selected_successors)
                     continue
 
-                for dstate in valid_dstates:
-                    #if debug: print("Donation state checked:", dstate.id, "for tx", tx.txid, "with input addresses", tx.input_addresses)
-                    if dstate.donor_address in tx.input_addresses:
-
-                        parent_dstate = dstate
-                        self.add_donor_address(tx.donor_address, tx.ttx_type, (dist_round // 4))
-                        break
-                else:
+                # If several input addresses belong to donation states, the first state in valid_dstates is selected.
+                dstate_positions = [dstate_pos_by_donor[a] for a in tx.input_addresses if a in dstate_pos_by_donor]
+                if len(dstate_positions) == 0:
                     if debug: print("Transaction rejected by priority check:", tx.txid)
                     self._delete_invalid_successor(successor_tx, selected_successors)
                     continue
 
+                parent_dstate = valid_dstates[min(dstate_positions)]
+                self.add_donor_address(tx.donor_address, tx.ttx_type, (dist_round // 4))
+
             try:
 
                 if (dist_round < 4) and (parent_dstate.locking_tx.amount >= (Decimal(parent_dstate.slot) * fill_threshold)): # we could use the "complete" attribute? or only in the case of DonationTXes?
@@ -668,6 +684,22 @@ class ProposalState(object):
 
         return valid_txes
 
+    @staticmethod
+    def _get_dstate_lookup_tables(valid_dstates: list) -> tuple:
+        """Returns two dicts for _validate_priority: txid of locking/donation tx -> DonationState,
+        and donor address -> position of the first DonationState of the donor in valid_dstates."""
+        # setdefault keeps the first matching state, as the sequential search did.
+        dstates_by_txid, dstate_pos_by_donor = {}, {}
+
+        for pos, dstate in enumerate(valid_dstates):
+            if dstate.locking_tx is not None:
+                dstates_by_txid.setdefault(dstate.locking_tx.txid, dstate)
+            if dstate.donation_tx is not None:
+                dstates_by_txid.setdefault(dstate.donation_tx.txid, dstate)
+            dstate_pos_by_donor.setdefault(dstate.donor_address, pos)
+
+        return dstates_by_txid, dstate_pos_by_donor
+
     def check_round(self, tx: TrackedTransaction, dist_round: int) -> bool:
         """Checks in which round a transaction was sent."""
 
@@ -705,14 +737,22 @@ class ProposalState(object):
         elif dist_round in (1, 2, 4, 5):
             # in priority rounds, we need to check if the signalled amounts correspond to a donation in the previous round
             # These are added to the reserved amounts (second output of DonationTransactions).
-            return get_priority_slot(tx, rtxes=self.reserve_txes[dist_round], stxes=self.signalling_txes[dist_round], av_amount=self.available_slot_amount[dist_round], ramount=self.reserved_amounts[dist_round], samount=self.signalled_amounts[dist_round], debug=debug)
+            return get_priority_slot(tx, rtxes=self.reserve_txes[dist_round], stxes=self.signalling_txes[dist_round], av_amount=self.available_slot_amount[dist_round], ramount=self.reserved_amounts[dist_round], samount=self.signalled_amounts[dist_round], table=self.slot_tables[dist_round], debug=debug)
 
         elif dist_round in (3, 7):
-            return get_first_serve_slot(tx, self.signalling_txes[dist_round], slot_rest=self.available_slot_amount[dist_round])
+            return get_first_serve_slot(tx, self.signalling_txes[dist_round], slot_rest=self.available_slot_amount[dist_round], table=self.slot_tables[dist_round])
 
         else:
             return 0 # if dist_round is incorrect
 
+    def set_voting_buckets(self):
+        """Groups all voting transactions by epoch, sorted once with the newest vote first.
+           Called by the parser after all voting transactions were loaded."""
+
+        self.voting_txes_by_epoch = {}
+        for v in sorted(self.all_voting_txes, key=lambda tx: (tx.blockheight, tx.blockseq), reverse=True):
+            self.voting_txes_by_epoch.setdefault(v.epoch, []).append(v)
+
     def process_votes(self, enabled_voters: dict, phase: int, formatted_result: bool=False, debug: bool=True):
         # stores a dictionary in initial/final votes with two keys: "positive" and "negative",
         # weighted by the amounts of the tokens belonging to the voters of a proposal.
@@ -725,7 +765,7 @@ class ProposalState(object):
         # NOTE 3: This method is now called by phase, it is more transparent and efficient.
 
         votes = { "negative" : 0, "positive" : 0 }
-        voters = [] # to filter out duplicates.
+        voters = set() # to filter out duplicates.
 
         if phase == 0:
             self.initial_votes = votes
@@ -737,9 +777,11 @@ class ProposalState(object):
         if len(self.all_voting_txes) == 0:
             return
 
+        if self.voting_txes_by_epoch is None:
+            self.set_voting_buckets()
+
         voting_epoch = self.start_epoch if phase == 0 else self.end_epoch
-        phase_vtxes = [v for v in self.all_voting_txes if v.epoch == voting_epoch]
-        sorted_vtxes = sorted(phase_vtxes, key=lambda tx: (tx.blockheight, tx.blockseq), reverse=True)
+        sorted_vtxes = self.voting_txes_by_epoch.get(voting_epoch, [])
 
         for v in sorted_vtxes: # reversed for the "last vote counts" rule.
             if debug: print("VOTING: Vote: Epoch", v.epoch, "txid:", v.txid, "sender:", v.sender, "outcome:", v.vote, "height", v.blockheight)
@@ -751,7 +793,7 @@ class ProposalState(object):
                     vote_outcome = "positive" if v.vote else "negative"
                     votes[vote_outcome] += voter_balance
                     if debug: print("VOTING: Balance of outcome", vote_outcome, "increased by", voter_balance)
-                    voters.append(v.sender)
+                    voters.add(v.sender)
 
                     # set the weight in the transaction (vote_weight attribute)
                     v.set_weight(voter_balance)
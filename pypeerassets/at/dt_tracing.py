@@ -0,0 +1,126 @@
+"""Tracing hooks for the DT parser.
+A ParserTracer collects timed spans of the main parser steps (init_parser sub-steps, epoch_init, epoch_postprocess,
+set_donation_states and the validation of the cards of each epoch), with the numbers of cards and transactions processed.
+Each finished span is a dict with name, start, duration (seconds) and its attributes, and is passed to the callback,
+so it can be fed to a metrics system.
+
+Tracing is disabled by default (NullTracer), which only costs a few no-op calls per epoch.
+A tracer can be passed to dt_parser or ParserState, or set as default for all parser runs
+(e.g. those started by find_all_valid_cards) with the tracing context manager:
+
+    tracer = ParserTracer()
+    with tracing(tracer):
+        cards = list(find_all_valid_cards(provider, deck))
+    print(tracer.summary())"""
+
+import time
+from contextlib import contextmanager
+
+
+class Span(object):
+    """A running span. Attributes (e.g. counts known only at the end) can be added with set()."""
+
+    def __init__(self, tracer: object, name: str, attributes: dict) -> None:
+
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.tracer.emit(self.name, time.perf_counter() - self.start, start=self.start, **self.attributes)
+
+
+class NullSpan(object):
+    """Span of a disabled tracer."""
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class NullTracer(object):
+    """Disabled tracer, used if no tracer is given."""
+
+    enabled = False
+
+    def span(self, name: str, **attributes) -> NullSpan:
+        return NULL_SPAN
+
+    def emit(self, name: str, duration: float, start: float=None, **attributes) -> None:
+        pass
+
+
+class ParserTracer(object):
+    """Collects the spans of parser runs. callback (optional) is called with each finished span.
+       With keep_spans=False the spans are only passed to the callback and summarized, not stored."""
+
+    enabled = True
+
+    def __init__(self, callback: object=None, keep_spans: bool=True) -> None:
+
+        self.callback = callback
+        self.keep_spans = keep_spans
+        self.spans = []
+        self.totals = {} # name -> summary of all spans with this name
+
+    def span(self, name: str, **attributes) -> Span:
+        """Returns a context manager measuring the duration of the enclosed code."""
+        return Span(self, name, attributes)
+
+    def emit(self, name: str, duration: float, start: float=None, **attributes) -> None:
+        """Records a finished span, e.g. one whose duration was accumulated over several calls."""
+
+        span = {"name" : name, "start" : start, "duration" : duration, **attributes}
+        if self.keep_spans:
+            self.spans.append(span)
+
+        total = self.totals.setdefault(name, {"spans" : 0, "duration" : 0.0})
+        total["spans"] += 1
+        total["duration"] += duration
+        # numeric attributes (counts) are summed up, except identifiers like the epoch.
+        for key, value in attributes.items():
+            if type(value) == int and key != "epoch":
+                total[key] = total.get(key, 0) + value
+
+        if self.callback is not None:
+            self.callback(span)
+
+    def summary(self) -> dict:
+        """Returns the number of spans, the total duration and the summed counts per span name."""
+        return {name : dict(total) for name, total in self.totals.items()}
+
+
+default_tracer = NullTracer()
+
+
+def get_tracer(tracer: object=None) -> object:
+    """Returns tracer, or the default tracer if it's None."""
+    return tracer if tracer is not None else default_tracer
+
+
+@contextmanager
+def tracing(tracer: ParserTracer):
+    """Sets tracer as default tracer of all parser runs started inside the with block."""
+
+    global default_tracer
+    previous_tracer = default_tracer
+    default_tracer = tracer
+    try:
+        yield tracer
+    finally:
+        default_tracer = previous_tracer
@@ -1,3 +1,5 @@
+from copy import deepcopy
+
 from btcpy.structs.address import P2pkhAddress
 from btcpy.structs.crypto import PublicKey
 from btcpy.structs.script import NulldataScript, UnknownScript, StackData
@@ -23,7 +25,11 @@ class BaseTrackedTransaction(Transaction):
         object.__setattr__(self, 'network', network)
         object.__setattr__(self, 'timestamp', timestamp)
 
-        object.__setattr__(self, 'input_addresses', self.set_input_addresses(provider=provider))
+        # Input addresses are resolved lazily (input_addresses property), as many tracked txes are discarded.
+        # _parent_txes is a dict of parent transactions (txid -> json) which can be shared between txes.
+        object.__setattr__(self, '_input_addresses', None)
+        object.__setattr__(self, '_provider', provider)
+        object.__setattr__(self, '_parent_txes', None)
 
         blockseq = None
 
@@ -77,6 +83,8 @@ class BaseTrackedTransaction(Transaction):
         d = self.__dict__
         strlist = []
         for attr, value in d.items():
+            if attr in ("_provider", "_parent_txes"):
+                continue
             if attr in ("ins", "outs"):
                 string = "{}=[{}]".format(attr, ", ".join(str(item) for item in value))
             else:
@@ -86,10 +94,33 @@ class BaseTrackedTransaction(Transaction):
         return '{}({})'.format(type(self).__name__, ", ".join(strlist))
 
 
+    def __getstate__(self):
+        """The provider can't be pickled, so the input addresses are resolved before it's dropped."""
+        self.input_addresses
+        state = self.__dict__.copy()
+        state.update({"_provider" : None, "_parent_txes" : None})
+        return state
+
+    def __deepcopy__(self, memo):
+        # Copies share the provider and the parent tx cache, so input addresses can still be resolved lazily.
+        memo.update({id(self._provider) : self._provider, id(self._parent_txes) : self._parent_txes})
+        new_tx = self.__class__.__new__(self.__class__)
+        memo.update({id(self) : new_tx})
+        for attr, value in self.__dict__.items():
+            object.__setattr__(new_tx, attr, deepcopy(value, memo))
+        return new_tx
+
     @property
     def txid(self):
         return self._txid
 
+    @property
+    def input_addresses(self):
+        # Memoized: resolved only the first time they're needed.
+        if self._input_addresses is None:
+            object.__setattr__(self, '_input_addresses', self.set_input_addresses(provider=self._provider))
+        return self._input_addresses
+
     @property
     def deckid(self):
         return self.deck.id # self.deck always comes from the ParserState.
@@ -105,8 +136,10 @@ class BaseTrackedTransaction(Transaction):
         return {"data" : data, "json" : json}
 
     @classmethod
-    def from_json(cls, tx_json, provider, deck=None):
-        network = net_query(provider.network)
+    def from_json(cls, tx_json, provider, deck=None, network=None):
+        # network: resolved network parameters, passed by the parser to avoid querying provider.network per tx.
+        if network is None:
+            network = net_query(provider.network)
         try:
 
             return cls(
@@ -127,12 +160,12 @@ class BaseTrackedTransaction(Transaction):
 
 
     @classmethod
-    def from_txid(cls, txid, provider, deck=None, basicdata=None):
+    def from_txid(cls, txid, provider, deck=None, basicdata=None, network=None):
 
         if basicdata is None:
            basicdata = cls.get_basicdata(txid, provider)
 
-        return cls.from_json(basicdata["json"], provider=provider, deck=deck)
+        return cls.from_json(basicdata["json"], provider=provider, deck=deck, network=network)
 
     def coin_multiplier(self):
 
@@ -149,7 +182,10 @@ class BaseTrackedTransaction(Transaction):
     def get_input_address_from_txid(self, txid, txout, provider):
         # mainly for P2PK transactions, where no public key is given in the input.
 
-        inp_txjson = provider.getrawtransaction(txid, 1)
+        if (self._parent_txes is not None) and (txid in self._parent_txes):
+            inp_txjson = self._parent_txes[txid]
+        else:
+            inp_txjson = provider.getrawtransaction(txid, 1)
         addr = inp_txjson["vout"][txout]["scriptPubKey"]["addresses"][0]
         return addr
 
@@ -165,6 +201,39 @@ class BaseTrackedTransaction(Transaction):
         return input_addresses
 
 
+def prefetch_parent_txes(txes: list, provider, parent_txes: dict=None) -> dict:
+    """Retrieves the parent transactions needed to resolve the input addresses of several tracked txes at once
+    (inputs without public key in the scriptSig, e.g. P2PK). Each parent tx is retrieved only once,
+    with a single batch request if the provider supports it (RpcNode),
+    and the txes use the resulting dict when their input addresses are resolved.
+    Parent txes the batch doesn't return (error entries) are left out and retrieved one by one when needed."""
+
+    if parent_txes is None:
+        parent_txes = {}
+
+    missing_txids = []
+    for tx in txes:
+        if tx._input_addresses is None:
+            for inp in tx.ins:
+                if (len(inp.script_sig.__str__().split()) < 2) and (inp.txid not in parent_txes) and (inp.txid not in missing_txids):
+                    missing_txids.append(inp.txid)
+            object.__setattr__(tx, '_parent_txes', parent_txes)
+
+    if len(missing_txids) == 0:
+        return parent_txes
+
+    if hasattr(provider, "batch"):
+        result = provider.batch([('getrawtransaction', [txid, 1]) for txid in missing_txids])
+        for txid, r in zip(missing_txids, result):
+            if r.get("result") is not None:
+                parent_txes.update({txid : r["result"]})
+    else:
+        for txid in missing_txids:
+            parent_txes.update({txid : provider.getrawtransaction(txid, 1)})
+
+    return parent_txes
+
+
 class InvalidTrackedTransactionError(ValueError):
     # raised anytime when a (Base)TrackedTransaction is not following the intended format.
     pass
@@ -0,0 +1,118 @@
+"""Compact records of tracked transactions, created directly from getrawtransaction JSON.
+A full TrackedTransaction contains btcpy TxIn/TxOut objects with parsed scripts for every input and output,
+but most of the DT logic only needs a few fields (txid, first input, values and addresses of the donation
+and reserve outputs, the OP_RETURN data). TrackedTxRecords keep only these fields and the raw transaction
+in slots, and the TrackedTransaction can be materialized on demand.
+The ParserState keeps the records of each proposal and materializes them when the proposal's votes
+or donation states are processed, so txes of proposals which never get there don't become full objects."""
+
+from pypeerassets.pautils import read_tx_opreturn
+from pypeerassets.transactions import Transaction
+from pypeerassets.networks import net_query
+from pypeerassets.at.protobuf_utils import parse_protobuf
+from pypeerassets.at.ttx_base import InvalidTrackedTransactionError
+from pypeerassets.at.constants import DATASTR_OUTPUT, DONATION_OUTPUT, RESERVED_OUTPUT
+
+
+class TrackedTxRecord(object):
+    """Slotted record of a transaction.
+       outputs contains (value, address) tuples of the donation/signalling and the reserve output, if present,
+       with the value in coins as given in the JSON. raw is the serialized transaction (bytes), if the JSON contains it."""
+
+    __slots__ = ("txid", "blockhash", "timestamp", "first_input", "outputs", "datastr", "raw")
+
+    def __init__(self, txid: str, blockhash: str, timestamp: int, first_input: tuple, outputs: tuple, datastr: bytes=None, raw: bytes=None):
+
+        self.txid = txid
+        self.blockhash = blockhash
+        self.timestamp = timestamp
+        self.first_input = first_input
+        self.outputs = outputs
+        self.datastr = datastr
+        self.raw = raw
+
+    @classmethod
+    def from_json(cls, tx_json: dict) -> "TrackedTxRecord":
+        """Creates the record from getrawtransaction JSON. Unconfirmed transactions have no blockhash (None)."""
+
+        vin, vout = tx_json["vin"], tx_json["vout"]
+        first_input = (vin[0].get("txid"), vin[0].get("vout")) if len(vin) > 0 else None
+        outputs = tuple((o["value"], cls._get_json_address(o)) for o in vout[DONATION_OUTPUT:RESERVED_OUTPUT + 1])
+
+        try:
+            datastr = read_tx_opreturn(vout[DATASTR_OUTPUT])
+        except Exception: # no OP_RETURN in the datastring output
+            datastr = None
+
+        raw = bytes.fromhex(tx_json["hex"]) if "hex" in tx_json else None
+
+        return cls(txid=tx_json["txid"],
+                   blockhash=tx_json.get("blockhash"),
+                   timestamp=tx_json.get("time"),
+                   first_input=first_input,
+                   outputs=outputs,
+                   datastr=datastr,
+                   raw=raw)
+
+    @staticmethod
+    def _get_json_address(vout: dict) -> str:
+        try:
+            return vout["scriptPubKey"]["addresses"][0]
+        except (KeyError, IndexError):
+            return None
+
+    def materialize(self, ttx_class: type, provider: object, deck: object=None, network: object=None) -> object:
+        """Creates the full TrackedTransaction (or subclass) object with btcpy inputs and outputs.
+           Equivalent to ttx_class.from_json with the original JSON."""
+
+        if self.raw is None:
+            raise ValueError("Record of transaction {} contains no raw transaction.".format(self.txid))
+        if self.blockhash is None:
+            raise InvalidTrackedTransactionError("Transaction without correct datastring or unconfirmed transaction.")
+
+        if network is None:
+            network = net_query(provider.network)
+        try:
+            tx = Transaction.unhexlify(self.raw.hex(), network=network)
+        except (KeyError, IndexError, ValueError):
+            raise InvalidTrackedTransactionError("Transaction can't be deserialized.")
+
+        # The timestamp is taken from the JSON (not from the serialized tx), like in from_json.
+        return ttx_class(deck=deck,
+                         provider=provider,
+                         version=tx.version,
+                         ins=tx.ins,
+                         outs=tx.outs,
+                         locktime=tx.locktime,
+                         txid=self.txid,
+                         network=network,
+                         timestamp=self.timestamp,
+                         blockhash=self.blockhash)
+
+    @property
+    def metadata(self) -> dict:
+        # Parsed every time; the record only keeps the raw data string.
+        if self.datastr is None:
+            return None
+        try:
+            return parse_protobuf(self.datastr, "ttx")
+        except ValueError:
+            return None
+
+    @property
+    def proposal_txid(self) -> str:
+        """TXID of the proposal the tx refers to, or None if it can't be read from the data string."""
+
+        metadata = self.metadata
+        try:
+            return metadata["txid"].hex()
+        except (TypeError, KeyError, AttributeError):
+            return None
+
+    def output_value(self, n: int) -> object:
+        """Value in coins of the donation/signalling (n=2) or reserve (n=3) output."""
+        return self.outputs[n - DONATION_OUTPUT][0]
+
+    def output_address(self, n: int) -> str:
+        """Address of the donation/signalling (n=2) or reserve (n=3) output."""
+        return self.outputs[n - DONATION_OUTPUT][1]
@@ -0,0 +1,180 @@
+'''Block-scan discovery mode.
+
+The standard discovery functions (find_deck_spawns, find_card_bundles, get_marked_txes) use
+listtransactions, so the P2TH addresses have to be imported into the wallet of the node,
+which requires a rescan of the blockchain. A BlockScan instead reads the raw blocks
+of a height range (several blocks in parallel) and stores all transactions paying to one of the
+watched P2TH addresses. Wrapping the provider in a BlockScanProvider makes the discovery
+functions use the scanned transactions, which are returned in chain order.
+
+Outputs are matched with a P2THFilter, which is built once from the hash160 of all watched addresses
+and looks up the script hex of each output directly, so no addresses have to be read from the outputs of the blocks.'''
+
+import concurrent.futures
+from typing import Optional
+
+from btcpy.lib.base58 import b58decode_check
+from pypeerassets.provider import Provider
+from pypeerassets.pa_constants import param_query
+
+
+P2PKH_PREFIX = "76a914" # OP_DUP OP_HASH160 PUSH(20)
+P2PKH_SUFFIX = "88ac" # OP_EQUALVERIFY OP_CHECKSIG
+
+
+def get_watched_addresses(network: str, decks: list=[], prod: bool=True, deck_spawns: bool=True, dt_tx_types: bool=True) -> dict:
+    '''Returns a dict of P2TH addresses to watch, with the account labels used by the listtransactions based functions:
+       deck spawns (PAPROD/PATEST), the decks (deck id) and the derived DT addresses (deck id + tx type in uppercase).'''
+
+    watched = {}
+    if deck_spawns:
+        pa_params = param_query(network)
+        if prod:
+            watched.update({pa_params.P2TH_addr : "PAPROD"})
+        else:
+            watched.update({pa_params.test_P2TH_addr : "PATEST"})
+
+    for deck in decks:
+        watched.update({deck.p2th_address : deck.id})
+        if dt_tx_types and getattr(deck, "at_type", None) is not None:
+            from pypeerassets.at.constants import P2TH_MODIFIER, ID_DT
+            if deck.at_type == ID_DT:
+                for tx_type in P2TH_MODIFIER:
+                    watched.update({deck.derived_p2th_address(tx_type) : deck.id + tx_type.upper()})
+
+    return watched
+
+
+def address_hash160(address: str) -> bytes:
+    '''Returns the hash160 of a base58 address (without version byte).'''
+    return b58decode_check(address)[1:]
+
+
+class P2THFilter(object):
+    '''Membership filter for P2TH addresses.
+       watched_addresses is a dict: address -> account label, e.g. from get_watched_addresses.
+       P2TH addresses are always P2PKH, so the P2PKH script of each address is precomputed
+       and every output is checked with a single lookup of its script hex.
+       For outputs without script hex the addresses in the JSON are checked.'''
+
+    def __init__(self, watched_addresses: dict) -> None:
+
+        self.addresses = watched_addresses
+        self.scripts = {P2PKH_PREFIX + address_hash160(address).hex() + P2PKH_SUFFIX : (address, label)
+                        for address, label in watched_addresses.items()}
+
+    @classmethod
+    def from_decks(cls, network: str, decks: list, prod: bool=True, deck_spawns: bool=True, dt_tx_types: bool=True) -> "P2THFilter":
+        return cls(get_watched_addresses(network, decks, prod=prod, deck_spawns=deck_spawns, dt_tx_types=dt_tx_types))
+
+    def __len__(self) -> int:
+        return len(self.scripts)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.addresses
+
+    def match_output(self, vout: dict) -> Optional[tuple]:
+        '''Returns (address, label) if the output pays to a watched address, otherwise None.'''
+
+        script_pubkey = vout.get("scriptPubKey", {})
+        script_hex = script_pubkey.get("hex")
+
+        if script_hex is not None:
+            return self.scripts.get(script_hex)
+
+        addresses = script_pubkey.get("addresses", [script_pubkey.get("address")])
+        for address in addresses:
+            if address in self.addresses:
+                return (address, self.addresses[address])
+        return None
+
+    def match(self, rawtx: dict) -> dict:
+        '''Returns the watched addresses the transaction pays to, with their labels (address -> label).'''
+
+        matches = {}
+        for vout in rawtx["vout"]:
+            route = self.match_output(vout)
+            if route is not None:
+                matches.update({route[0] : route[1]})
+        return matches
+
+
+class BlockScan(object):
+    '''Scans blocks for transactions paying to watched addresses.
+       watched_addresses is a dict: address -> account label (see get_watched_addresses), or a P2THFilter.'''
+
+    def __init__(self, provider: Provider, watched_addresses: object, max_workers: int=4, debug: bool=False) -> None:
+
+        if not isinstance(watched_addresses, P2THFilter):
+            watched_addresses = P2THFilter(watched_addresses)
+
+        self.provider = provider
+        self.p2th_filter = watched_addresses
+        self.watched_addresses = watched_addresses.addresses
+        self.labels = {label : address for address, label in self.watched_addresses.items()}
+        self.max_workers = max_workers
+        self.debug = debug
+
+        self.txes = {address : [] for address in self.watched_addresses} # address -> list of (height, blockseq, rawtx)
+        self.scanned_height = None # last scanned block
+
+    def scan(self, start_height: int, end_height: int=None) -> int:
+        '''Scans the blocks from start_height to end_height (default: current tip). Returns the last scanned height.
+           Blocks must be scanned in ascending order without gaps.'''
+
+        if end_height is None:
+            end_height = self.provider.getblockcount()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as th:
+            # map returns the results in the order of the heights, so the lists stay ordered.
+            for matches in th.map(self.scan_block, range(start_height, end_height + 1)):
+                for address, height, blockseq, rawtx in matches:
+                    self.txes[address].append((height, blockseq, rawtx))
+
+        self.scanned_height = end_height
+        if self.debug: print("SCAN: Scanned blocks {}-{}.".format(start_height, end_height))
+        return end_height
+
+    def update(self, start_height: int=0) -> int:
+        '''Scans all new blocks since the last scan, or from start_height if there was no scan yet.'''
+
+        if self.scanned_height is not None:
+            start_height = self.scanned_height + 1
+        return self.scan(start_height)
+
+    def scan_block(self, height: int) -> list:
+        '''Returns (address, height, blockseq, rawtx) tuples of the transactions in a block paying to watched addresses.'''
+
+        block = self.provider.getblock(self.provider.getblockhash(height))
+        matches = []
+
+        for blockseq, txid in enumerate(block["tx"]):
+            rawtx = self.provider.getrawtransaction(txid, 1)
+            # a tx paying several times to the same address is stored only once.
+            for address in self.p2th_filter.match(rawtx):
+                matches.append((address, height, blockseq, rawtx))
+
+        return matches
+
+    def get_txes(self, key: str, min_blockheight: int=None, max_blockheight: int=None) -> list:
+        '''Returns the raw transactions paying to an address or account label, in chain order.'''
+
+        address = self.labels.get(key, key)
+        return [rawtx for (height, blockseq, rawtx) in self.txes.get(address, [])
+                if (min_blockheight is None or height >= min_blockheight) and (max_blockheight is None or height <= max_blockheight)]
+
+    def get_txids(self, key: str) -> list:
+        return [rawtx["txid"] for rawtx in self.get_txes(key)]
+
+
+class BlockScanProvider(object):
+    '''Wraps a provider, so the discovery functions use the transactions of a BlockScan
+       instead of listtransactions. All other calls go to the wrapped provider.'''
+
+    def __init__(self, provider: Provider, block_scan: BlockScan) -> None:
+
+        self.provider = provider
+        self.block_scan = block_scan
+
+    def __getattr__(self, name: str):
+        return getattr(self.provider, name)
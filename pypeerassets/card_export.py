@@ -0,0 +1,263 @@
+'''Columnar export of cards, e.g. for analytics.
+
+CardExporter streams cards into a directory, writing them in chunks, so the cards of a deck
+never have to be held in memory at once. If pyarrow is installed, the cards are written to a Parquet file
+(one row group per chunk); otherwise each column of each chunk is written as a NumPy .npy file.
+In this format, the hash columns (txid, blockhash, donation_txid) are stored as fixed-width byte strings,
+while the columns with few distinct values (addresses and card types) are encoded as indexes into a string dictionary.
+A meta.json file contains the format, the string dictionary and the deck attributes needed to reconstruct the cards.
+
+load_cards and load_deckstate read the export again and reconstruct the CardTransfer objects
+(respectively the DeckState) without any provider calls.'''
+
+import json
+import os
+from typing import Iterable, Iterator
+
+from pypeerassets.protocol import Deck, DeckState, card_from_dict
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+STRING_COLUMNS = ("txid", "blockhash", "sender", "receiver", "type", "donation_txid")
+HASH_COLUMNS = ("txid", "blockhash", "donation_txid") # unique values, not worth a dictionary
+DICT_COLUMNS = ("sender", "receiver", "type")
+INT_COLUMNS = ("blocknum", "blockseq", "cardseq", "amount", "locktime", "lockhash_type")
+BYTES_COLUMNS = ("lockhash",)
+COLUMNS = STRING_COLUMNS + INT_COLUMNS + BYTES_COLUMNS
+
+META_FILE = "meta.json"
+PARQUET_FILE = "cards.parquet"
+
+
+def card_to_row(card: object) -> dict:
+    '''Returns the exported fields of a card. Missing values are stored as empty strings/bytes or 0.'''
+
+    return {"txid" : card.txid,
+            "blockhash" : card.blockhash or "",
+            "sender" : card.sender or "",
+            "receiver" : card.receiver[0],
+            "type" : card.type,
+            "donation_txid" : getattr(card, "donation_txid", None) or "",
+            "blocknum" : card.blocknum,
+            "blockseq" : card.blockseq,
+            "cardseq" : card.cardseq,
+            "amount" : card.amount[0],
+            "locktime" : card.locktime or 0,
+            "lockhash_type" : getattr(card, "lockhash_type", None) or 0,
+            "lockhash" : getattr(card, "lockhash", None) or b""}
+
+
+class CardExporter(object):
+    '''Writes cards to a columnar export in the directory path.
+       fmt can be "parquet" or "npy"; by default Parquet is used if pyarrow is installed.
+       Use it as a context manager or call close() at the end, otherwise the last chunk and the metadata are not written.'''
+
+    def __init__(self, path: str, deck: Deck, chunk_size: int=100000, fmt: str=None) -> None:
+
+        if fmt is None:
+            fmt = "parquet" if pyarrow is not None else "npy"
+        if fmt == "parquet" and pyarrow is None:
+            raise ImportError("pyarrow is required for the Parquet format.")
+        if fmt == "npy" and numpy is None:
+            raise ImportError("numpy is required for the npy format.")
+        if fmt not in ("parquet", "npy"):
+            raise ValueError("Unknown export format: {}".format(fmt))
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.meta = {"format" : fmt,
+                     "deck_id" : deck.id,
+                     "network" : deck.network,
+                     "deck_p2th" : deck.p2th_address,
+                     "version" : deck.version,
+                     "number_of_decimals" : deck.number_of_decimals,
+                     "chunks" : 0,
+                     "rows" : 0}
+
+        self.rows = {column : [] for column in COLUMNS}
+        self.strings = {} # npy format: string of DICT_COLUMNS -> index in the string dictionary
+        self.writer = None # Parquet writer
+
+    def __enter__(self) -> "CardExporter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, cards: Iterable) -> None:
+        '''Adds cards to the export. Chunks are written when chunk_size cards are buffered.'''
+
+        for card in cards:
+            for column, value in card_to_row(card).items():
+                self.rows[column].append(value)
+
+            if len(self.rows["txid"]) >= self.chunk_size:
+                self.flush()
+
+    def flush(self) -> None:
+        '''Writes the buffered cards as a chunk.'''
+
+        if len(self.rows["txid"]) == 0:
+            return
+
+        if self.fmt == "parquet":
+            self._write_parquet_chunk()
+        else:
+            self._write_npy_chunk()
+
+        self.meta["chunks"] += 1
+        self.meta["rows"] += len(self.rows["txid"])
+        self.rows = {column : [] for column in COLUMNS}
+
+    def _write_parquet_chunk(self) -> None:
+
+        table = pyarrow.table({column : self.rows[column] for column in COLUMNS}, schema=self._parquet_schema())
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(os.path.join(self.path, PARQUET_FILE), table.schema)
+        self.writer.write_table(table)
+
+    @staticmethod
+    def _parquet_schema() -> object:
+
+        fields = [(column, pyarrow.string()) for column in STRING_COLUMNS]
+        fields += [(column, pyarrow.uint64()) for column in INT_COLUMNS]
+        fields += [(column, pyarrow.binary()) for column in BYTES_COLUMNS]
+        return pyarrow.schema(fields)
+
+    def _write_npy_chunk(self) -> None:
+
+        chunk = self.meta["chunks"]
+        for column in DICT_COLUMNS:
+            codes = [self.strings.setdefault(s, len(self.strings)) for s in self.rows[column]]
+            self._save_npy(chunk, column, numpy.array(codes, dtype=numpy.uint32))
+        for column in HASH_COLUMNS:
+            # hex strings, so numpy's stripping of trailing null bytes doesn't affect them.
+            self._save_npy(chunk, column, numpy.array([s.encode() for s in self.rows[column]], dtype=bytes))
+        for column in INT_COLUMNS:
+            self._save_npy(chunk, column, numpy.array(self.rows[column], dtype=numpy.uint64))
+        for column in BYTES_COLUMNS:
+            # fixed length bytes; numpy strips trailing null bytes, so the length is stored separately.
+            self._save_npy(chunk, column, numpy.array(self.rows[column], dtype=bytes))
+            self._save_npy(chunk, column + "_len", numpy.array([len(b) for b in self.rows[column]], dtype=numpy.uint8))
+
+    def _save_npy(self, chunk: int, column: str, array: object) -> None:
+        numpy.save(os.path.join(self.path, "{}_{}.npy".format(column, chunk)), array)
+
+    def close(self) -> None:
+        '''Writes the last chunk and the metadata.'''
+
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+        if self.fmt == "npy":
+            # the dict preserves insertion order, so the list index is the string code.
+            self.meta["strings"] = list(self.strings)
+
+        with open(os.path.join(self.path, META_FILE), "w") as metafile:
+            json.dump(self.meta, metafile)
+
+
+def export_cards(cards: Iterable, path: str, deck: Deck, chunk_size: int=100000, fmt: str=None) -> dict:
+    '''Exports cards (e.g. find_all_valid_cards(provider, deck)) and returns the metadata.'''
+
+    with CardExporter(path, deck, chunk_size=chunk_size, fmt=fmt) as exporter:
+        exporter.write(cards)
+
+    return exporter.meta
+
+
+def load_meta(path: str) -> dict:
+
+    with open(os.path.join(path, META_FILE), "r") as metafile:
+        return json.load(metafile)
+
+
+def iter_rows(path: str) -> Iterator:
+    '''Reads the export chunk by chunk and yields the rows as dicts.'''
+
+    meta = load_meta(path)
+
+    if meta["format"] == "parquet":
+        if meta["chunks"] == 0:
+            return
+        parquet_file = pyarrow.parquet.ParquetFile(os.path.join(path, PARQUET_FILE))
+        for group in range(parquet_file.num_row_groups):
+            columns = parquet_file.read_row_group(group).to_pydict()
+            yield from (dict(zip(columns, values)) for values in zip(*columns.values()))
+
+    else:
+        strings = meta["strings"]
+        for chunk in range(meta["chunks"]):
+            columns = {}
+            for column in DICT_COLUMNS:
+                columns[column] = [strings[i] for i in _load_npy(path, chunk, column)]
+            for column in HASH_COLUMNS:
+                columns[column] = [bytes(b).decode() for b in _load_npy(path, chunk, column)]
+            for column in INT_COLUMNS:
+                columns[column] = [int(i) for i in _load_npy(path, chunk, column)]
+            for column in BYTES_COLUMNS:
+                lengths = _load_npy(path, chunk, column + "_len")
+                columns[column] = [bytes(b).ljust(int(l), b"\x00") for b, l in zip(_load_npy(path, chunk, column), lengths)]
+
+            yield from (dict(zip(columns, values)) for values in zip(*columns.values()))
+
+
+def _load_npy(path: str, chunk: int, column: str) -> object:
+    return numpy.load(os.path.join(path, "{}_{}.npy".format(column, chunk)))
+
+
+def row_to_card(row: dict, meta: dict) -> object:
+    '''Reconstructs the CardTransfer object from an exported row, without running the CardTransfer parsing logic again.'''
+
+    card = {"version" : meta["version"],
+            "network" : meta["network"],
+            "deck_id" : meta["deck_id"],
+            "deck_p2th" : meta["deck_p2th"],
+            "number_of_decimals" : meta["number_of_decimals"],
+            "txid" : row["txid"],
+            "blockhash" : row["blockhash"],
+            "sender" : row["sender"],
+            "receiver" : [row["receiver"]],
+            "amount" : [row["amount"]],
+            "type" : row["type"],
+            "blocknum" : row["blocknum"],
+            "blockseq" : row["blockseq"],
+            "cardseq" : row["cardseq"],
+            "locktime" : row["locktime"],
+            "cid" : "{}{}{}".format(row["txid"], row["blockseq"], row["cardseq"])}
+
+    # like in CardTransfer, lockhash attributes only exist for cards with all three lock values.
+    if row["locktime"] and row["lockhash"] and row["lockhash_type"]:
+        card.update({"lockhash" : row["lockhash"], "lockhash_type" : row["lockhash_type"]})
+    if row["donation_txid"]:
+        card.update({"donation_txid" : row["donation_txid"]})
+
+    return card_from_dict(card)
+
+
+def load_cards(path: str) -> Iterator:
+    '''Yields the exported cards as CardTransfer objects.'''
+
+    meta = load_meta(path)
+    return (row_to_card(row, meta) for row in iter_rows(path))
+
+
+def load_deckstate(path: str, cleanup_height: int=None, debug: bool=False) -> DeckState:
+    '''Calculates the DeckState from the exported cards.
+       The export must contain the valid cards (as returned by find_all_valid_cards).'''
+
+    return DeckState(load_cards(path), cleanup_height=cleanup_height, debug=debug)
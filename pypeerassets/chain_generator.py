@@ -0,0 +1,575 @@
+"""Deterministic generator of synthetic chains for offline benchmarks and tests.
+A ChainGenerator builds a chain with deck spawns, card issuances and transfers (including locks),
+AT donations with their issuance cards and full DT proposal lifecycles (proposal, votes in both phases,
+signalling, locking and release of donations, direct donations and the reward claims), and serves it
+through a MemoryProvider. The same seed always produces the same chain.
+
+Transactions are in getrawtransaction JSON format, with synthetic txids. Each block starts with a
+coinbase-like funding transaction, whose outputs pay the fees and amounts of the other transactions in the block,
+so every input spends an existing output and the senders can be looked up like in a real chain.
+
+Usage: python -m pypeerassets.chain_generator [number_of_transfers] [fixture_path] (default: 100000, no fixture).
+Needs no client daemon."""
+
+import sys
+import time
+from decimal import Decimal
+from hashlib import sha256
+from random import Random
+
+from btcpy.structs.address import P2shAddress
+from btcpy.structs.script import P2shScript
+
+from pypeerassets.protocol import Deck, CardTransfer, IssueMode
+from pypeerassets.provider.memory import MemoryProvider
+from pypeerassets.networks import net_query
+from pypeerassets.pa_constants import param_query
+from pypeerassets.hash_encoding import hash_to_address
+from pypeerassets.blockscan import address_hash160
+from pypeerassets.at.dt_entities import DonationTimeLockScript
+from pypeerassets.at.protobuf_utils import serialize_ttx_metadata, serialize_deck_extended_data, serialize_card_extended_data
+import pypeerassets.at.constants as c
+
+
+P2TH_FEE = Decimal("0.01")
+DUST = Decimal("0.01")
+TX_FEE = Decimal("0.01")
+MAX_SEQUENCE = 4294967295
+
+
+class ChainGenerator(object):
+    """Builds a synthetic chain in a MemoryProvider.
+    Transactions are added to the pending block (at self.height); events scheduled with schedule()
+    are executed when their block is built, so long-running streams (e.g. card transfers or proposals)
+    are interleaved in chain order. run() builds all blocks up to the last scheduled event."""
+
+    def __init__(self, seed: int=0, network: str="tppc", n_addresses: int=1000) -> None:
+
+        self.seed = seed
+        self.rng = Random(seed)
+        self.provider = MemoryProvider(network)
+        self.network = net_query(network)
+        self.coin = int(self.network.to_unit) # satoshis per coin
+
+        self.tx_count = 0
+        self.scripts = {} # address -> P2PKH script hex
+        self.addresses = [self.new_address() for i in range(n_addresses)]
+
+        self.events = {} # height -> list of functions
+        self.block = [] # pending transactions
+        self.funding_outputs = [] # outputs of the funding tx of the pending block
+        self.funding_txid = self._new_txid()
+
+        # card balances and locks, kept to generate only valid transfers.
+        self.balances = {} # deck id -> {address : amount}
+        self.locks = {} # deck id -> {address : {lock address : amount}}
+        self.proposals = {} # deck id -> list of proposal dicts
+
+        pa_params = param_query(self.provider.network)
+        self.pa_p2th = pa_params.P2TH_addr
+        self.provider.importaddress(pa_params.P2TH_addr, "PAPROD")
+        self.provider.importaddress(pa_params.test_P2TH_addr, "PATEST")
+
+    @property
+    def height(self) -> int:
+        """Height of the pending block."""
+        return self.provider.height + 1
+
+    ### Chain building
+
+    def schedule(self, height: int, event) -> None:
+        """Calls event() when the block at height is built. Events can schedule further events."""
+
+        if height < self.height:
+            raise ValueError("Block {} was already built.".format(height))
+        self.events.setdefault(height, []).append(event)
+
+    def mine(self) -> str:
+        """Executes the events of the pending block and adds it to the chain."""
+
+        for event in self.events.pop(self.height, []):
+            event()
+
+        txes = self.block
+        if len(self.funding_outputs) > 0:
+            funding_tx = self._tx_json(self.funding_txid, [{"coinbase" : "{:08x}".format(self.height), "sequence" : MAX_SEQUENCE}], self.funding_outputs)
+            txes = [funding_tx] + txes
+
+        blockhash = self.provider.add_block(txes)
+        self.block, self.funding_outputs = [], []
+        self.funding_txid = self._new_txid()
+        return blockhash
+
+    def run(self, end_height: int=None) -> MemoryProvider:
+        """Builds blocks up to end_height (default: until all scheduled events are executed)."""
+
+        if end_height is None:
+            # events can schedule further events (e.g. the next block of a transfer stream).
+            while len(self.events) > 0 or len(self.block) > 0:
+                self.mine()
+        else:
+            while self.height <= end_height:
+                self.mine()
+
+        return self.provider
+
+    ### Addresses and scripts
+
+    def new_address(self) -> str:
+
+        h160 = sha256("{}:address:{}".format(self.seed, len(self.scripts)).encode()).digest()[:20]
+        address = hash_to_address(h160, 2, self.network)
+        self.scripts.update({address : "76a914" + h160.hex() + "88ac"})
+        return address
+
+    def _script(self, address: str) -> str:
+
+        if address not in self.scripts:
+            self.scripts.update({address : "76a914" + address_hash160(address).hex() + "88ac"})
+        return self.scripts[address]
+
+    def _new_txid(self) -> str:
+        self.tx_count += 1
+        return sha256("{}:tx:{}".format(self.seed, self.tx_count).encode()).hexdigest()
+
+    def _p2pkh_output(self, address: str, value: Decimal) -> dict:
+
+        script = self._script(address)
+        return {"value" : value,
+                "scriptPubKey" : {"asm" : "OP_DUP OP_HASH160 {} OP_EQUALVERIFY OP_CHECKSIG".format(script[6:-4]),
+                                  "hex" : script,
+                                  "reqSigs" : 1,
+                                  "type" : "pubkeyhash",
+                                  "addresses" : [address]}}
+
+    @staticmethod
+    def _nulldata_output(data: bytes) -> dict:
+
+        push = "{:02x}".format(len(data)) if len(data) <= 75 else "4c{:02x}".format(len(data))
+        return {"value" : Decimal(0),
+                "scriptPubKey" : {"asm" : "OP_RETURN " + data.hex(),
+                                  "hex" : "6a" + push + data.hex(),
+                                  "type" : "nulldata"}}
+
+    @staticmethod
+    def _p2sh_output(script: P2shScript, address: str, value: Decimal) -> dict:
+
+        return {"value" : value,
+                "scriptPubKey" : {"asm" : "OP_HASH160 {} OP_EQUAL".format(script.hexlify()[4:-2]),
+                                  "hex" : script.hexlify(),
+                                  "reqSigs" : 1,
+                                  "type" : "scripthash",
+                                  "addresses" : [address]}}
+
+    @staticmethod
+    def _tx_json(txid: str, vin: list, vout: list) -> dict:
+
+        for n, output in enumerate(vout):
+            output.update({"n" : n})
+        return {"txid" : txid, "hash" : txid, "version" : 1, "locktime" : 0, "vin" : vin, "vout" : vout}
+
+    def add_tx(self, sender: str, vout: list, inputs: list=[]) -> dict:
+        """Adds a transaction to the pending block. inputs are (txid, n, value) tuples of outputs to spend;
+        a new output of the funding tx paying to sender is added as last input, covering the rest and the fee."""
+
+        needed = sum([o["value"] for o in vout]) + TX_FEE - sum([i[2] for i in inputs])
+        self.funding_outputs.append(self._p2pkh_output(sender, needed))
+        inputs = list(inputs) + [(self.funding_txid, len(self.funding_outputs) - 1, needed)]
+
+        vin = [{"txid" : txid, "vout" : n, "scriptSig" : {"asm" : "", "hex" : ""}, "sequence" : MAX_SEQUENCE}
+               for (txid, n, value) in inputs]
+        tx = self._tx_json(self._new_txid(), vin, vout)
+        self.block.append(tx)
+        return tx
+
+    def pay(self, address: str, value: Decimal, sender: str=None) -> dict:
+        """Adds a transaction paying value coins to address, e.g. to fund a key used to build transactions."""
+
+        if sender is None:
+            sender = self.rng.choice(self.addresses)
+        return self.add_tx(sender, [self._p2pkh_output(address, value)])
+
+    ### Decks and cards
+
+    def spawn_deck(self, name: str, number_of_decimals: int=2, issue_mode: int=IssueMode.MULTI.value,
+                   asset_specific_data: bytes=None, issuer: str=None) -> Deck:
+        """Spawns a deck in the pending block. Returns the Deck, with the spawn txid as id."""
+
+        if issuer is None:
+            issuer = self.new_address()
+
+        deck = Deck(name=name, number_of_decimals=number_of_decimals, issue_mode=issue_mode,
+                    network=self.provider.network, production=True, version=1,
+                    asset_specific_data=asset_specific_data, issuer=issuer)
+
+        vout = [self._p2pkh_output(self.pa_p2th, P2TH_FEE), self._nulldata_output(deck.metainfo_to_protobuf)]
+        tx = self.add_tx(issuer, vout)
+
+        deck.id = tx["txid"]
+        deck.issue_time = self.provider.genesis_time + self.height * self.provider.block_interval
+        self.provider.importaddress(deck.p2th_address, deck.id)
+        self.balances.update({deck.id : {}})
+        self.locks.update({deck.id : {}})
+        return deck
+
+    def spawn_at_deck(self, name: str, multiplier: int=100, at_address: str=None, number_of_decimals: int=2) -> Deck:
+        """Spawns an AT deck. Donations to at_address allow to issue multiplier tokens per coin."""
+
+        if at_address is None:
+            at_address = self.new_address()
+
+        asset_specific_data = serialize_deck_extended_data(self.network, params={"at_type" : c.ID_AT,
+                                                                                 "multiplier" : multiplier,
+                                                                                 "at_address" : at_address,
+                                                                                 "addr_type" : 2,
+                                                                                 "startblock" : 0,
+                                                                                 "endblock" : 0,
+                                                                                 "extradata" : b""})
+        return self.spawn_deck(name, number_of_decimals=number_of_decimals, issue_mode=IssueMode.CUSTOM.value,
+                               asset_specific_data=asset_specific_data)
+
+    def spawn_dt_deck(self, name: str, sdp_deck: Deck, epoch_length: int=56, epoch_reward: int=1000,
+                      sdp_periods: int=1000, number_of_decimals: int=2) -> Deck:
+        """Spawns a DT deck using sdp_deck for voting. The P2TH addresses of the tx types get their labels."""
+
+        asset_specific_data = serialize_deck_extended_data(self.network, params={"at_type" : c.ID_DT,
+                                                                                 "epoch_length" : epoch_length,
+                                                                                 "epoch_reward" : epoch_reward,
+                                                                                 "min_vote" : 0,
+                                                                                 "sdp_periods" : sdp_periods,
+                                                                                 "sdp_deckid" : bytes.fromhex(sdp_deck.id),
+                                                                                 "extradata" : b""})
+        deck = self.spawn_deck(name, number_of_decimals=number_of_decimals, issue_mode=IssueMode.CUSTOM.value,
+                               asset_specific_data=asset_specific_data)
+
+        for tx_type in c.P2TH_MODIFIER:
+            self.provider.importaddress(deck.derived_p2th_address(tx_type), deck.id + tx_type.upper())
+        self.proposals.update({deck.id : []})
+        return deck
+
+    def add_card_tx(self, deck: Deck, sender: str, receivers: list, amounts: list, locktime: int=None,
+                    lockhash: bytes=None, lockhash_type: int=None, asset_specific_data: bytes=None) -> dict:
+        """Adds a card transaction to the pending block. The balances are not checked."""
+
+        card = CardTransfer(deck=deck, receiver=receivers, amount=amounts, locktime=locktime,
+                            lockhash=lockhash, lockhash_type=lockhash_type, asset_specific_data=asset_specific_data)
+
+        vout = [self._p2pkh_output(deck.p2th_address, P2TH_FEE), self._nulldata_output(card.metainfo_to_protobuf)]
+        vout += [self._p2pkh_output(receiver, DUST) for receiver in receivers]
+        return self.add_tx(sender, vout)
+
+    def issue_cards(self, deck: Deck, receivers: list, amounts: list, bundle_size: int=10) -> None:
+        """Issues cards of a MULTI/ONCE deck from the deck issuer, in bundles of up to bundle_size cards."""
+
+        for pos in range(0, len(receivers), bundle_size):
+            self.add_card_tx(deck, deck.issuer, receivers[pos:pos + bundle_size], amounts[pos:pos + bundle_size])
+
+        for receiver, amount in zip(receivers, amounts):
+            self._credit(deck, receiver, amount)
+
+    def _credit(self, deck: Deck, address: str, amount: int) -> None:
+        balances = self.balances[deck.id]
+        balances.update({address : balances.get(address, 0) + amount})
+
+    def _available(self, deck: Deck, sender: str, receiver: str) -> int:
+        # locked amounts can only be sent to the lock address (see DeckState._check_locks).
+        locks = self.locks[deck.id].get(sender, {})
+        return self.balances[deck.id].get(sender, 0) - sum([a for (address, a) in locks.items() if address != receiver])
+
+    def transfer(self, deck: Deck, lock_ratio: float=0.0, tries: int=10) -> dict:
+        """Adds a random valid transfer (or a lock, with probability lock_ratio) to the pending block.
+        Locks use the hash of a random address as lockhash and don't expire within the generated chain.
+        Returns None if no holder with available balance was found."""
+
+        holders = [a for a, balance in self.balances[deck.id].items() if balance > 0]
+        if len(holders) == 0:
+            return None
+
+        for i in range(tries):
+            sender, receiver = self.rng.choice(holders), self.rng.choice(self.addresses)
+            available = self._available(deck, sender, receiver)
+            if receiver not in (sender, deck.issuer) and available > 0:
+                break
+        else:
+            return None
+
+        amount = self.rng.randint(1, available)
+        lock = {}
+        if self.rng.random() < lock_ratio:
+            lock_address = self.rng.choice([a for a in self.addresses[:20] if a != receiver])
+            lock = {"locktime" : self.height + 10 ** 7, "lockhash" : address_hash160(lock_address), "lockhash_type" : 2}
+
+        tx = self.add_card_tx(deck, sender, [receiver], [amount], **lock)
+
+        self.balances[deck.id][sender] -= amount
+        self._credit(deck, receiver, amount)
+
+        sender_locks = self.locks[deck.id].get(sender, {})
+        if receiver in sender_locks:
+            sender_locks[receiver] = max(0, sender_locks[receiver] - amount)
+        if lock:
+            receiver_locks = self.locks[deck.id].setdefault(receiver, {})
+            receiver_locks.update({lock_address : receiver_locks.get(lock_address, 0) + amount})
+
+        return tx
+
+    def add_card_transfers(self, deck: Deck, n_transfers: int, start_height: int=None, transfers_per_block: int=100,
+                           lock_ratio: float=0.0, n_holders: int=100, holder_amount: int=None) -> None:
+        """Schedules n_transfers random transfers from start_height on. If the deck has no holders yet,
+        the issuer first issues holder_amount tokens to n_holders addresses (MULTI/ONCE decks)."""
+
+        if start_height is None:
+            start_height = self.height
+        if holder_amount is None:
+            holder_amount = 10 ** (deck.number_of_decimals + 6)
+        remaining = [n_transfers]
+
+        def transfer_block():
+            if not any(self.balances[deck.id].values()):
+                holders = self.rng.sample(self.addresses, min(n_holders, len(self.addresses)))
+                self.issue_cards(deck, holders, [holder_amount] * len(holders))
+                self.schedule(self.height + 1, transfer_block)
+                return
+
+            for i in range(min(transfers_per_block, remaining[0])):
+                self.transfer(deck, lock_ratio=lock_ratio)
+                remaining[0] -= 1
+            if remaining[0] > 0:
+                self.schedule(self.height + 1, transfer_block)
+
+        self.schedule(start_height, transfer_block)
+
+    ### AT
+
+    def add_at_donations(self, deck: Deck, n_donations: int, start_height: int=None, donations_per_block: int=10) -> None:
+        """Schedules donations to the AT address of the deck. Each donor issues the corresponding tokens in the next block."""
+
+        if start_height is None:
+            start_height = self.height
+        remaining = [n_donations]
+
+        def donation_block():
+            for i in range(min(donations_per_block, remaining[0])):
+                self.at_donation(deck)
+                remaining[0] -= 1
+            if remaining[0] > 0:
+                self.schedule(self.height + 1, donation_block)
+
+        self.schedule(start_height, donation_block)
+
+    def at_donation(self, deck: Deck, donor: str=None, value: Decimal=None) -> dict:
+        """Adds a donation to the pending block and schedules the issuance card for the next block."""
+
+        if donor is None:
+            donor = self.rng.choice(self.addresses)
+        if value is None:
+            value = Decimal(self.rng.randint(1, 10000)) / 100
+
+        donation_tx = self.add_tx(donor, [self._p2pkh_output(deck.at_address, value)])
+        issued_amount = int(value * deck.multiplier * 10 ** deck.number_of_decimals)
+
+        def issuance():
+            asset_specific_data = serialize_card_extended_data(self.network, txid=donation_tx["txid"])
+            self.add_card_tx(deck, donor, [donor], [issued_amount], asset_specific_data=asset_specific_data)
+            self._credit(deck, donor, issued_amount)
+
+        self.schedule(self.height + 1, issuance)
+        return donation_tx
+
+    ### DT
+
+    def _ttx(self, deck: Deck, sender: str, tx_type: str, params: dict, vout2: dict, inputs: list=[]) -> dict:
+
+        params = dict(params, ttx_version=1, id=c.P2TH_MODIFIER[tx_type])
+        vout = [self._p2pkh_output(deck.derived_p2th_address(tx_type), P2TH_FEE),
+                self._nulldata_output(serialize_ttx_metadata(self.network, params=params)),
+                vout2]
+        return self.add_tx(sender, vout, inputs=inputs)
+
+    def add_proposal(self, deck: Deck, height: int=None, req_amount: int=None, epoch_number: int=1,
+                     locking_donors: int=2, direct_donors: int=2, max_voters: int=10) -> dict:
+        """Schedules the lifecycle of a DT proposal, with the proposal transaction at height:
+        positive votes of SDP holders in both voting periods, signalling, locking and release
+        of locking_donors donations in round 1, direct_donors signalled donations in round 7
+        and, in the epoch after the end epoch, the claims of all donors and the proposer.
+        All amounts are in satoshi; the donations fill at most half of the requested amount.
+        Returns the proposal dict, which gets the txids and rewards when the chain is built."""
+
+        if height is None:
+            height = self.height
+        if req_amount is None:
+            req_amount = self.rng.randint(100, 10000) * self.coin
+
+        proposer = self.new_address()
+        proposal = {"proposer" : proposer, "req_amount" : req_amount, "epoch_number" : epoch_number, "donations" : []}
+        proposal.update(self.proposal_periods(deck, height, epoch_number))
+        self.proposals[deck.id].append(proposal)
+
+        # signalled amounts: locking donors get at most a quarter of the requested amount,
+        # direct donors at most a quarter of the rest, so all slots are equal to the signalled amounts.
+        locking_amounts = [self.rng.randint(1, req_amount // (4 * locking_donors)) for i in range(locking_donors)]
+        rest = req_amount - sum(locking_amounts)
+        direct_amounts = [self.rng.randint(1, rest // (4 * direct_donors)) for i in range(direct_donors)]
+
+        def proposal_tx():
+            params = {"epoch_number" : epoch_number, "description" : "Proposal {}".format(len(self.proposals[deck.id])), "req_amount" : req_amount}
+            tx = self._ttx(deck, proposer, "proposal", params, self._p2pkh_output(proposer, DUST))
+            proposal.update({"txid" : tx["txid"]})
+
+        def votes():
+            voters = sorted([a for a, balance in self.balances[deck.sdp_deckid].items() if balance > 0])
+            for voter in self.rng.sample(voters, min(max_voters, len(voters))):
+                self._ttx(deck, voter, "voting", {"proposal_id" : proposal["txid"], "vote" : True}, self._p2pkh_output(voter, DUST))
+
+        self.schedule(height, proposal_tx)
+        self.schedule(proposal["voting_periods"][0], votes)
+        self.schedule(proposal["voting_periods"][1], votes)
+
+        for amount in locking_amounts:
+            self._schedule_locked_donation(deck, proposal, amount)
+        for amount in direct_amounts:
+            self._schedule_direct_donation(deck, proposal, amount)
+
+        self.schedule(proposal["claim_height"], lambda: self._claims(deck, proposal))
+        return proposal
+
+    @staticmethod
+    def proposal_periods(deck: Deck, height: int, epoch_number: int) -> dict:
+        """First blocks of the periods and rounds used by the generator, calculated like ProposalState.set_rounds."""
+
+        epoch_length, rd_unit = deck.epoch_length, deck.standard_round_unit
+        security_period_length = max(rd_unit, 2)
+        voting_period_length = release_period_length = rd_unit * 8
+
+        start_epoch = height // epoch_length + 1
+        end_epoch = start_epoch + epoch_number + 1
+        phase1_start = start_epoch * epoch_length + security_period_length
+        phase2_start = end_epoch * epoch_length + security_period_length
+        round7_start = phase2_start + voting_period_length + release_period_length + rd_unit * 4
+
+        return {"start_epoch" : start_epoch,
+                "end_epoch" : end_epoch,
+                "req_timelock" : end_epoch * epoch_length,
+                "voting_periods" : (phase1_start, phase2_start),
+                "signalling_round1" : phase1_start + voting_period_length,
+                "locking_round1" : phase1_start + voting_period_length + rd_unit * 3,
+                "release_period" : phase2_start + voting_period_length,
+                "signalling_round7" : round7_start,
+                "donation_round7" : round7_start + rd_unit,
+                "claim_height" : (end_epoch + 1) * epoch_length}
+
+    def _schedule_locked_donation(self, deck: Deck, proposal: dict, amount: int) -> None:
+
+        donor = self.new_address()
+        value = Decimal(amount) / self.coin
+        donation = {"donor" : donor, "amount" : amount}
+        proposal["donations"].append(donation)
+        tx = {}
+
+        def signalling():
+            tx["signalling"] = self._ttx(deck, donor, "signalling", {"proposal_id" : proposal["txid"]}, self._p2pkh_output(donor, value))
+
+        def locking():
+            redeem_script = DonationTimeLockScript(raw_locktime=proposal["req_timelock"], dest_address_string=donor, network=self.network)
+            p2sh_address = P2shAddress.from_script(redeem_script, network=self.network).__str__()
+            params = {"proposal_id" : proposal["txid"], "timelock" : proposal["req_timelock"], "address" : donor, "lockhash_type" : 2}
+            tx["locking"] = self._ttx(deck, donor, "locking", params, self._p2sh_output(P2shScript(redeem_script), p2sh_address, value),
+                                      inputs=[(tx["signalling"]["txid"], 2, value)])
+
+        def release():
+            dtx = self._ttx(deck, donor, "donation", {"proposal_id" : proposal["txid"]}, self._p2pkh_output(proposal["proposer"], value),
+                            inputs=[(tx["locking"]["txid"], 2, value)])
+            donation.update({"donation_txid" : dtx["txid"]})
+
+        self.schedule(proposal["signalling_round1"], signalling)
+        self.schedule(proposal["locking_round1"], locking)
+        self.schedule(proposal["release_period"], release)
+
+    def _schedule_direct_donation(self, deck: Deck, proposal: dict, amount: int) -> None:
+
+        donor = self.new_address()
+        value = Decimal(amount) / self.coin
+        donation = {"donor" : donor, "amount" : amount}
+        proposal["donations"].append(donation)
+        tx = {}
+
+        def signalling():
+            tx["signalling"] = self._ttx(deck, donor, "signalling", {"proposal_id" : proposal["txid"]}, self._p2pkh_output(donor, value))
+
+        def donation_tx():
+            dtx = self._ttx(deck, donor, "donation", {"proposal_id" : proposal["txid"]}, self._p2pkh_output(proposal["proposer"], value),
+                            inputs=[(tx["signalling"]["txid"], 2, value)])
+            donation.update({"donation_txid" : dtx["txid"]})
+
+        self.schedule(proposal["signalling_round7"], signalling)
+        self.schedule(proposal["donation_round7"], donation_tx)
+
+    def _claims(self, deck: Deck, proposal: dict) -> None:
+        # Rewards are calculated like in ProposalState.set_dist_factor, set_proposer_reward and DonationState.set_reward.
+
+        ending_proposals = [p for p in self.proposals[deck.id] if p["end_epoch"] == proposal["end_epoch"]]
+        if len(ending_proposals) > 1:
+            dist_factor = Decimal(proposal["req_amount"]) / sum([p["req_amount"] for p in ending_proposals])
+        else:
+            dist_factor = Decimal(1)
+        total_reward = deck.epoch_reward * (10 ** deck.number_of_decimals) * dist_factor
+
+        for donation in proposal["donations"]:
+            reward = int(Decimal(donation["amount"]) / proposal["req_amount"] * total_reward)
+            donation.update({"reward" : reward})
+            if reward > 0:
+                asset_specific_data = serialize_card_extended_data(self.network, txid=donation["donation_txid"])
+                self.add_card_tx(deck, donation["donor"], [donation["donor"]], [reward], asset_specific_data=asset_specific_data)
+                self._credit(deck, donation["donor"], reward)
+
+        req_amount = proposal["req_amount"]
+        filled_amount = sum([d["amount"] for d in proposal["donations"]])
+        proposer_reward = int(Decimal((req_amount - filled_amount) / req_amount) * total_reward)
+        proposal.update({"proposer_reward" : proposer_reward})
+        if proposer_reward > 0:
+            asset_specific_data = serialize_card_extended_data(self.network, txid=proposal["txid"])
+            self.add_card_tx(deck, proposal["proposer"], [proposal["proposer"]], [proposer_reward], asset_specific_data=asset_specific_data)
+            self._credit(deck, proposal["proposer"], proposer_reward)
+
+
+def generate_chain(n_transfers: int=100000, seed: int=0, n_proposals: int=4, n_at_donations: int=100,
+                   lock_ratio: float=0.05, transfers_per_block: int=100) -> tuple:
+    """Generates a chain with a PA deck with n_transfers transfers, an AT deck with n_at_donations donations
+    and a DT deck with n_proposals proposals. Returns (generator, {deck name : Deck})."""
+
+    generator = ChainGenerator(seed=seed)
+    decks = {"pa" : generator.spawn_deck("bench_pa"),
+             "at" : generator.spawn_at_deck("bench_at"),
+             "sdp" : generator.spawn_deck("bench_sdp")}
+    decks["dt"] = generator.spawn_dt_deck("bench_dt", decks["sdp"])
+    generator.mine()
+
+    generator.issue_cards(decks["sdp"], generator.addresses[:20], [10 ** 8] * 20)
+    generator.mine()
+
+    generator.add_card_transfers(decks["pa"], n_transfers, transfers_per_block=transfers_per_block, lock_ratio=lock_ratio)
+    generator.add_at_donations(decks["at"], n_at_donations)
+
+    epoch_length = decks["dt"].epoch_length
+    for i in range(n_proposals):
+        # two proposals per epoch, so both reward distribution variants are generated.
+        generator.add_proposal(decks["dt"], height=epoch_length * (1 + i // 2) + i % 2)
+
+    generator.run()
+    return generator, decks
+
+
+def main():
+
+    n_transfers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start_time = time.perf_counter()
+    generator, decks = generate_chain(n_transfers)
+    provider = generator.provider
+    print("Generated {} blocks with {} transactions in {:.2f} s.".format(provider.height + 1, len(provider.txes), time.perf_counter() - start_time))
+
+    if len(sys.argv) > 2:
+        provider.save(sys.argv[2])
+        print("Saved fixture to", sys.argv[2])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+'''Incremental indexer for a set of decks.
+
+The DeckIndexer follows the chain tip block by block using only the basic provider calls
+(getblockcount, getblockhash, getblock, getrawtransaction), detects card transactions
+tagged with the P2TH address of one of the configured decks, and keeps the cards and
+DeckStates of these decks up to date. No P2TH address has to be imported into the wallet.
+
+Reorgs are detected comparing the stored block hashes with the chain. The indexer then
+rolls back to the fork point, discarding the cards of the orphaned blocks, and continues from there.
+
+Decks whose issue mode validates each card independently (MULTI, MONO, UNFLUSHABLE)
+have their balances updated incrementally. For all other issue modes (e.g. ONCE or CUSTOM,
+which includes AT and DT decks) the DeckState is recalculated from all cards when it's queried.'''
+
+import time
+from threading import Event
+from typing import Optional
+
+from pypeerassets.protocol import Deck, CardBundle, DeckState, IssueMode, validate_card_issue_modes
+from pypeerassets.provider import Provider
+from pypeerassets.pautils import card_bundle_parser, find_tx_sender
+from pypeerassets.exceptions import CardNumberOfDecimalsMismatch
+
+
+# Issue modes where the validity of a card does not depend on other cards.
+INCREMENTAL_ISSUE_MODES = IssueMode.MULTI.value | IssueMode.MONO.value | IssueMode.UNFLUSHABLE.value
+
+
+class DeckIndexer(object):
+    '''Follows the chain and indexes the cards of the given decks.
+       start_height is the first block to scan; by default the block of the oldest deck spawn.
+       Block hashes of the last max_reorg_depth blocks are stored to detect reorgs;
+       on deeper reorgs the indexer resyncs from start_height.'''
+
+    def __init__(self, provider: Provider, decks: list, start_height: int=None, max_reorg_depth: int=100, debug: bool=False) -> None:
+
+        self.provider = provider
+        self.decks = {deck.id : deck for deck in decks}
+        self.p2th_addresses = {deck.p2th_address : deck.id for deck in decks}
+        self.max_reorg_depth = max_reorg_depth
+        self.debug = debug
+
+        if start_height is None:
+            start_height = min([self._get_spawn_height(deck) for deck in decks])
+        self.start_height = start_height
+
+        self.reset()
+
+    def _get_spawn_height(self, deck: Deck) -> int:
+
+        blockhash = self.provider.getrawtransaction(deck.id, 1)["blockhash"]
+        return self.provider.getblock(blockhash)["height"]
+
+    def reset(self) -> None:
+        '''Discards all indexed data.'''
+
+        self.height = self.start_height - 1 # last processed block
+        self.block_hashes = {} # height -> blockhash of the last processed blocks
+        self.cards = {deckid : [] for deckid in self.decks} # all parsed cards, before issue mode validation
+        self.states = {deckid : None for deckid in self.decks} # None: must be recalculated
+
+    ### Chain following
+
+    def sync(self) -> int:
+        '''Processes all blocks up to the current chain tip. Returns the height of the last processed block.'''
+
+        while True:
+            self._check_reorg()
+            if self.height >= self.provider.getblockcount():
+                break
+            if not self._process_block(self.height + 1):
+                break
+
+        return self.height
+
+    def run(self, interval: int=10, stop_event: Event=None) -> None:
+        '''Daemon loop: syncs every interval seconds until stop_event is set.'''
+
+        while not (stop_event is not None and stop_event.is_set()):
+            self.sync()
+            if stop_event is not None:
+                stop_event.wait(interval)
+            else:
+                time.sleep(interval)
+
+    def _check_reorg(self) -> None:
+        # Looks for the highest stored block still in the main chain.
+        # If the chain got shorter, blocks over the tip are considered orphaned too.
+
+        if self.height < self.start_height:
+            return
+
+        tip = self.provider.getblockcount()
+        fork_height = min(self.height, tip)
+
+        while fork_height >= self.start_height:
+            if fork_height not in self.block_hashes:
+                if self.debug: print("INDEXER: Reorg deeper than stored blocks. Resyncing from block", self.start_height)
+                self.reset()
+                return
+            if self.provider.getblockhash(fork_height) == self.block_hashes[fork_height]:
+                break
+            fork_height -= 1
+
+        if fork_height < self.height:
+            self.rollback(fork_height)
+
+    def rollback(self, height: int) -> None:
+        '''Discards all blocks over height (the fork point of a reorg).'''
+
+        if self.debug: print("INDEXER: Rolling back from block {} to block {}.".format(self.height, height))
+
+        for block_height in [h for h in self.block_hashes if h > height]:
+            del self.block_hashes[block_height]
+
+        for deckid, cards in self.cards.items():
+            remaining_cards = [c for c in cards if c.blocknum <= height]
+            if len(remaining_cards) < len(cards):
+                self.cards[deckid] = remaining_cards
+                self.states[deckid] = None
+
+        self.height = height
+
+    def _process_block(self, height: int) -> bool:
+
+        blockhash = self.provider.getblockhash(height)
+        block = self.provider.getblock(blockhash)
+
+        # if the previous block changed since the last reorg check, the block is processed in the next round.
+        if (height - 1) in self.block_hashes and block.get("previousblockhash") != self.block_hashes[height - 1]:
+            if self.debug: print("INDEXER: Block {} does not follow the last processed block.".format(height))
+            return False
+
+        new_cards = {}
+        for blockseq, txid in enumerate(block["tx"]):
+            rawtx = self.provider.getrawtransaction(txid, 1)
+            deckid = self._get_tagged_deck(rawtx)
+            if deckid is None:
+                continue
+
+            bundle = CardBundle(deck=self.decks[deckid],
+                                sender=find_tx_sender(self.provider, rawtx),
+                                txid=txid,
+                                blockhash=blockhash,
+                                blocknum=height,
+                                blockseq=blockseq,
+                                timestamp=rawtx.get("time"),
+                                tx_confirmations=rawtx.get("confirmations", 0),
+                                vouts=rawtx["vout"])
+            try:
+                cards = list(card_bundle_parser(bundle, debug=self.debug))
+            except CardNumberOfDecimalsMismatch:
+                continue
+            if self.debug: print("INDEXER: {} cards of deck {} found in tx {}.".format(len(cards), deckid, txid))
+            new_cards.setdefault(deckid, []).extend(cards)
+
+        for deckid, cards in new_cards.items():
+            self._add_cards(deckid, cards)
+
+        self.block_hashes.update({height : blockhash})
+        for old_height in [h for h in self.block_hashes if h <= height - self.max_reorg_depth]:
+            del self.block_hashes[old_height]
+        self.height = height
+        return True
+
+    def _get_tagged_deck(self, rawtx: dict) -> Optional[str]:
+        # card transactions pay to the deck's P2TH address in the first output.
+        try:
+            address = rawtx["vout"][0]["scriptPubKey"]["addresses"][0]
+        except (KeyError, IndexError, TypeError):
+            return None
+        return self.p2th_addresses.get(address)
+
+    def _add_cards(self, deckid: str, cards: list) -> None:
+
+        self.cards[deckid].extend(cards)
+        deck = self.decks[deckid]
+        state = self.states[deckid]
+
+        if (state is not None) and deck.issue_mode and not (deck.issue_mode & ~INCREMENTAL_ISSUE_MODES):
+            state.add_cards(validate_card_issue_modes(deck.issue_mode, cards))
+        else:
+            self.states[deckid] = None
+
+    ### Query API
+
+    def get_deckstate(self, deckid: str) -> DeckState:
+        '''Returns the DeckState of the deck at the last processed block.
+           NOTE: The DeckState is shared and updated by the indexer; it must not be modified.'''
+
+        if self.states[deckid] is None:
+            deck = self.decks[deckid]
+            valid_cards = validate_card_issue_modes(deck.issue_mode, list(self.cards[deckid]), self.provider, deck)
+            self.states[deckid] = DeckState(list(valid_cards))
+
+        return self.states[deckid]
+
+    def get_balances(self, deckid: str) -> dict:
+        return dict(self.get_deckstate(deckid).balances)
+
+    def get_balance(self, deckid: str, address: str) -> int:
+        return self.get_deckstate(deckid).balances.get(address, 0)
+
+    def get_valid_cards(self, deckid: str) -> list:
+        return list(self.get_deckstate(deckid).valid_cards)
+
+    def get_cards(self, deckid: str, min_height: int=0) -> list:
+        '''Returns all parsed cards of the deck from min_height on, including invalid ones.'''
+        return [c for c in self.cards[deckid] if c.blocknum >= min_height]
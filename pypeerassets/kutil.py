@@ -51,9 +51,7 @@ class Kutil:
     def address(self) -> str:
         '''generate an address from pubkey'''
 
-        return str(self._public_key.to_address(
-                   net_query(self.network))
-                   )
+        return str(self._public_key.to_address(self.constants))
 
     @property
     def wif(self) -> str:
@@ -0,0 +1,37 @@
+'''Logging helpers.
+
+The modules log debug information with the standard logging module (loggers named after the modules,
+below the "pypeerassets" logger), with lazily formatted records, so nothing is formatted if debug logging is disabled.
+The debug flags of the functions and classes keep printing the debug output to stdout, using debug_logger,
+which emits the records of one call without modifying the logger, so calls in other threads are not affected.'''
+
+import logging
+from typing import Union
+
+
+class DebugOutput(logging.LoggerAdapter):
+    '''Adapter emitting all records passed to it, whatever the level of the logger.
+       The records go to the handlers of the logger (and its parents), or to stdout if no handler is configured.'''
+
+    def __init__(self, logger: logging.Logger) -> None:
+
+        super().__init__(logger, {})
+
+    def isEnabledFor(self, level: int) -> bool:
+
+        return True
+
+    def log(self, level: int, msg, *args, **kwargs) -> None:
+
+        record = self.logger.makeRecord(self.logger.name, level, "(unknown file)", 0, msg, args,
+                                        kwargs.get("exc_info"), extra=kwargs.get("extra"))
+        if self.logger.hasHandlers():
+            self.logger.handle(record)
+        else:
+            print(record.getMessage())
+
+
+def debug_logger(logger: logging.Logger, debug: bool=False) -> Union[logging.Logger, DebugOutput]:
+    '''Returns the logger to use for the debug records of a call: logger itself, or a DebugOutput adapter if debug is set.'''
+
+    return DebugOutput(logger) if debug else logger
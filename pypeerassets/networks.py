@@ -157,14 +157,20 @@ SlimcoinTestnet = Constants(
 
 networks = (PeercoinMainnet, PeercoinTestnet, SlimcoinMainnet, SlimcoinTestnet)
 
+# long and short names -> Constants
+networks_by_name = {**{n.name : n for n in networks}, **{n.shortname : n for n in networks}}
+
 
 def net_query(name: str) -> Constants:
     '''Find the NetworkParams for a network by its long or short name. Raises
     UnsupportedNetwork if no NetworkParams is found.
+    Already resolved NetworkParams are returned unchanged, so they can be passed instead of the name.
     '''
 
-    for net_params in networks:
-        if name in (net_params.name, net_params.shortname,):
-            return net_params
+    if type(name) == Constants:
+        return name
 
-    raise UnsupportedNetwork
+    try:
+        return networks_by_name[name]
+    except (KeyError, TypeError):
+        raise UnsupportedNetwork
@@ -40,13 +40,20 @@ params = (
 )
 
 
+# long and short network names -> PAParams
+params_by_name = {**{p.network_name : p for p in params}, **{p.network_shortname : p for p in params}}
+
+
 def param_query(name: str) -> PAParams:
     '''Find the PAParams for a network by its long or short name. Raises
     UnsupportedNetwork if no PAParams is found.
+    The NetworkParams (Constants) of the network can be passed instead of the name.
     '''
 
-    for pa_params in params:
-        if name in (pa_params.network_name, pa_params.network_shortname,):
-            return pa_params
+    if hasattr(name, "shortname"):
+        name = name.shortname
 
-    raise UnsupportedNetwork
+    try:
+        return params_by_name[name]
+    except (KeyError, TypeError):
+        raise UnsupportedNetwork
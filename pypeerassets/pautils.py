@@ -1,7 +1,10 @@
 
 '''miscellaneous utilities.'''
 
+import logging
+
 from pypeerassets.provider import Provider, RpcNode, Explorer, Cryptoid
+from pypeerassets.blockscan import BlockScanProvider
 
 from pypeerassets.exceptions import (InvalidDeckSpawn,
                                      InvalidDeckMetainfo,
@@ -28,6 +31,9 @@ from pypeerassets.protocol import Deck, CardTransfer, CardBundle
 from btcpy.structs.address import Address ### find_tx_sender coinbase bugfix ### ### LOCK ###
 from btcpy.lib.base58 import b58encode_check ### LOCK ###
 from pypeerassets.networks import net_query
+from pypeerassets.logs import debug_logger
+
+logger = logging.getLogger(__name__)
 
 
 def load_p2th_privkey_into_local_node(provider: RpcNode, prod: bool=True) -> None:
@@ -58,6 +64,46 @@ def find_tx_sender(provider: Provider, raw_tx: dict) -> str:
     return provider.getrawtransaction(txid, 1)["vout"][index]["scriptPubKey"]["addresses"][0]
 
 
+class ProviderCache(object):
+    '''Caches the block and transaction lookups needed to bundle cards,
+    so they're done only once when several decks (or several cards) share blocks and senders.
+    Only confirmed data should be requested, as it's never invalidated.'''
+
+    def __init__(self, provider: Provider) -> None:
+
+        self.provider = provider
+        self.blocks = {} # blockhash -> (height, {txid : position in block})
+        self.txes = {} # txid -> raw tx (JSON)
+
+    def getrawtransaction(self, txid: str) -> dict:
+
+        if txid not in self.txes:
+            self.txes.update({txid : self.provider.getrawtransaction(txid, 1)})
+        return self.txes[txid]
+
+    def add_txes(self, raw_txes: list) -> None:
+        '''Adds already retrieved transactions to the cache.'''
+        self.txes.update({tx["txid"] : tx for tx in raw_txes})
+
+    def get_block(self, blockhash: str) -> tuple:
+
+        if blockhash not in self.blocks:
+            block = self.provider.getblock(blockhash, decode=True)
+            self.blocks.update({blockhash : (block["height"], {txid : seq for seq, txid in enumerate(block["tx"])})})
+        return self.blocks[blockhash]
+
+    def block_height(self, blockhash: str) -> int:
+        return self.get_block(blockhash)[0]
+
+    def tx_serialization_order(self, blockhash: str, txid: str) -> int:
+        return self.get_block(blockhash)[1][txid]
+
+    def find_tx_sender(self, raw_tx: dict) -> str:
+
+        vin = raw_tx["vin"][0]
+        return self.getrawtransaction(vin["txid"])["vout"][vin["vout"]]["scriptPubKey"]["addresses"][0]
+
+
 
 def find_deck_spawns(provider: Provider, prod: bool=True) -> Iterable[str]:
     '''find deck spawn transactions via Provider,
@@ -66,6 +112,13 @@ def find_deck_spawns(provider: Provider, prod: bool=True) -> Iterable[str]:
 
     pa_params = param_query(provider.network)
 
+    if isinstance(provider, BlockScanProvider):
+
+        if prod:
+            decks = (i for i in provider.block_scan.get_txids(pa_params.P2TH_addr))
+        else:
+            decks = (i for i in provider.block_scan.get_txids(pa_params.test_P2TH_addr))
+
     if isinstance(provider, RpcNode):
 
         if prod:
@@ -297,7 +350,8 @@ def card_postprocess(card: dict, vout: list) -> List[dict]:
 
 
 def card_bundle_parser(bundle: CardBundle, debug=False) -> Iterator:
-    '''this function wraps all the card transfer parsing'''
+    '''this function wraps all the card transfer parsing.
+       Invalid bundles and cards are logged as debug records (printed if debug is set).'''
 
     try:
         # first vout of the bundle must pay to deck.p2th
@@ -319,8 +373,7 @@ def card_bundle_parser(bundle: CardBundle, debug=False) -> Iterator:
             IndexError,
             InvalidNulldataOutput) as e:
 
-        if debug:
-            print(e)  # re-do as logging later on
+        debug_logger(logger, debug).debug("Invalid card bundle %s: %r", bundle.txid, e)
         return
         yield
 
@@ -346,8 +399,7 @@ def card_bundle_parser(bundle: CardBundle, debug=False) -> Iterator:
         # this will except the error
         except InvalidCardIssue as e:
 
-            if debug:
-                print(e)
+            debug_logger(logger, debug).debug("Invalid card in bundle %s: %r", bundle.txid, e)
 
 
 def amount_to_exponent(amount: float, number_of_decimals: int) -> int:
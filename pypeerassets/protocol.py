@@ -4,9 +4,11 @@
 # EXPERIMENTAL: This is the version with locktime and lockhash, suitable for DEXes.
 # TODO: AT burns are still shown as CardTransfers.
 
+import logging
 from enum import Enum
+from functools import lru_cache
 from operator import itemgetter
-from typing import List, Optional, Generator, cast, Callable
+from typing import List, Optional, Generator, Union, cast, Callable
 
 from pypeerassets.kutil import Kutil
 from pypeerassets.paproto_pb2 import DeckSpawn as deckspawnproto
@@ -17,7 +19,8 @@ from pypeerassets.exceptions import (
     RecieverAmountMismatch,
 )
 from pypeerassets.card_parsers import parsers
-from pypeerassets.networks import net_query
+from pypeerassets.networks import Constants, net_query
+from pypeerassets.logs import debug_logger
 
 ### ADDRESSTRACK ###
 import pypeerassets.at.extension_protocol as ep
@@ -28,6 +31,8 @@ from pypeerassets.provider import Provider
 
 # P2TH_MODIFIER = { "proposal" : 1, "voting" : 2, "donation" : 3, "signalling" : 4, "locking" : 5 }
 
+logger = logging.getLogger(__name__)
+
 class IssueMode(Enum):
 
     NONE = 0x00
@@ -566,6 +571,9 @@ class DeckState:
     # Added attribute valid_cards to be able to process only the valid (non-bogus) cards.
     # Locktime: self.lock is dict of senders, with dicts including locktime and amount.
     # cleanup_height cleans locks remaining after the last card.
+    # Debug information is logged to the pypeerassets.protocol logger if debug is set or debug logging is enabled for it.
+    # debug=True emits the records of this state only (see logs.debug_logger).
+    # The checks are done once per card/lock check, so the loops are not slowed down if debug is disabled.
 
     def __init__(self, cards: Generator, cleanup_height: int=None, debug: bool=False) -> None:
 
@@ -579,7 +587,8 @@ class DeckState:
 
         # addresstrack and lock modifications
         self.valid_cards = cast(list, [])
-        self.debug = debug
+        self.debug = debug or logger.isEnabledFor(logging.DEBUG)
+        self.logger = debug_logger(logger, debug)
         self.locks = cast(dict, {})
         self.cleanup_height = cleanup_height
 
@@ -597,15 +606,8 @@ class DeckState:
             ### LOCKS: adding current_locks here prevents locked cards to be transfered.
             ### They will be simply invalid, the rest would also not be transfered.
             locked_amount = self._check_locks(sender, receiver, amount, card["blocknum"], card["network"])
-            # DEBUG information
             if self.debug:
-                if card["locktime"]: # this detects a CardLock
-                    print("CardLock:     blocknum {} sender {} receiver {} amount {} locktime {} lockhash {} lockhash_type {}".format(card["blocknum"], sender, receiver, amount, card["locktime"], card.get("lockhash"), card.get("lockhash_type")))
-                else:
-                    print("CardTransfer: blocknum {} sender {} receiver {} amount {}".format(card["blocknum"], sender, receiver, amount))
-                if len(self.locks):
-                    print("locked amount of sender {} before card: {}".format(sender, locked_amount))
-                    print("locked senders:", [s for s in self.locks])
+                self._log_transfer(card, locked_amount)
             balance_check = sender in self.balances and (self.balances[sender] - locked_amount) >= amount
 
             if balance_check:
@@ -617,12 +619,12 @@ class DeckState:
 
                     if card["locktime"]:
                         # we add the lock to the receiver's address.
-                        self._add_lock(receiver, amount, card["locktime"], card.get("lockhash"), card.get("lockhash_type"))
+                        self._add_lock(receiver, amount, card["locktime"], card.get("lockhash"), card.get("lockhash_type"), card["network"])
 
                 return True
 
             if self.debug:
-                print("Not valid: balance: {}, locked amount: {}, card amount: {}".format(self.balances.get(sender), locked_amount, amount))
+                self.logger.debug("Not valid: balance: %s, locked amount: %s, card amount: %s", self.balances.get(sender), locked_amount, amount)
             return False
 
         if 'CardIssue' in ctype:
@@ -631,6 +633,18 @@ class DeckState:
 
         return False
 
+    def _log_transfer(self, card: dict, locked_amount: int) -> None:
+
+        sender, receiver, amount = card["sender"], card["receiver"][0], card["amount"][0]
+        if card["locktime"]: # this detects a CardLock
+            self.logger.debug("CardLock:     blocknum %s sender %s receiver %s amount %s locktime %s lockhash %s lockhash_type %s",
+                         card["blocknum"], sender, receiver, amount, card["locktime"], card.get("lockhash"), card.get("lockhash_type"))
+        else:
+            self.logger.debug("CardTransfer: blocknum %s sender %s receiver %s amount %s", card["blocknum"], sender, receiver, amount)
+        if len(self.locks):
+            self.logger.debug("locked amount of sender %s before card: %s", sender, locked_amount)
+            self.logger.debug("locked senders: %s", list(self.locks))
+
     def _append_balance(self, amount: int, receiver: str) -> None:
 
             try:
@@ -652,70 +666,87 @@ class DeckState:
                 if card["blocknum"] > self.cleanup_height:
                     break
 
-            # txid + blockseq + cardseq, as unique ID
-            # cid = str(card["txid"] + str(card["blockseq"]) + str(card["cardseq"]))
-            ctype = card["type"]
-            amount = card["amount"][0]
-
-            if ctype == 'CardIssue' and card["cid"] not in self.processed_issues:
-                validate = self._process(card, ctype)
-                self.total += amount * validate  # This will set amount to 0 if validate is False
-                self.processed_issues |= {card["cid"]}
-                if validate:
-                    self.valid_cards.append(card_from_dict(card))
-
-            if ctype == 'CardTransfer' and card["cid"] not in self.processed_transfers:
-                validate = self._process(card, ctype)
-                if validate:
-                    self.valid_cards.append(card_from_dict(card))
-                    # subtract the amount of the card from locks.
-                    if card["sender"] in self.locks:
-                        self._unlock_amount(card["sender"], card["receiver"][0], amount, card["network"])
-
-                self.processed_transfers |= {card["cid"]}
-
-            if ctype == 'CardBurn' and card["cid"] not in self.processed_burns:
-                validate = self._process(card, ctype)
-
-                self.total -= amount * validate
-                self.burned += amount * validate
-                self.processed_burns |= {card["cid"]}
-                if validate: ### changed from here
-                    self.valid_cards.append(card_from_dict(card))
+            self._process_card(card)
 
         ### LOCKS: cleanup if height is provided
         if self.cleanup_height:
             self._cleanup_locks()
 
+    def _process_card(self, card: dict) -> None:
+
+        # txid + blockseq + cardseq, as unique ID
+        # cid = str(card["txid"] + str(card["blockseq"]) + str(card["cardseq"]))
+        ctype = card["type"]
+        amount = card["amount"][0]
+
+        if ctype == 'CardIssue' and card["cid"] not in self.processed_issues:
+            validate = self._process(card, ctype)
+            self.total += amount * validate  # This will set amount to 0 if validate is False
+            self.processed_issues |= {card["cid"]}
+            if validate:
+                self.valid_cards.append(card_from_dict(card))
+
+        if ctype == 'CardTransfer' and card["cid"] not in self.processed_transfers:
+            validate = self._process(card, ctype)
+            if validate:
+                self.valid_cards.append(card_from_dict(card))
+                # subtract the amount of the card from locks.
+                if card["sender"] in self.locks:
+                    self._unlock_amount(card["sender"], card["receiver"][0], amount, card["network"])
+
+            self.processed_transfers |= {card["cid"]}
+
+        if ctype == 'CardBurn' and card["cid"] not in self.processed_burns:
+            validate = self._process(card, ctype)
+
+            self.total -= amount * validate
+            self.burned += amount * validate
+            self.processed_burns |= {card["cid"]}
+            if validate: ### changed from here
+                self.valid_cards.append(card_from_dict(card))
+
+    def add_cards(self, cards: list) -> None:
+        '''Processes cards which are newer than all cards processed before (e.g. cards of a new block),
+           updating the state without recalculating it from the start. cleanup_height is not applied.'''
+
+        for card in self._sort_cards(cards):
+            self._process_card(card)
+
+        self.cards = list(self.cards) + list(cards)
+        self.checksum = not bool(self.total - sum(self.balances.values()))
+
     def valid_burns(self):
         valid_card_set = set([c.cid for c in self.valid_cards])
         return valid_card_set & self.processed_burns
 
     def _cleanup_locks(self):
-        if self.debug:
-            print("Cleaning up locks up to blockheight:", self.cleanup_height)
+        debug = self.debug
+        if debug:
+            self.logger.debug("Cleaning up locks up to blockheight: %s", self.cleanup_height)
         for address in list(self.locks):
-            if self.debug:
-               print("Locks on address", address, self.locks[address], len(self.locks[address]))
+            if debug:
+                self.logger.debug("Locks on address %s %s %s", address, self.locks[address], len(self.locks[address]))
             # we go from the last index to the first, so if the list changes, indexes aren't modified.
             for index in range(len(self.locks[address]) - 1, -1, -1):
                 lock = self.locks[address][index]
-                # print(index, lock["locktime"])
                 if lock["locktime"] < self.cleanup_height:
-                    if self.debug:
-                        print("Cleaning up lock:", lock)
+                    if debug:
+                        self.logger.debug("Cleaning up lock: %s", lock)
                     self._modify_lock(address, lock["amount"], index)
-                elif self.debug:
-                    print("Lock preserved:", lock)
+                elif debug:
+                    self.logger.debug("Lock preserved: %s", lock)
 
     def _check_locks(self, cardsender: str, receiver: str, amount: int, blocknum: int, network: str) -> int:
-        if self.debug:
-            print("================================")
+        debug = self.debug
+        if debug:
+            self.logger.debug("================================")
             if len(self.locks):
-                print("Current locks at block {}: {}".format(blocknum, self.locks))
+                # the lock dict is only formatted if the record is emitted.
+                self.logger.debug("Current locks at block %s: %s", blocknum, self.locks)
         # we unset locks at each CardTransfer
         # Unlocking after a transfer done to lock_address is only done after validating.
         locked_amount = 0
+        network_params = None # resolved at the first lock address calculation
         original_locks = self.locks.copy()
         for locksender in original_locks.keys():
             for index in range(len(self.locks[locksender]) - 1, -1, -1):
@@ -738,18 +769,20 @@ class DeckState:
                         # MODIF: added lock_address to lock dict, to prevent hash_to_address
                         # being calculated more than once.
                         if "lock_address" not in lock.keys():
-                            addr = calc_lock_address(lock, network)
+                            if network_params is None:
+                                network_params = net_query(network)
+                            addr = calc_lock_address(lock, network_params)
                             self.locks[locksender][index].update({"lock_address" : addr })
                         else:
                             addr = lock["lock_address"]
 
                         if addr != receiver:
-                            if self.debug:
-                                print("Active address/hash timelock: +", lock["amount"], "lock address", addr)
+                            if debug:
+                                self.logger.debug("Active address/hash timelock: + %s lock address %s", lock["amount"], addr)
                             locked_amount += self.locks[locksender][index]["amount"]
                     elif lock["lockhash_type"] == None:
-                        if self.debug:
-                            print("Active simple timelock: +", lock["amount"])
+                        if debug:
+                            self.logger.debug("Active simple timelock: + %s", lock["amount"])
                         locked_amount += self.locks[locksender][index]["amount"]
 
                     # old variant with specific lock_address:
@@ -765,6 +798,8 @@ class DeckState:
         # checks if the card was transfered to an address in self.locks.
         # If yes, it unlocks an amount transferred to rec_address. Various locks can be affected.
         unlocked_amount = amount
+        debug = self.debug
+        network_params = None
         # sort: highest index is with the lowest locktime,
         # this means early locks will be cleared first
         self.locks[sender].sort(key=lambda x: x['locktime'], reverse=True)
@@ -773,12 +808,14 @@ class DeckState:
 
             # no lockhash or wrong type: tokens cannot be unlocked before locktime expires.
             if lock.get("lockhash") is None or lock["lockhash_type"] not in range(1, 6):
-                if self.debug:
-                    print("Cannot unlock lock of type {} or without lockhash.".format(lock["lockhash_type"]))
+                if debug:
+                    self.logger.debug("Cannot unlock lock of type %s or without lockhash.", lock["lockhash_type"])
                 continue
 
             if "lock_address" not in lock.keys():
-                addr = calc_lock_address(lock, network)
+                if network_params is None:
+                    network_params = net_query(network)
+                addr = calc_lock_address(lock, network_params)
                 self.locks[sender][index].update({"lock_address" : addr })
             else:
                 addr = lock["lock_address"]
@@ -791,18 +828,24 @@ class DeckState:
                 # then the loop continues through the locks with the same lock address.
                 self._modify_lock(sender, lock["amount"], index)
                 unlocked_amount -= lock["amount"]
-                if self.debug:
-                    print("Unlocking entire lock amount", lock["amount"], "for receiving address", rec_address)
+                if debug:
+                    self.logger.debug("Unlocking entire lock amount %s for receiving address %s", lock["amount"], rec_address)
                     if unlocked_amount > 0:
-                        print("Still to unlock:", unlocked_amount)
+                        self.logger.debug("Still to unlock: %s", unlocked_amount)
             else:
                 self._modify_lock(sender, unlocked_amount, index)
-                if self.debug:
-                    print("Unlocking amount", unlocked_amount, "for receiving address", rec_address)
+                if debug:
+                    self.logger.debug("Unlocking amount %s for receiving address %s", unlocked_amount, rec_address)
                 break
 
-    def _add_lock(self, address: str, amount: int, locktime: int, lockhash: str=None, lockhash_type: int=None) -> None:
+    def _add_lock(self, address: str, amount: int, locktime: int, lockhash: str=None, lockhash_type: int=None, network: str=None) -> None:
         lock_dict = {"locktime": locktime, "amount" : amount, "lockhash" : lockhash, "lockhash_type" : lockhash_type}
+        # the lock address is calculated once here, so the lock checks only compare it.
+        if (network is not None) and (lockhash is not None) and (lockhash_type in range(1, 6)):
+            try:
+                lock_dict.update({"lock_address" : calc_lock_address(lock_dict, network)})
+            except NotImplementedError:
+                pass # hash types without address encoding fail only if the lock is checked, like before.
         if address not in self.locks:
            self.locks.update({address : [lock_dict] })
         else:
@@ -814,20 +857,34 @@ class DeckState:
         if lock["amount"] > unlocked_amount:
             self.locks[address][index]["amount"] -= unlocked_amount
             if self.debug:
-                print("Modified lock: lowered by", unlocked_amount)
+                self.logger.debug("Modified lock: lowered by %s", unlocked_amount)
         else:
             # Delete locks with amount zero.
             if len(self.locks[address]) > 1:
                 del self.locks[address][index]
                 if self.debug:
-                    print("Modified lock: deleted lock of", unlocked_amount)
+                    self.logger.debug("Modified lock: deleted lock of %s", unlocked_amount)
             else:
                 del self.locks[address]
                 if self.debug:
-                    print("Modified lock: deleted sender of lock list, unlocked", unlocked_amount)
+                    self.logger.debug("Modified lock: deleted sender of lock list, unlocked %s", unlocked_amount)
+
+LOCK_ADDRESS_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=LOCK_ADDRESS_CACHE_SIZE)
+def _cached_lock_address(lockhash: bytes, lockhash_type: int, network_name: str) -> str:
+    return hash_to_address(lockhash, lockhash_type, net_query(network_name))
+
 
-def calc_lock_address(lock: dict, network: str) -> None:
-    return hash_to_address(lock["lockhash"], lock["lockhash_type"], net_query(network))
+def calc_lock_address(lock: dict, network: Union[str, Constants]) -> str:
+    # network can be the name or the resolved network parameters.
+    # The same lockhashes recur in many locks, so the addresses are cached process-wide (LRU, bounded).
+    # The arguments are normalized to hashable types (a lockhash can also be a bytearray).
+    lockhash = lock["lockhash"]
+    if isinstance(lockhash, (bytearray, memoryview)):
+        lockhash = bytes(lockhash)
+    return _cached_lock_address(lockhash, int(lock["lockhash_type"]), net_query(network).shortname)
 
 
 def card_from_dict(d): ### WORKAROUND. TODO: Look for a more elegant solution!
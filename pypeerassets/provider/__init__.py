@@ -4,3 +4,6 @@ from .cryptoid import Cryptoid
 from .explorer import Explorer
 from .blockbook import Blockbook
 from .slm_rpcnode import SlmRpcNode
+from .memory import MemoryProvider, ProviderRecorder
+from .instrumentation import ProviderInstrumentation, instrumented_run, format_report
+from .utxoset import UtxoSet, UtxoCache
@@ -130,3 +130,31 @@ class Provider(ABC):
             return Sequence(0xFFFFFFFE) # value to enable locktime field
         else:
             return Sequence.max()
+
+
+def wrap_instance_methods(instance: object, wrappers: dict) -> dict:
+    '''replaces methods of a single provider instance (name -> wrapper), so the type of the instance doesn't change.
+       Returns the state needed by unwrap_instance_methods, which restores the previous attributes,
+       so instrumentations, recorders and caches can be stacked on the same instance.'''
+
+    wrapped = {}
+    for name, wrapper in wrappers.items():
+        wrapped[name] = (name in instance.__dict__, instance.__dict__.get(name), wrapper)
+        setattr(instance, name, wrapper)
+    return wrapped
+
+
+def unwrap_instance_methods(instance: object, wrapped: dict) -> None:
+    '''restores the attributes replaced by wrap_instance_methods. Raises RuntimeError if a method
+       was wrapped again afterwards and that wrapper is still installed, as it would be removed or left stale.'''
+
+    for name, (was_set, previous, wrapper) in wrapped.items():
+        if instance.__dict__.get(name) is not wrapper:
+            raise RuntimeError("Method {} was wrapped again. Stop the later wrapper first.".format(name))
+
+    for name, (was_set, previous, wrapper) in wrapped.items():
+        if was_set:
+            setattr(instance, name, previous)
+        else:
+            del instance.__dict__[name]
+    wrapped.clear()
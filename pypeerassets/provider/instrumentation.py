@@ -0,0 +1,173 @@
+'''Call accounting and latency instrumentation for providers.
+
+A ProviderInstrumentation wraps the methods of a single provider instance (like the ProviderRecorder),
+so the type of the provider, which is checked by the discovery functions, doesn't change and other
+instances are not affected. For each method it counts the calls, measures their latency in a histogram
+and counts duplicate requests, i.e. calls with the same arguments as an earlier call.
+The requests inside a batch are counted like direct calls, so duplicates between batches and
+direct calls are detected too.
+
+instrumented_run runs a function (e.g. find_all_valid_cards or dt_parser) with an instrumented provider
+and returns its result together with the report.'''
+
+import threading
+import time
+from typing import Callable
+
+from pypeerassets.provider.common import wrap_instance_methods, unwrap_instance_methods
+
+
+INSTRUMENTED_METHODS = ("getrawtransaction", "getblock", "getblockhash", "listtransactions", "listunspent", "batch")
+
+# upper bounds of the latency histogram buckets, in seconds. The last bucket contains all slower calls.
+LATENCY_BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, float("inf"))
+
+
+class MethodStats(object):
+    '''Statistics of the calls of a provider method.'''
+
+    def __init__(self, name: str) -> None:
+
+        self.name = name
+        self.calls = 0 # direct calls
+        self.batched = 0 # requests inside batch calls
+        self.duplicates = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0 for b in LATENCY_BUCKETS]
+
+    def add_call(self, latency: float) -> None:
+
+        self.calls += 1
+        self.total_time += latency
+        self.max_time = max(self.max_time, latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.histogram[index] += 1
+                break
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {"calls" : self.calls,
+                "batched" : self.batched,
+                "duplicates" : self.duplicates,
+                "total_time" : self.total_time,
+                "mean_time" : self.mean_time,
+                "max_time" : self.max_time,
+                "histogram" : dict(zip(LATENCY_BUCKETS, self.histogram))}
+
+
+class ProviderInstrumentation(object):
+    '''Instruments the methods of a provider instance. Call stop() to remove the instrumentation.
+       The statistics are thread-safe, so providers used by several threads (e.g. in a BlockScan) can be instrumented.'''
+
+    def __init__(self, provider: object, methods: tuple=INSTRUMENTED_METHODS) -> None:
+
+        self.provider = provider
+        self.methods = [name for name in methods if hasattr(provider, name)]
+        self.lock = threading.Lock()
+        self.reset()
+
+        self._wrapped = wrap_instance_methods(provider, {name : self._wrap(name, getattr(provider, name)) for name in self.methods})
+
+    def __enter__(self) -> "ProviderInstrumentation":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def reset(self) -> None:
+        '''Deletes all collected statistics.'''
+
+        with self.lock:
+            self.stats = {name : MethodStats(name) for name in self.methods}
+            self.requests = set() # (method, arguments) of all requests
+            self.start_time = time.perf_counter()
+
+    def stop(self) -> None:
+        unwrap_instance_methods(self.provider, self._wrapped)
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+
+        def instrumented_method(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._add_call(name, args, kwargs, time.perf_counter() - start)
+
+        return instrumented_method
+
+    @staticmethod
+    def _request_key(name: str, args: tuple, kwargs: dict) -> tuple:
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+        return key
+
+    def _add_request(self, name: str, key: tuple) -> None:
+        # must be called with the lock acquired.
+
+        if key in self.requests:
+            self.stats.setdefault(name, MethodStats(name)).duplicates += 1
+        else:
+            self.requests.add(key)
+
+    def _add_call(self, name: str, args: tuple, kwargs: dict, latency: float) -> None:
+
+        with self.lock:
+            self.stats[name].add_call(latency)
+            self._add_request(name, self._request_key(name, args, kwargs))
+
+            if name == "batch":
+                # batch requests are (method, params) tuples.
+                requests = args[0] if len(args) > 0 else kwargs.get("reqs", [])
+                for (request_method, params) in requests:
+                    self.stats.setdefault(request_method, MethodStats(request_method)).batched += 1
+                    self._add_request(request_method, self._request_key(request_method, tuple(params), {}))
+
+    def report(self) -> dict:
+        '''Returns the statistics of all methods which were called, and the totals of the run.'''
+
+        with self.lock:
+            methods = {name : stats.to_dict() for name, stats in self.stats.items() if stats.calls + stats.batched > 0}
+            return {"methods" : methods,
+                    "calls" : sum([s["calls"] for s in methods.values()]),
+                    "duplicates" : sum([s["duplicates"] for s in methods.values()]),
+                    "provider_time" : sum([s["total_time"] for s in methods.values()]),
+                    "wall_time" : time.perf_counter() - self.start_time}
+
+
+def format_report(report: dict) -> str:
+    '''Returns a report (see ProviderInstrumentation.report) as a table.'''
+
+    bounds = ["<={}ms".format(b * 1000) if b != float("inf") else "slower" for b in LATENCY_BUCKETS]
+    lines = ["{:<20}{:>9}{:>9}{:>9}{:>11}{:>11}  {}".format("method", "calls", "batched", "dupl.", "total s", "mean ms", " ".join(bounds))]
+
+    for name, stats in sorted(report["methods"].items(), key=lambda m: -m[1]["total_time"]):
+        lines.append("{:<20}{:>9}{:>9}{:>9}{:>11.3f}{:>11.3f}  {}".format(name, stats["calls"], stats["batched"], stats["duplicates"],
+                     stats["total_time"], stats["mean_time"] * 1000, " ".join([str(c) for c in stats["histogram"].values()])))
+
+    lines.append("Total: {} calls, {} duplicates, {:.3f} s of {:.3f} s in provider calls.".format(report["calls"], report["duplicates"],
+                 report["provider_time"], report["wall_time"]))
+    return "\n".join(lines)
+
+
+def instrumented_run(provider: object, function: Callable, *args, **kwargs) -> tuple:
+    '''Runs function(*args, **kwargs) with an instrumented provider and returns (result, report).
+       Generators (e.g. from find_all_valid_cards) are consumed into a list inside the instrumented run.
+       Example: cards, report = instrumented_run(provider, find_all_valid_cards, provider, deck)'''
+
+    with ProviderInstrumentation(provider) as instrumentation:
+        result = function(*args, **kwargs)
+        if hasattr(result, "__next__"):
+            result = list(result)
+        report = instrumentation.report()
+
+    return result, report
@@ -0,0 +1,331 @@
+'''In-memory provider and recorder for offline use.
+
+A MemoryProvider serves a chain stored in dicts: blocks, transactions in getrawtransaction JSON format
+and the accounts (labels) of watched addresses. Chains can be built block by block (add_block),
+e.g. by a generator of synthetic chains (see pypeerassets.chain_generator), or loaded from a fixture file.
+Transactions sent with sendrawtransaction are kept in the mempool until the next block is added.
+
+A ProviderRecorder stores all blocks and transactions a real provider returns while the parsers run,
+so a parser run against a node can be saved as a fixture and replayed later with a MemoryProvider.
+
+listtransactions supports both conventions used in the discovery functions: called with account=<label>
+it returns RPC node style dicts, called with an address (or a label) it returns a list of txids like the explorers.'''
+
+import json
+from decimal import Decimal
+from hashlib import sha256
+
+from btcpy.structs.transaction import TxIn, ScriptSig
+
+from pypeerassets.exceptions import InsufficientFunds
+from pypeerassets.provider.common import Provider, wrap_instance_methods, unwrap_instance_methods
+
+
+class MemoryProvider(Provider):
+
+    '''Provider serving a chain stored in memory.'''
+
+    def __init__(self, network: str="tppc", genesis_time: int=1500000000, block_interval: int=600) -> None:
+
+        self.net = self._netname(network)['short']
+        self.genesis_time = genesis_time
+        self.block_interval = block_interval
+
+        self.blocks = {} # blockhash -> block dict
+        self.block_hashes = {} # height -> blockhash
+        self.height = -1 # chain tip
+        self.txes = {} # txid -> transaction JSON
+        self.tx_heights = {} # txid -> (height, blockseq) of confirmed txes
+        self.address_txes = {} # address -> txids of the txes paying to the address, in chain order
+        self.accounts = {} # account label -> address
+        self.spent = set() # (txid, vout) of spent outputs
+        self.mempool = [] # txids of the transactions sent with sendrawtransaction, included in the next block
+
+    ### Building the chain
+
+    def add_block(self, txes: list, time: int=None) -> str:
+        '''Adds a block with the given transactions (JSON dicts) and the mempool on top of the chain.
+           Returns the block hash. blockhash, blocktime and time are added to the transactions.'''
+
+        height = self.height + 1
+        if time is None:
+            time = self.genesis_time + height * self.block_interval
+
+        txes = [self.txes[txid] for txid in self.mempool] + list(txes)
+        previous = self.block_hashes.get(height - 1)
+        blockhash = sha256("{}:{}".format(previous, height).encode()).hexdigest()
+        block = {"hash" : blockhash,
+                 "height" : height,
+                 "time" : time,
+                 "tx" : [tx["txid"] for tx in txes],
+                 "previousblockhash" : previous}
+
+        for tx in txes:
+            tx.update({"blockhash" : blockhash, "blocktime" : time})
+            tx.setdefault("time", time)
+            self.txes.update({tx["txid"] : tx})
+
+        self._index_block(block)
+        self.mempool = []
+        return blockhash
+
+    def _index_block(self, block: dict) -> None:
+
+        self.blocks.update({block["hash"] : block})
+        self.block_hashes.update({block["height"] : block["hash"]})
+        self.height = max(self.height, block["height"])
+
+        for blockseq, txid in enumerate(block["tx"]):
+            if txid in self.txes:
+                self.tx_heights.update({txid : (block["height"], blockseq)})
+                if txid not in self.mempool: # already indexed
+                    self._index_tx(self.txes[txid])
+
+    def _index_tx(self, tx: dict) -> None:
+
+        for vin in tx.get("vin", []):
+            if "txid" in vin:
+                self.spent.add((vin["txid"], vin["vout"]))
+
+        for address in set(a for vout in tx["vout"] for a in self._vout_addresses(vout)):
+            self.address_txes.setdefault(address, []).append(tx["txid"])
+
+    @staticmethod
+    def _vout_addresses(vout: dict) -> list:
+        return vout.get("scriptPubKey", {}).get("addresses", [])
+
+    def importaddress(self, address: str, label: str=None, rescan: bool=False, p2sh: bool=False) -> None:
+        '''Assigns an account label to an address, like importing it into the wallet of a node.'''
+
+        self.accounts.update({label : address})
+
+    def setaccount(self, address: str, account: str) -> None:
+        self.importaddress(address, account)
+
+    def getaccount(self, address: str) -> str:
+
+        for label, account_address in self.accounts.items():
+            if account_address == address:
+                return label
+        return ""
+
+    ### Fixtures
+
+    def save(self, path: str) -> None:
+        '''Saves the chain as a JSON fixture. Coin values are stored as numbers and loaded as Decimal.'''
+
+        fixture = {"network" : self.net,
+                   "height" : self.height,
+                   "blocks" : [self.blocks[self.block_hashes[h]] for h in sorted(self.block_hashes)],
+                   "txes" : list(self.txes.values()),
+                   "accounts" : self.accounts}
+
+        with open(path, "w") as fixture_file:
+            json.dump(fixture, fixture_file, default=float)
+
+    @classmethod
+    def load(cls, path: str) -> "MemoryProvider":
+        '''Creates a MemoryProvider from a JSON fixture (see save and ProviderRecorder.save).'''
+
+        with open(path, "r") as fixture_file:
+            fixture = json.load(fixture_file, parse_float=Decimal)
+
+        provider = cls(network=fixture["network"])
+        provider.txes = {tx["txid"] : tx for tx in fixture["txes"]}
+        provider.accounts = fixture.get("accounts", {})
+
+        for block in sorted(fixture["blocks"], key=lambda b: b["height"]):
+            provider._index_block(block)
+        provider.height = max(provider.height, fixture.get("height", -1))
+
+        # transactions without block (unconfirmed or parent txes from unrecorded blocks) are indexed at the end.
+        for txid, tx in provider.txes.items():
+            if txid not in provider.tx_heights:
+                provider._index_tx(tx)
+
+        return provider
+
+    ### Provider API
+
+    def getblockcount(self) -> int:
+        return self.height
+
+    def getblockhash(self, blocknum: int) -> str:
+        return self.block_hashes[blocknum]
+
+    def getblock(self, hash: str, decode: bool=True) -> dict:
+        block = self.blocks[hash]
+        block.update({"confirmations" : self.height - block["height"] + 1})
+        return block
+
+    def getdifficulty(self) -> dict:
+        return {"proof-of-work" : 0.0, "proof-of-stake" : 0.0}
+
+    def getrawtransaction(self, txid: str, decrypt: int=1) -> dict:
+
+        tx = self.txes[txid]
+        if txid in self.tx_heights:
+            tx.update({"confirmations" : self.height - self.tx_heights[txid][0] + 1})
+        else:
+            tx.update({"confirmations" : 0})
+        return tx
+
+    def sendrawtransaction(self, rawtxn: str) -> str:
+        '''Adds a signed transaction (hex string) to the mempool. Returns the txid.'''
+
+        from pypeerassets.transactions import Transaction # circular import
+        from pypeerassets.networks import net_query
+
+        tx = Transaction.unhexlify(rawtxn, network=net_query(self.network)).to_json()
+        for vout in tx["vout"]:
+            vout["value"] = Decimal(vout["value"])
+            if "address" in vout["scriptPubKey"]:
+                vout["scriptPubKey"]["addresses"] = [vout["scriptPubKey"]["address"]]
+
+        self.txes.update({tx["txid"] : tx})
+        self.mempool.append(tx["txid"])
+        self._index_tx(tx)
+        return tx["txid"]
+
+    def listtransactions(self, address: str=None, many: int=999, since: int=0, include_watchonly: bool=True, account: str=None) -> list:
+        '''With account, returns RPC node style dicts; otherwise the txids paying to address (or to the address of a label).'''
+
+        if account is None:
+            address = self.accounts.get(address, address)
+            return list(self.address_txes.get(address, []))
+
+        address = self.accounts.get(account)
+        txids = self.address_txes.get(address, [])[since:since + many]
+        result = []
+        for txid in txids:
+            tx = self.getrawtransaction(txid, 1)
+            entry = {"account" : account,
+                     "address" : address,
+                     "category" : "receive",
+                     "txid" : txid,
+                     "confirmations" : tx["confirmations"]}
+            if txid in self.tx_heights:
+                entry.update({"blockhash" : tx["blockhash"],
+                              "blockindex" : self.tx_heights[txid][1],
+                              "blocktime" : tx["blocktime"]})
+            result.append(entry)
+
+        return result
+
+    def listunspent(self, address: str="", minconf: int=1, maxconf: int=999999) -> list:
+
+        utxos = []
+        for txid in self.address_txes.get(address, []):
+            tx = self.getrawtransaction(txid, 1)
+            if not (minconf <= tx["confirmations"] <= maxconf):
+                continue
+            for vout in tx["vout"]:
+                if (address in self._vout_addresses(vout)) and ((txid, vout["n"]) not in self.spent):
+                    utxos.append({"txid" : txid,
+                                  "vout" : vout["n"],
+                                  "address" : address,
+                                  "amount" : vout["value"],
+                                  "scriptPubKey" : vout["scriptPubKey"].get("hex"),
+                                  "confirmations" : tx["confirmations"]})
+        return utxos
+
+    def getbalance(self, address: str) -> Decimal:
+        return sum([Decimal(str(u["amount"])) for u in self.listunspent(address, minconf=0)], Decimal(0))
+
+    def getreceivedbyaddress(self, address: str) -> Decimal:
+
+        received = Decimal(0)
+        for txid in self.address_txes.get(address, []):
+            for vout in self.txes[txid]["vout"]:
+                if address in self._vout_addresses(vout):
+                    received += Decimal(str(vout["value"]))
+        return received
+
+    def select_inputs(self, address: str, amount: Decimal, locktime: int=0) -> dict:
+
+        utxos = []
+        utxo_sum = Decimal(0)
+        for utxo in self.listunspent(address=address):
+
+            utxos.append(TxIn(txid=utxo['txid'],
+                              txout=utxo['vout'],
+                              sequence=self.calc_sequence(locktime),
+                              script_sig=ScriptSig.empty()))
+
+            utxo_sum += Decimal(str(utxo["amount"]))
+            if utxo_sum >= amount:
+                return {'utxos': utxos, 'total': utxo_sum}
+
+        raise InsufficientFunds("Insufficient funds.")
+
+
+class ProviderRecorder(object):
+    '''Records the blocks, transactions and accounts returned by a provider.
+       The methods of the provider instance are wrapped, so its type (checked by the discovery functions) doesn't change.
+       save() writes the recorded data as a fixture which can be loaded with MemoryProvider.load; stop() unwraps the methods.'''
+
+    recorded_methods = ("getblockcount", "getblock", "getrawtransaction", "listtransactions", "getaccount", "batch")
+
+    def __init__(self, provider: Provider) -> None:
+
+        self.provider = provider
+        self.blocks = {}
+        self.txes = {}
+        self.accounts = {}
+        self.height = -1
+
+        self._wrapped = wrap_instance_methods(provider, {name : self._wrap(name, getattr(provider, name))
+                                                          for name in self.recorded_methods if hasattr(provider, name)})
+
+    def _wrap(self, name: str, method):
+
+        def recorded_method(*args, **kwargs):
+            result = method(*args, **kwargs)
+            getattr(self, "_record_" + name)(result, *args, **kwargs)
+            return result
+
+        return recorded_method
+
+    def stop(self) -> None:
+        unwrap_instance_methods(self.provider, self._wrapped)
+
+    def _record_getblockcount(self, result: int) -> None:
+        self.height = result
+
+    def _record_getblock(self, result: dict, *args, **kwargs) -> None:
+        self.blocks.update({result["hash"] : result})
+
+    def _record_getrawtransaction(self, result: dict, *args, **kwargs) -> None:
+        self.txes.update({result["txid"] : result})
+
+    def _record_batch(self, result: list, *args, **kwargs) -> None:
+        for entry in (result or []):
+            tx = entry.get("result")
+            if isinstance(tx, dict) and "txid" in tx and "vout" in tx:
+                self.txes.update({tx["txid"] : tx})
+
+    def _record_listtransactions(self, result: list, *args, **kwargs) -> None:
+        # RPC nodes return dicts with the address of the account; explorers return txids.
+        account = kwargs.get("account", args[0] if len(args) > 0 else None)
+        for entry in (result or []):
+            if isinstance(entry, dict) and "address" in entry:
+                self.accounts.update({account : entry["address"]})
+
+    def _record_getaccount(self, result: str, address: str) -> None:
+        self.accounts.update({result : address})
+
+    def save(self, path: str) -> None:
+        '''Writes the recorded data as a fixture. The blocks of all recorded transactions are fetched if necessary.'''
+
+        for tx in list(self.txes.values()):
+            if ("blockhash" in tx) and (tx["blockhash"] not in self.blocks):
+                self.provider.getblock(tx["blockhash"])
+
+        fixture = {"network" : self.provider.network,
+                   "height" : self.height,
+                   "blocks" : list(self.blocks.values()),
+                   "txes" : list(self.txes.values()),
+                   "accounts" : self.accounts}
+
+        with open(path, "w") as fixture_file:
+            json.dump(fixture, fixture_file, default=float)
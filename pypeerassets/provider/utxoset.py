@@ -0,0 +1,385 @@
+'''Cached UTXO sets of addresses, with reservation of the selected UTXOs and pluggable selection strategies.
+
+A UtxoSet retrieves the unspent outputs of an address only once from the provider. The UTXOs selected for a transaction
+are reserved, so transactions built from the same UtxoSet (also in different threads) never spend the same UTXO.
+Afterwards the set is updated incrementally: with the transactions sent (apply_transaction) and the new blocks (sync).
+Outputs of transactions which were built but not yet confirmed (e.g. change outputs) can be added to the set,
+so further transactions can spend them.
+
+A UtxoCache keeps the UtxoSets of all addresses of a provider instance. It replaces the select_inputs
+and sendrawtransaction methods of the instance (like the ProviderInstrumentation), so the existing
+transaction building code selects its inputs from the cache instead of listing all unspent outputs per call.
+Like the select_inputs methods of the providers, the replaced method doesn't reserve the UTXOs, as its callers
+never release them; a spent UTXO leaves the cache when the transaction is sent:
+
+    cache = UtxoCache(provider, strategy="largest_first")
+    inputs = provider.select_inputs(address, amount)
+    ...
+    provider.sendrawtransaction(signed.hexlify()) # updates the cached sets
+    cache.stop()'''
+
+import threading
+from decimal import Decimal
+from typing import Callable, Iterator
+
+from btcpy.structs.address import Address
+from btcpy.structs.transaction import MutableTxIn, ScriptSig
+
+from pypeerassets.exceptions import InsufficientFunds
+from pypeerassets.networks import net_query
+from pypeerassets.provider.common import wrap_instance_methods, unwrap_instance_methods
+
+
+def normalize_utxo(utxo: dict) -> dict:
+    '''converts an UTXO returned by the listunspent method of a provider to the RPC format
+       (txid, vout, amount, scriptPubKey, confirmations). The explorers return the value in satoshis.'''
+
+    if "tx_hash" in utxo: # Explorer, Cryptoid
+        return {"txid" : utxo["tx_hash"],
+                "vout" : utxo["tx_ouput_n"],
+                "amount" : Decimal(int(utxo["value"])) / 10**8,
+                "scriptPubKey" : utxo.get("script"),
+                "confirmations" : utxo.get("confirmations", 0)}
+
+    return {"txid" : utxo["txid"],
+            "vout" : utxo["vout"],
+            "amount" : Decimal(str(utxo["amount"])),
+            "scriptPubKey" : utxo.get("scriptPubKey"),
+            "confirmations" : utxo.get("confirmations", 0)}
+
+
+### Selection strategies
+# A strategy gets the available UTXOs (less confirmations first) and the amount,
+# and returns the UTXOs to spend, or raises InsufficientFunds.
+
+def select_by_confirmations(utxos: list, amount: Decimal) -> list:
+    '''UTXOs with less confirmations first, to keep the coin age of old UTXOs (like RpcNode.select_inputs).'''
+
+    selected = []
+    utxo_sum = Decimal(0)
+    for utxo in utxos:
+        selected.append(utxo)
+        utxo_sum += utxo["amount"]
+        if utxo_sum >= amount:
+            return selected
+
+    raise InsufficientFunds("Insufficient funds.")
+
+
+def select_largest_first(utxos: list, amount: Decimal) -> list:
+    '''largest UTXOs first, which minimizes the number of inputs and thus the transaction size.'''
+
+    return select_by_confirmations(sorted(utxos, key=lambda u: u["amount"], reverse=True), amount)
+
+
+def select_branch_and_bound(utxos: list, amount: Decimal, tolerance: Decimal=Decimal(0), max_tries: int=100000) -> list:
+    '''depth-first search of UTXOs summing up exactly to amount (up to amount + tolerance), so no change output is needed.
+       Falls back to select_by_confirmations if no match is found within max_tries steps.
+       A tolerance can be set with functools.partial.'''
+
+    candidates = sorted(utxos, key=lambda u: u["amount"], reverse=True)
+    values = [u["amount"] for u in candidates]
+    remaining = [sum(values[index:], Decimal(0)) for index in range(len(values) + 1)]
+    target_max = amount + tolerance
+
+    stack = [(0, Decimal(0), ())]
+    tries = 0
+    while stack and tries < max_tries:
+        index, total, selected = stack.pop()
+        tries += 1
+
+        if total > target_max or total + remaining[index] < amount:
+            continue
+        if total >= amount:
+            return [candidates[i] for i in selected]
+        if index == len(values):
+            continue
+
+        stack.append((index + 1, total, selected)) # branch without the UTXO, explored after the other one
+        stack.append((index + 1, total + values[index], selected + (index,)))
+
+    return select_by_confirmations(utxos, amount)
+
+
+SELECTION_STRATEGIES = {"confirmations" : select_by_confirmations,
+                        "largest_first" : select_largest_first,
+                        "branch_and_bound" : select_branch_and_bound}
+
+
+def get_strategy(strategy: object) -> Callable:
+    '''returns the selection function of a strategy name, or the function itself.'''
+
+    if callable(strategy):
+        return strategy
+    try:
+        return SELECTION_STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError("Unknown UTXO selection strategy: {}".format(strategy))
+
+
+def read_blocks(provider: object, start: int, end: int, txids: set=None) -> Iterator:
+    '''yields (height, transactions) of the blocks start to end.
+       If txids is given, only these transactions are retrieved.'''
+
+    for height in range(start, end + 1):
+        block = provider.getblock(provider.getblockhash(height))
+        block_txids = [txid for txid in block["tx"] if txids is None or txid in txids]
+        yield height, [provider.getrawtransaction(txid, 1) for txid in block_txids]
+
+
+class UtxoSet(object):
+    '''UTXOs of an address. Confirmed UTXOs are selected first with the strategy;
+       unconfirmed UTXOs are only selected if the confirmed ones don't suffice.'''
+
+    def __init__(self, provider: object, address: str, strategy: object="confirmations") -> None:
+
+        self.provider = provider
+        self.address = address
+        self.strategy = get_strategy(strategy)
+        self.lock = threading.Lock()
+        self.reserved = set() # (txid, vout) of the selected UTXOs
+
+        try:
+            self.script = Address.from_string(address, network=net_query(provider.network)).to_script().hexlify()
+        except Exception: # addresses of other networks or script types
+            self.script = None
+
+        self.refresh()
+
+    def refresh(self) -> None:
+        '''retrieves the UTXOs again from the provider. Reservations of UTXOs which are still unspent are kept.'''
+
+        excluded = (self.provider.pa_parameters.P2TH_addr, self.provider.pa_parameters.test_P2TH_addr)
+        height = self.provider.getblockcount()
+        if self.address in excluded:
+            utxos = []
+        else:
+            utxos = [normalize_utxo(u) for u in self.provider.listunspent(address=self.address)]
+
+        with self.lock:
+            self.height = height
+            self.utxos = {(u["txid"], u["vout"]) : u for u in utxos}
+            self.reserved &= set(self.utxos.keys())
+            self.spent = set() # outputs spent by unconfirmed transactions
+
+    def add(self, txid: str, vout: int, amount: Decimal, script_pubkey: str=None, confirmations: int=0) -> None:
+        '''adds an output, e.g. the change output of a transaction built from this set.'''
+
+        with self.lock:
+            self.utxos[(txid, vout)] = {"txid" : txid, "vout" : vout, "amount" : Decimal(amount),
+                                        "scriptPubKey" : script_pubkey, "confirmations" : confirmations}
+
+    def remove(self, txid: str, vout: int) -> None:
+        '''removes an output added with add, e.g. if its transaction was not sent.'''
+
+        with self.lock:
+            self.utxos.pop((txid, vout), None)
+            self.reserved.discard((txid, vout))
+
+    def _owns(self, vout: dict) -> bool:
+
+        script_pubkey = vout.get("scriptPubKey", {})
+        if self.script is not None and script_pubkey.get("hex") == self.script:
+            return True
+        return self.address in script_pubkey.get("addresses", [script_pubkey.get("address")])
+
+    def apply_transaction(self, tx: dict, confirmations: int=0) -> None:
+        '''updates the set with a transaction (JSON format of getrawtransaction):
+           its inputs are removed, its outputs to the address are added.'''
+
+        with self.lock:
+            for vin in tx.get("vin", []):
+                if "txid" in vin: # not coinbase
+                    outpoint = (vin["txid"], vin["vout"])
+                    self.utxos.pop(outpoint, None)
+                    self.reserved.discard(outpoint)
+                    if confirmations == 0:
+                        self.spent.add(outpoint)
+
+            # the n values of the outputs of transactions built with card_transfer are not reliable.
+            for n, vout in enumerate(tx["vout"]):
+                outpoint = (tx["txid"], n)
+                if outpoint in self.utxos:
+                    self.utxos[outpoint]["confirmations"] = confirmations
+                elif outpoint not in self.spent and self._owns(vout):
+                    self.utxos[outpoint] = {"txid" : tx["txid"], "vout" : n, "amount" : Decimal(str(vout["value"])),
+                                            "scriptPubKey" : vout.get("scriptPubKey", {}).get("hex"),
+                                            "confirmations" : confirmations}
+
+    def add_confirmations(self, blocks: int) -> None:
+        '''adds the confirmations of new blocks to the confirmed UTXOs.'''
+
+        with self.lock:
+            for utxo in self.utxos.values():
+                if utxo["confirmations"] > 0:
+                    utxo["confirmations"] += blocks
+
+    def pending_txids(self) -> set:
+        '''txids of the unconfirmed UTXOs.'''
+
+        with self.lock:
+            return set(u["txid"] for u in self.utxos.values() if u["confirmations"] == 0)
+
+    def sync(self, scan_blocks: bool=True) -> None:
+        '''updates the set with the blocks added since the last update.
+           With scan_blocks=False only the confirmations of the known transactions are updated,
+           so new payments to the address are ignored until refresh, but only the known transactions are retrieved.'''
+
+        tip = self.provider.getblockcount()
+        if tip <= self.height:
+            return
+
+        txids = None if scan_blocks else self.pending_txids()
+        self.add_confirmations(tip - self.height)
+        for height, txes in read_blocks(self.provider, self.height + 1, tip, txids):
+            for tx in txes:
+                self.apply_transaction(tx, tip - height + 1)
+        self.height = tip
+
+    def available(self) -> list:
+        '''unreserved UTXOs, with less confirmations first and the unconfirmed UTXOs at the end.'''
+
+        with self.lock:
+            return self._available()
+
+    def _available(self) -> list:
+        # must be called with the lock acquired.
+
+        utxos = [u for outpoint, u in self.utxos.items() if outpoint not in self.reserved]
+        return sorted(utxos, key=lambda u: (u["confirmations"] == 0, u["confirmations"]))
+
+    @property
+    def balance(self) -> Decimal:
+        return sum([u["amount"] for u in self.available()], Decimal(0))
+
+    def select(self, amount: Decimal, locktime: int=0, strategy: object=None, reserve: bool=True) -> dict:
+        '''selects and reserves UTXOs with a total value of at least amount.
+           With reserve=False the UTXOs are only selected, so they stay available for later selections.
+           Returns a dict like the select_inputs method of the providers.'''
+
+        select_utxos = self.strategy if strategy is None else get_strategy(strategy)
+
+        with self.lock:
+            available = self._available()
+            try:
+                utxos = select_utxos([u for u in available if u["confirmations"] > 0], amount)
+            except InsufficientFunds:
+                utxos = select_utxos(available, amount)
+            if reserve:
+                self.reserved.update([(u["txid"], u["vout"]) for u in utxos])
+
+        inputs = [MutableTxIn(txid=u["txid"],
+                              txout=u["vout"],
+                              sequence=self.provider.calc_sequence(locktime),
+                              script_sig=ScriptSig.empty())
+                  for u in utxos]
+
+        return {'utxos': inputs, 'total': sum([u["amount"] for u in utxos], Decimal(0))}
+
+    def release(self, inputs: list) -> None:
+        '''releases the reservation of inputs (TxIns), e.g. if the transaction was not sent.'''
+
+        with self.lock:
+            self.reserved.difference_update([(i.txid, i.txout) for i in inputs])
+
+    def spend(self, inputs: list) -> None:
+        '''removes inputs (TxIns) of a sent transaction from the set.'''
+
+        with self.lock:
+            for i in inputs:
+                self.utxos.pop((i.txid, i.txout), None)
+                self.reserved.discard((i.txid, i.txout))
+                self.spent.add((i.txid, i.txout))
+
+    def listunspent(self) -> list:
+        '''all UTXOs of the set (including the reserved ones), in the RPC listunspent format.'''
+
+        with self.lock:
+            return list(self.utxos.values())
+
+
+class UtxoCache(object):
+    '''UtxoSets of the addresses used with a provider instance. The select_inputs method of the instance selects from
+       the cached sets, which are synchronized with the new blocks before each selection; sendrawtransaction
+       updates them with the sent transaction. Call stop() to restore the methods of the provider.'''
+
+    def __init__(self, provider: object, strategy: object="confirmations", scan_blocks: bool=True) -> None:
+
+        self.provider = provider
+        self.strategy = get_strategy(strategy)
+        self.scan_blocks = scan_blocks
+        self.sets = {} # address -> UtxoSet
+        self.lock = threading.Lock()
+
+        self._sendrawtransaction = getattr(provider, "sendrawtransaction", None)
+        wrappers = {"select_inputs" : self.select_inputs}
+        if self._sendrawtransaction is not None:
+            wrappers["sendrawtransaction"] = self.sendrawtransaction
+        self._wrapped = wrap_instance_methods(provider, wrappers)
+
+    def __enter__(self) -> "UtxoCache":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        unwrap_instance_methods(self.provider, self._wrapped)
+
+    def utxo_set(self, address: str) -> UtxoSet:
+        '''returns the synchronized UtxoSet of address, which is created at the first call.'''
+
+        with self.lock:
+            self.sync()
+            if address not in self.sets:
+                self.sets[address] = UtxoSet(self.provider, address, self.strategy)
+            return self.sets[address]
+
+    def sync(self) -> None:
+        '''updates all sets with the new blocks. The blocks are retrieved only once for all sets.'''
+
+        if len(self.sets) == 0:
+            return
+
+        tip = self.provider.getblockcount()
+        height = min([s.height for s in self.sets.values()])
+        if tip <= height:
+            return
+
+        if self.scan_blocks:
+            txids = None
+        else:
+            txids = set().union(*[s.pending_txids() for s in self.sets.values()])
+
+        for utxo_set in self.sets.values():
+            utxo_set.add_confirmations(tip - utxo_set.height)
+
+        for block_height, txes in read_blocks(self.provider, height + 1, tip, txids):
+            for utxo_set in self.sets.values():
+                if block_height <= utxo_set.height:
+                    continue
+                for tx in txes:
+                    utxo_set.apply_transaction(tx, tip - block_height + 1)
+
+        for utxo_set in self.sets.values():
+            utxo_set.height = tip
+
+    def select_inputs(self, address: str, amount: Decimal, locktime: int=0) -> dict:
+        # like the select_inputs methods of the providers, this doesn't reserve the UTXOs, as the callers
+        # never release them. Reserving selections are made with the UtxoSet (see utxo_set).
+        return self.utxo_set(address).select(amount, locktime, reserve=False)
+
+    def sendrawtransaction(self, rawtxn: str) -> str:
+
+        result = self._sendrawtransaction(rawtxn)
+        self.apply_raw_transaction(rawtxn)
+        return result
+
+    def apply_raw_transaction(self, rawtxn: str) -> None:
+        '''updates all sets with a sent transaction (hex string).'''
+
+        from pypeerassets.transactions import Transaction # circular import
+
+        tx = Transaction.unhexlify(rawtxn, network=net_query(self.provider.network)).to_json()
+        for utxo_set in list(self.sets.values()):
+            utxo_set.apply_transaction(tx)
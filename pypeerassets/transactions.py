@@ -1,5 +1,6 @@
 '''transaction assembly/dissasembly'''
 
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from math import ceil
 from time import time
@@ -29,7 +30,7 @@ from btcpy.structs.transaction import (
 )
 
 from pypeerassets.kutil import Kutil
-from pypeerassets.networks import PeercoinMainnet, net_query
+from pypeerassets.networks import Constants, PeercoinMainnet, net_query
 from pypeerassets.provider import Provider
 
 
@@ -215,10 +216,10 @@ class TransactionParser(BtcPyTxParser):
 def calculate_tx_fee(tx_size: int) -> Decimal:
     '''return tx fee from tx size in bytes'''
 
-    per_kb_cost = 0.01
-    min_fee = Decimal(0.001)
+    per_kb_cost = Decimal("0.01")
+    min_fee = Decimal("0.001")
 
-    fee = Decimal((tx_size / 1000) * per_kb_cost)
+    fee = Decimal(tx_size) * per_kb_cost / 1000
 
     if fee <= min_fee:
         return min_fee
@@ -226,6 +227,87 @@ def calculate_tx_fee(tx_size: int) -> Decimal:
         return fee
 
 
+# serialized sizes of signed inputs: outpoint (36), script length (1), scriptSig, sequence (4).
+# The scriptSigs contain a DER signature of max. 72 bytes plus sighash byte, and a compressed public key.
+P2PKH_INPUT_SIZE = 36 + 1 + (1 + 73) + (1 + 33) + 4
+P2PK_INPUT_SIZE = 36 + 1 + (1 + 73) + 4
+
+MAX_STANDARD_TX_SIZE = 100000 # bytes, larger transactions are not relayed
+
+
+def varint_size(number: int) -> int:
+    '''size of the compact size (varint) encoding of number'''
+
+    if number < 0xfd:
+        return 1
+    elif number <= 0xffff:
+        return 3
+    elif number <= 0xffffffff:
+        return 5
+    return 9
+
+
+def pushdata_size(data_length: int) -> int:
+    '''size of a push of data_length bytes in a script'''
+
+    if data_length < 76:
+        return 1 + data_length
+    elif data_length <= 0xff:
+        return 2 + data_length
+    elif data_length <= 0xffff:
+        return 3 + data_length
+    return 5 + data_length
+
+
+def estimate_input_size(script_type: str="p2pkh", redeem_script: object=None) -> int:
+    '''estimated size of a signed input spending a p2pkh, p2pk or p2sh output.
+       P2SH inputs are assumed to be solved with a signature and a public key (e.g. timelock scripts).'''
+
+    if script_type == "p2pkh":
+        return P2PKH_INPUT_SIZE
+    elif script_type == "p2pk":
+        return P2PK_INPUT_SIZE
+    elif script_type == "p2sh":
+        script_sig_size = (1 + 73) + (1 + 33) + pushdata_size(len(redeem_script.serialize()))
+        return 36 + varint_size(script_sig_size) + script_sig_size + 4
+
+    raise ValueError("Unsupported input script type: {}".format(script_type))
+
+
+def estimate_output_size(output: TxOut) -> int:
+    '''size of a serialized output: value (8), script length and script'''
+
+    script_size = len(output.script_pubkey.serialize())
+    return 8 + varint_size(script_size) + script_size
+
+
+def estimate_tx_size(network: str, inputs: list, outputs: list) -> int:
+    '''estimated size in bytes of the signed transaction, before it's built.
+       inputs - list of input script types (see estimate_input_size) or sizes
+       outputs - list of TxOut objects'''
+
+    network_params = net_query(network)
+
+    size = 4 + 4 # version and locktime
+    if network_params.tx_timestamp:
+        size += 4
+    size += varint_size(len(inputs)) + varint_size(len(outputs))
+    size += sum([i if isinstance(i, int) else estimate_input_size(i) for i in inputs])
+    size += sum([estimate_output_size(o) for o in outputs])
+
+    return size
+
+
+def estimate_tx_fee(tx_size: int, network: str) -> int:
+    '''minimum fee in satoshis for a transaction of tx_size bytes:
+       min_tx_fee per started kilobyte, like the Peercoin client (nBaseFee * (1 + nBytes / 1000)).'''
+
+    network_params = net_query(network)
+    fee_per_kb = int(network_params.min_tx_fee * network_params.to_unit)
+
+    return (1 + tx_size // 1000) * fee_per_kb
+
+
 def nulldata_script(data: bytes) -> NulldataScript:
     '''create nulldata (OP_return) script'''
 
@@ -314,10 +396,11 @@ def find_parent_outputs(provider: Provider, utxo: TxIn) -> TxOut:
 """
 
 
-def find_parent_outputs(provider: Provider, utxo: TxIn) -> TxOut:
-    '''due to design of the btcpy library, TxIn object must be converted to TxOut object before signing'''
+def find_parent_outputs(provider: Provider, utxo: TxIn, network: Constants=None) -> TxOut:
+    '''due to design of the btcpy library, TxIn object must be converted to TxOut object before signing.
+       network (resolved network parameters) avoids querying provider.network for each input.'''
 
-    network_params = net_query(provider.network)
+    network_params = net_query(provider.network if network is None else network)
     index = utxo.txout  # utxo index
     txjson = provider.getrawtransaction(utxo.txid,
                            1)['vout'][index]
@@ -325,9 +408,107 @@ def find_parent_outputs(provider: Provider, utxo: TxIn) -> TxOut:
                            network=network_params)
 
 
+def utxo_to_txout(utxo: dict, network: str) -> TxOut:
+    '''create the TxOut object of an UTXO in listunspent format (txid, vout, amount, scriptPubKey hex)'''
+
+    network_params = net_query(network)
+    return TxOut(network=network_params,
+                 value=int(Decimal(str(utxo["amount"])) * network_params.to_unit),
+                 n=utxo["vout"],
+                 script_pubkey=ScriptBuilder.identify(utxo["scriptPubKey"]))
+
+
+def prefetch_parent_outputs(provider: Provider, unsigned_txes: list, utxos: list=[],
+                            parent_outputs: dict=None, network: str=None) -> dict:
+    '''find the parent outputs of the inputs of several transactions at once.
+       Returns a dict (txid, vout) -> TxOut. Each parent transaction is retrieved only once,
+       with a single batch request if the provider supports it (RpcNode).
+       Transactions the batch doesn't return (error entries, e.g. pruned parents) are left out;
+       get_parent_outputs retrieves them one by one.
+       UTXOs already known (listunspent format, e.g. from provider.listunspent) are used without lookup.
+       network can be given to avoid the lookup of provider.network.'''
+
+    if parent_outputs is None:
+        parent_outputs = {}
+
+    # provider.network is a RPC call in some providers, so it's looked up at most once.
+    for utxo in utxos:
+        if not utxo.get("scriptPubKey"): # some explorers don't return the script
+            continue
+        if (utxo["txid"], utxo["vout"]) not in parent_outputs:
+            if network is None:
+                network = provider.network
+            parent_outputs[(utxo["txid"], utxo["vout"])] = utxo_to_txout(utxo, network)
+
+    missing_txids = []
+    for unsigned in unsigned_txes:
+        for txin in unsigned.ins:
+            if (txin.txid, txin.txout) not in parent_outputs and txin.txid not in missing_txids:
+                missing_txids.append(txin.txid)
+
+    if len(missing_txids) == 0:
+        return parent_outputs
+
+    if hasattr(provider, "batch"):
+        result = provider.batch([('getrawtransaction', [txid, 1]) for txid in missing_txids])
+        parent_txes = [r["result"] for r in result if r.get("result") is not None]
+    else:
+        parent_txes = [provider.getrawtransaction(txid, 1) for txid in missing_txids]
+
+    network_params = net_query(provider.network if network is None else network)
+    needed = set((txin.txid, txin.txout) for unsigned in unsigned_txes for txin in unsigned.ins)
+    for tx in parent_txes:
+        for vout in tx["vout"]:
+            if (tx["txid"], vout["n"]) in needed:
+                parent_outputs.update({(tx["txid"], vout["n"]) : TxOut.from_json(vout, network=network_params)})
+
+    return parent_outputs
+
+
+def get_parent_outputs(provider: Provider, unsigned: MutableTransaction, parent_outputs: dict=None) -> list:
+    '''parent outputs of the inputs of a transaction, from a prefetched dict or the provider.
+       Outputs missing in the dict are retrieved from the provider and added to it.'''
+
+    if parent_outputs is None:
+        parent_outputs = {}
+
+    missing = [i for i in unsigned.ins if (i.txid, i.txout) not in parent_outputs]
+    if len(missing) > 0:
+        network = net_query(provider.network)
+        for i in missing:
+            parent_outputs[(i.txid, i.txout)] = find_parent_outputs(provider, i, network)
+
+    return [parent_outputs[(i.txid, i.txout)] for i in unsigned.ins]
+
+
 def sign_transaction(provider: Provider, unsigned: MutableTransaction,
-                     key: Kutil) -> Transaction:
-    '''sign transaction with Kutil'''
+                     key: Kutil, parent_outputs: dict=None) -> Transaction:
+    '''sign transaction with Kutil.
+       parent_outputs (see prefetch_parent_outputs) avoids the lookup of the parent transactions.'''
+
+    return key.sign_transaction(get_parent_outputs(provider, unsigned, parent_outputs), unsigned)
+
+
+def _sign_with_parent_outputs(unsigned: MutableTransaction, txouts: list, key: Kutil) -> Transaction:
+    return key.sign_transaction(txouts, unsigned)
+
+
+def sign_transactions(provider: Provider, unsigned_txes: list, keys: object,
+                      utxos: list=[], max_workers: int=None) -> list:
+    '''sign several transactions at once.
+       keys is a Kutil or a list with one Kutil per transaction.
+       The parent outputs of all inputs are retrieved first (see prefetch_parent_outputs),
+       then the transactions are signed, in a process pool if max_workers is higher than 1.
+       Returns the signed transactions in the same order.'''
+
+    if isinstance(keys, Kutil):
+        keys = [keys for tx in unsigned_txes]
+
+    parent_outputs = prefetch_parent_outputs(provider, unsigned_txes, utxos=utxos)
+    txouts = [get_parent_outputs(provider, unsigned, parent_outputs) for unsigned in unsigned_txes]
+
+    if max_workers is not None and max_workers > 1 and len(unsigned_txes) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_sign_with_parent_outputs, unsigned_txes, txouts, keys))
 
-    parent_outputs = [find_parent_outputs(provider, i) for i in unsigned.ins]
-    return key.sign_transaction(parent_outputs, unsigned)
+    return [_sign_with_parent_outputs(unsigned, tx_txouts, key) for unsigned, tx_txouts, key in zip(unsigned_txes, txouts, keys)]
@@ -0,0 +1,43 @@
+"""Fixtures for the tests running on synthetic chains (see pypeerassets.chain_generator), which need no client daemon.
+They're factories, so each module creates its chain with its own seed and size in a fixture of the scope it needs."""
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.chain_generator import ChainGenerator
+
+
+@pytest.fixture(scope="session")
+def funded_chain():
+    """Creates a chain with a deck and a key with payments UTXOs of amount. Returns (generator, deck, key).
+       provider_class replaces the MemoryProvider of the generator, e.g. by a subclass with batch requests."""
+
+    def create(seed: int, deck_name: str, key_string: str, payments: int, amount: object, provider_class: type=None) -> tuple:
+
+        generator = ChainGenerator(seed=seed)
+        if provider_class is not None:
+            generator.provider = provider_class(network=generator.provider.network)
+        deck = generator.spawn_deck(deck_name)
+        key = pa.Kutil(network=generator.network.shortname, from_string=key_string)
+        for i in range(payments):
+            generator.pay(key.address, amount)
+        generator.mine()
+        return generator, deck, key
+
+    return create
+
+
+@pytest.fixture(scope="session")
+def transfer_chain():
+    """Creates a chain with a deck with n_transfers card transfers (keyword arguments: see ChainGenerator.add_card_transfers).
+       Returns (generator, deck)."""
+
+    def create(seed: int, deck_name: str, n_transfers: int, n_addresses: int=1000, **kwargs) -> tuple:
+
+        generator = ChainGenerator(seed=seed, n_addresses=n_addresses)
+        deck = generator.spawn_deck(deck_name)
+        generator.add_card_transfers(deck, n_transfers, **kwargs)
+        generator.run()
+        return generator, deck
+
+    return create
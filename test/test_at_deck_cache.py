@@ -0,0 +1,63 @@
+import pytest
+import pypeerassets.__main__ as pm
+from pypeerassets.at.deck_cache import DeckCache
+from .at_dt_dummy_classes import TestObj
+
+
+class TipProvider:
+    """Minimal provider which only knows the chain tip."""
+
+    def __init__(self, height):
+        self.height = height
+
+    def getblockcount(self):
+        return self.height
+
+    def getblockhash(self, height):
+        return "hash" + str(height)
+
+
+def dummy_card(cid, blocknum):
+    return TestObj(cid=cid, txid=cid, type="CardIssue", sender="issuer", receiver=["receiver"], amount=[10],
+                   blocknum=blocknum, blockseq=0, cardseq=0, locktime=0, network="tslm")
+
+
+@pytest.fixture
+def parse_counter(monkeypatch):
+    calls = []
+    def fake_find_all_valid_cards(provider, deck):
+        calls.append(deck.id)
+        return [dummy_card(str(h), h) for h in range(provider.height)]
+    monkeypatch.setattr(pm, "find_all_valid_cards", fake_find_all_valid_cards)
+    return calls
+
+def test_deckstate_reused_at_same_tip(parse_counter):
+    cache = DeckCache()
+    provider = TipProvider(3)
+    deck = TestObj(id="deck")
+    state = cache.get_deckstate(provider, deck)
+    assert cache.get_deckstate(provider, deck) is state
+    assert len(cache.get_valid_cards(provider, deck)) == 3
+    assert parse_counter == ["deck"]
+
+def test_deckstate_recalculated_on_new_block(parse_counter):
+    cache = DeckCache()
+    provider = TipProvider(3)
+    deck = TestObj(id="deck")
+    cache.get_deckstate(provider, deck)
+    provider.height = 4
+    assert len(cache.get_valid_cards(provider, deck)) == 4
+    assert parse_counter == ["deck", "deck"]
+
+def test_update_tip_and_invalidate(parse_counter):
+    cache = DeckCache()
+    provider = TipProvider(3)
+    cache.get_deckstate(provider, TestObj(id="deck1"))
+    cache.get_deckstate(provider, TestObj(id="deck2"))
+    cache.update_tip(provider)
+    assert set(cache.states) == {"deck1", "deck2"}
+    cache.invalidate("deck1")
+    assert set(cache.states) == {"deck2"}
+    provider.height = 5
+    cache.update_tip(provider)
+    assert cache.states == {}
@@ -0,0 +1,100 @@
+import pytest
+from pypeerassets.at.dt_parser_state import ParserState
+from pypeerassets.at.dt_states import ProposalState
+from .at_dt_dummy_classes import TestObj
+
+# These tests don't need a running client daemon: the ParserState is created without SDP deck,
+# and the proposal states are replaced by dummies which only count votes.
+
+class DummyProposalState:
+
+    def __init__(self, pid, start_epoch, end_epoch, modified_end_epoch=None, approved=True):
+        self.id = pid
+        self.start_epoch = start_epoch
+        self.end_epoch = end_epoch
+        self.modified_end_epoch = modified_end_epoch
+        self.approved = approved
+        self.voting_periods = [[0, 0], [0, 0]]
+        self.first_ptx = TestObj(txid=pid)
+        self.valid_ptx = TestObj(txid=pid + "mod" if modified_end_epoch else pid)
+        self.processed_phases = []
+        self.state = "active"
+        self.dist_factor = None
+
+    def process_votes(self, enabled_voters, phase, debug=False):
+        self.processed_phases.append(phase)
+        votes = {"positive" : 1 if self.approved else 0, "negative" : 0}
+        if phase == 0:
+            self.initial_votes = votes
+        else:
+            self.final_votes = votes
+
+    def modify(self, debug=False):
+        self.end_epoch = self.modified_end_epoch
+
+    def set_dist_factor(self, ending_proposals):
+        self.dist_factor = 1
+
+
+def get_parser_state(pstates):
+    deck = TestObj(sdp_deckid=None, epoch_length=10, sdp_periods=2)
+    pst = ParserState(deck, [], provider=None, start_epoch=0, current_blockheight=1000)
+    pst.sdp_decimal_diff = 0
+    pst.proposal_states = {p.id : p for p in pstates}
+    pst.index_proposal_states()
+    return pst
+
+def test_only_proposals_of_current_epoch_processed():
+    p1, p2, p3 = DummyProposalState("a", 1, 3), DummyProposalState("b", 2, 4), DummyProposalState("c", 2, 5, approved=False)
+    pst = get_parser_state([p1, p2, p3])
+    assert pst.start_epoch_index == {1 : ["a"], 2 : ["b", "c"]}
+
+    pst.epoch = 2
+    pst.update_approved_proposals()
+    assert p1.processed_phases == []
+    assert list(pst.approved_proposals) == ["b"]
+    assert p3.state == "abandoned"
+    assert pst.end_epoch_index == {4 : ["b"]}
+
+def test_end_epoch_index_follows_modification():
+    p1 = DummyProposalState("a", 1, 5, modified_end_epoch=3)
+    pst = get_parser_state([p1])
+    pst.epoch = 1
+    pst.update_approved_proposals()
+    assert pst.end_epoch_index == {3 : ["a"]}
+
+    for epoch in (3, 5):
+        pst.epoch = epoch
+        pst.update_valid_ending_proposals()
+    assert p1.processed_phases == [0, 1]
+    assert list(pst.valid_proposals) == ["a"]
+
+def get_ptx(txid, epoch_number):
+    ptx = TestObj(txid=txid, description="test", donation_address="donor", epoch=1, epoch_number=epoch_number, req_amount=100)
+    ptx.set_required_timelock = lambda tx_epoch: setattr(ptx, "req_timelock", tx_epoch * 10)
+    ptx.deck = TestObj(epoch_length=10, standard_round_unit=1)
+    return ptx
+
+def test_end_epoch_index_follows_proposal_modification():
+    pstate = ProposalState(first_ptx=get_ptx("a" * 64, 4), valid_ptx=get_ptx("a" * 64, 4))
+    pst = get_parser_state([pstate])
+    pst.approved_proposals = {pstate.id : pstate}
+    pst.index_end_epoch(pstate)
+    old_end_epoch = pstate.end_epoch
+
+    pstate.valid_ptx = get_ptx("b" * 64, 1)
+    pst.modify_proposal(pstate)
+    assert pstate.end_epoch != old_end_epoch
+    assert pst.end_epoch_index == {pstate.end_epoch : [pstate.id]}
+
+def test_end_epoch_index_rebuilt_for_initial_state():
+    # an approved proposal of an initial parser state, modified after the index was created.
+    pstate = ProposalState(first_ptx=get_ptx("a" * 64, 4), valid_ptx=get_ptx("a" * 64, 4))
+    pst = get_parser_state([pstate])
+    pst.approved_proposals = {pstate.id : pstate}
+    pst.end_epoch_index = {pstate.end_epoch : [pstate.id]}
+
+    pstate.valid_ptx = get_ptx("b" * 64, 1)
+    pstate.modify()
+    pst.index_proposal_states()
+    assert pst.end_epoch_index == {pstate.end_epoch : [pstate.id]}
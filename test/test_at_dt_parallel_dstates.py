@@ -0,0 +1,102 @@
+import pytest
+import pypeerassets as pa
+import pypeerassets.at.dt_parser_utils as dpu
+import pypeerassets.at.dt_periods as dp
+from pypeerassets.protocol import Deck
+from pypeerassets.at.dt_parser import dt_parser
+from pypeerassets.at.dt_parser_state import ParserState
+from pypeerassets.chain_generator import ChainGenerator
+from .at_dt_dummy_classes import TestObj
+
+# The dummy proposal states are processed in worker processes, so they must be picklable (module level classes).
+
+class DummyProposalState:
+
+    def __init__(self, pid, end_epoch, dtx_txids):
+        self.id = pid
+        self.end_epoch = end_epoch
+        self.processed = [False, False]
+        self.donation_states = []
+        self.all_signalling_txes = []
+        self.all_donation_txes = [TestObj(txid=t, donor_address=None, _input_addresses=["input_" + t]) for t in dtx_txids]
+
+    def set_donation_states(self, current_blockheight, debug=False):
+        for dtx in self.all_donation_txes:
+            dtx.donor_address = "donor_" + dtx.txid
+        self.donation_states = [{dtx.txid : current_blockheight for dtx in self.all_donation_txes}]
+        self.processed = [True, True]
+
+
+def get_parser_state(pstates, parallel_dstates):
+    deck = TestObj(sdp_deckid=None, epoch_length=10)
+    pst = ParserState(deck, [], provider=None, start_epoch=0, current_blockheight=1000, parallel_dstates=parallel_dstates)
+    pst.proposal_states = {p.id : p for p in pstates}
+    pst.valid_proposals = dict(pst.proposal_states)
+    pst.donation_txes = {dtx.txid : dtx for p in pstates for dtx in p.all_donation_txes}
+    pst.epoch = 1
+    return pst
+
+@pytest.mark.parametrize("parallel_dstates", [False, True])
+def test_force_dstates(parallel_dstates):
+    p1, p2 = DummyProposalState("a", 2, ["d1", "d2"]), DummyProposalState("b", 3, ["d3"])
+    pst = get_parser_state([p1, p2], parallel_dstates)
+    pst.force_dstates()
+
+    assert pst.proposal_states["a"] is p1
+    assert p1.donation_states == [{"d1" : 1000, "d2" : 1000}]
+    assert p2.donation_states == [{"d3" : 1000}]
+    assert pst.donation_txes["d3"] is p2.all_donation_txes[0]
+    assert pst.donation_txes["d3"].donor_address == "donor_d3"
+
+def test_missing_dstates_set_for_all_valid_proposals():
+    p1, p2 = DummyProposalState("a", 2, ["d1"]), DummyProposalState("b", 3, ["d2"])
+    pst = get_parser_state([p1, p2], parallel_dstates=True)
+    pst.set_missing_dstates(p1)
+    assert p2.donation_states == [{"d2" : 1000}]
+
+
+def donation_state_summary(pstate):
+    return [{key : (d.donor_address, d.donated_amount, d.slot, d.effective_slot, d.effective_locking_slot, d.state, d.reward)
+             for key, d in rd_states.items()} for rd_states in pstate.donation_states]
+
+@pytest.fixture(scope="module")
+def dt_chain():
+    # Real ProposalStates: with Deck, TrackedTransactions (with the lazy _provider) and the period and slot table caches.
+    generator = ChainGenerator(seed=7, n_addresses=50)
+    sdp_deck = generator.spawn_deck("parallel_sdp")
+    dt_deck = generator.spawn_dt_deck("parallel_dt", sdp_deck)
+    generator.mine()
+    generator.issue_cards(sdp_deck, generator.addresses[:10], [10 ** 8] * 10)
+    generator.mine()
+    for i in range(3):
+        generator.add_proposal(dt_deck, height=dt_deck.epoch_length * (1 + i // 2) + i % 2)
+    generator.run()
+    return generator.provider, dt_deck, list(pa.find_all_valid_cards(generator.provider, dt_deck))
+
+def test_parallel_dstates_of_real_proposal_states(dt_chain, monkeypatch):
+    provider, deck, cards = dt_chain
+    set_donation_states_parallel = dpu.set_donation_states_parallel
+    sent = []
+
+    def set_donation_states_checked(pstates, *args, **kwargs):
+        for pstate in pstates:
+            dp.get_period_table(pstate) # the cached table goes through the pool, too.
+            sent.append((pstate, all(tx._provider is provider for tx in pstate.all_signalling_txes + pstate.all_donation_txes)))
+        return set_donation_states_parallel(pstates, *args, **kwargs)
+
+    monkeypatch.setattr(dpu, "set_donation_states_parallel", set_donation_states_checked)
+
+    results = {}
+    for parallel_dstates in (False, True):
+        pst = ParserState(deck, list(cards), provider, current_blockheight=provider.getblockcount(), parallel_dstates=parallel_dstates)
+        valid_cards = dt_parser(list(cards), provider, deck, initial_parser_state=pst, force_dstates=True)
+        results[parallel_dstates] = (sorted(c.txid for c in valid_cards),
+                                     {pid : donation_state_summary(p) for pid, p in pst.proposal_states.items()})
+
+    assert len(sent) == 3
+    # the ProposalStates had a Deck and TrackedTransactions with provider; the processed copies have the slot tables.
+    assert all(with_provider for (p, with_provider) in sent)
+    assert all(isinstance(p.deck, Deck) and p.period_table is not None and p.slot_tables[0] is not None for (p, with_provider) in sent)
+    assert len(results[True][1]) == 3
+    assert any(len(rd_states) > 0 for states in results[True][1].values() for rd_states in states)
+    assert results[True] == results[False]
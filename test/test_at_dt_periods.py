@@ -0,0 +1,41 @@
+import pytest
+import pypeerassets.at.dt_periods as dp
+from pypeerassets.at.dt_states import ProposalState
+from .at_dt_dummy_classes import TestObj
+
+
+def get_ptx(txid, epoch_number):
+    ptx = TestObj(txid=txid, description="test", donation_address="donor", epoch=10, epoch_number=epoch_number, req_amount=100)
+    ptx.set_required_timelock = lambda tx_epoch: setattr(ptx, "req_timelock", tx_epoch * 280)
+    ptx.deck = TestObj(epoch_length=280, standard_round_unit=10)
+    return ptx
+
+@pytest.fixture
+def proposal_state():
+    ptx = get_ptx("a" * 64, 2)
+    return ProposalState(first_ptx=ptx, valid_ptx=ptx)
+
+def test_period_lookup_equals_period_query(proposal_state):
+    period_dict = dp.get_period_dict(proposal_state)
+    blocks = list(range(0, 6000, 7)) + [2800, 3079, 3080]
+    expected = [dp.period_query(period_dict, b) for b in blocks]
+    assert [dp.get_period(proposal_state, b) for b in blocks] == expected
+    assert dp.get_periods(proposal_state, blocks) == expected
+    assert dp.get_period(proposal_state, 100000)[0] == ("E", 0)
+
+def test_period_table_reset_by_modification(proposal_state):
+    table = dp.get_period_table(proposal_state)
+    assert dp.get_period_table(proposal_state) is table
+    proposal_state.valid_ptx = get_ptx("b" * 64, 4)
+    proposal_state.modify()
+    assert proposal_state.period_table is None
+    period_dict = dp.get_period_dict(proposal_state)
+    assert dp.get_startendvalues(("E", 0), proposal_state) == period_dict[("E", 0)]
+
+def test_startendvalues_copy(proposal_state):
+    # modifying the returned list doesn't change the cached table.
+    values = dp.get_startendvalues(("B", 10), proposal_state)
+    expected = list(values)
+    values[0] = -1
+    assert dp.get_startendvalues(("B", 10), proposal_state) == expected
+    assert dp.get_period(proposal_state, expected[0])[1] == expected
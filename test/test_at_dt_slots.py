@@ -14,8 +14,9 @@ def test_get_raw_slot():
     slot = sl.get_raw_slot(tx_amount, av_amount=slot_rest, total_amount=total_amount)
     assert slot == 3
 
+@pytest.mark.parametrize("use_table", [False, True])
 @pytest.mark.parametrize("slot_rest", [50, 100, 200])
-def test_get_first_serve_slot(slot_rest):
+def test_get_first_serve_slot(slot_rest, use_table):
     stx = TestObj(txid="e", amount=20)
     fake_tx1 = TestObj(txid="a", amount=40)
     fake_tx2 = TestObj(txid="b", amount=50)
@@ -23,7 +24,8 @@ def test_get_first_serve_slot(slot_rest):
     fake_tx4 = TestObj(txid="d", amount=60)
     round_txes = [fake_tx1, fake_tx2, stx, fake_tx3, fake_tx4]
 
-    slot = sl.get_first_serve_slot(stx, round_txes, slot_rest=slot_rest)
+    table = sl.SlotTable([], round_txes) if use_table else None
+    slot = sl.get_first_serve_slot(stx, round_txes, slot_rest=slot_rest, table=table)
     if slot_rest == 50:
         assert slot == 0
     elif slot_rest == 100:
@@ -31,8 +33,9 @@ def test_get_first_serve_slot(slot_rest):
     else:
         assert slot == 20
 
+@pytest.mark.parametrize("use_table", [False, True])
 @pytest.mark.parametrize("av_amount", [100*COIN, 200*COIN, 5010*CENT])
-def test_get_priority_slot(av_amount):
+def test_get_priority_slot(av_amount, use_table):
     #stx_amounts = [5, 7, 10, 2, 0.5] # 24.5 (+ 20 from tx = 44.5)
     #rtx_amounts = [25, 11.2, 56] # 92.2
     tx = TestObj(amount=20*COIN, txid="x")
@@ -40,7 +43,8 @@ def test_get_priority_slot(av_amount):
     rtxes = [TestObj(reserved_amount=25*COIN, txid="1"), TestObj(reserved_amount=1120*CENT, txid="2"), TestObj(reserved_amount=56*COIN, txid="3")]
     #stxes = [TestObj(amount=int(a*COIN)) for a in stx_amounts]
     #rtxes = [TestObj(reserved_amount=int(a*COIN)) for a in rtx_amounts]
-    slot = sl.get_priority_slot(tx, rtxes, stxes, av_amount, ramount=None, samount=None)
+    table = sl.SlotTable(rtxes, stxes) if use_table else None
+    slot = sl.get_priority_slot(tx, rtxes, stxes, av_amount, ramount=None, samount=None, table=table)
     if av_amount == 100*COIN:
         assert slot == 350561797 # rest of 7.8 is divided by 44.5, * 20
     elif av_amount == 200*COIN:
@@ -52,3 +56,11 @@ def test_get_priority_slot(av_amount):
 
 
 
+
+def test_slot_table():
+    stxes = [TestObj(txid="a", amount=40), TestObj(txid="b", amount=50), TestObj(txid="c", amount=20)]
+    table = sl.SlotTable([TestObj(txid="r", reserved_amount=10)], stxes)
+    assert [table.amount_before(t.txid) for t in stxes] == [0, 40, 90]
+    assert table.rtx_txids == {"r"}
+    with pytest.raises(ValueError):
+        table.amount_before("x")
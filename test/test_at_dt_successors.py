@@ -0,0 +1,46 @@
+import pytest
+from pypeerassets.at.dt_entities import TrackedTransaction, TrackedTxIndex
+from .at_dt_dummy_classes import TestObj
+
+# Compares the results of successor search with and without TrackedTxIndex. No client daemon needed.
+
+def dummy_tx(txid, inputs, donor_address=None):
+    tx = TestObj(txid=txid, ins=[TestObj(txid=i[0], txout=i[1]) for i in inputs])
+    if donor_address is not None:
+        tx.donor_address = donor_address
+    return tx
+
+ORIGIN = TestObj(txid="origin", address="addr1", reserve_address="addr2", dist_round=5)
+TX_LIST = [dummy_tx("a", [("other", 2)], donor_address="addr1"),
+           dummy_tx("b", [("origin", 3), ("origin", 1)], donor_address="addr2"),
+           dummy_tx("c", [("origin", 2)], donor_address="addr1"),
+           dummy_tx("d", [("origin", 2)], donor_address="addr3"),
+           dummy_tx("e", [("other", 0), ("origin", 0)], donor_address="addr1")]
+
+@pytest.mark.parametrize("reserve_mode", [False, True])
+def test_set_direct_successor(reserve_mode):
+    attribute = "reserve_successor" if reserve_mode else "direct_successor"
+    origin_a, origin_b = TestObj(txid="origin"), TestObj(txid="origin")
+    assert TrackedTransaction.set_direct_successor(origin_a, TX_LIST, reserve_mode=reserve_mode)
+    assert TrackedTransaction.set_direct_successor(origin_b, TX_LIST, reserve_mode=reserve_mode, index=TrackedTxIndex(TX_LIST))
+    assert getattr(origin_a, attribute) is getattr(origin_b, attribute)
+    assert not TrackedTransaction.set_direct_successor(TestObj(txid="none"), TX_LIST, index=TrackedTxIndex(TX_LIST))
+
+def test_get_direct_successors():
+    expected = TrackedTransaction.get_direct_successors(ORIGIN, TX_LIST)
+    assert [t.txid for t in expected] == ["b", "c", "d", "e"]
+    assert TrackedTransaction.get_direct_successors(ORIGIN, TX_LIST, index=TrackedTxIndex(TX_LIST)) == expected
+
+@pytest.mark.parametrize("reserve_mode", [False, True])
+def test_get_indirect_successors(reserve_mode):
+    expected = TrackedTransaction.get_indirect_successors(ORIGIN, TX_LIST, reserve_mode=reserve_mode)
+    indexed = TrackedTransaction.get_indirect_successors(ORIGIN, TX_LIST, reserve_mode=reserve_mode, index=TrackedTxIndex(TX_LIST))
+    assert indexed == expected
+
+def test_update_donor_address():
+    tx_list = [dummy_tx("a", [("x", 0)]), dummy_tx("b", [("y", 0)], donor_address="addr1")]
+    index = TrackedTxIndex(tx_list)
+    tx_list[0].donor_address = "addr1"
+    index.update_donor_address(tx_list[0])
+    assert [t.txid for t in index.get_donor_txes("addr1", predecessor=ORIGIN)] == ["a", "b"]
+    assert index.get_donor_txes(None, predecessor=ORIGIN) == []
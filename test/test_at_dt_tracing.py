@@ -0,0 +1,61 @@
+import pypeerassets as pa
+from pypeerassets.at.dt_tracing import ParserTracer, NullTracer, tracing, get_tracer
+from pypeerassets.at.dt_parser import dt_parser
+from pypeerassets.chain_generator import generate_chain
+
+
+def test_null_tracer_is_default():
+    assert isinstance(get_tracer(), NullTracer)
+    tracer = ParserTracer()
+    with tracing(tracer):
+        assert get_tracer() is tracer
+    assert isinstance(get_tracer(), NullTracer)
+
+
+def test_tracer_summary():
+    received = []
+    tracer = ParserTracer(callback=received.append, keep_spans=False)
+    with tracer.span("step", epoch=3, cards=2) as span:
+        span.set(txes=5)
+    tracer.emit("step", 0.5, epoch=4, cards=1)
+
+    assert tracer.spans == []
+    assert [s["epoch"] for s in received] == [3, 4]
+    assert received[0]["txes"] == 5
+    summary = tracer.summary()["step"]
+    assert summary["spans"] == 2 and summary["cards"] == 3 and "epoch" not in summary
+
+
+def test_dt_parser_spans():
+    generator, decks = generate_chain(n_transfers=20, n_proposals=2, n_at_donations=1, transfers_per_block=20)
+    provider, deck = generator.provider, decks["dt"]
+    untraced_cards = list(pa.find_all_valid_cards(provider, deck))
+
+    tracer = ParserTracer()
+    with tracing(tracer):
+        cards = list(pa.find_all_valid_cards(provider, deck))
+
+    assert [c.txid for c in cards] == [c.txid for c in untraced_cards]
+    summary = tracer.summary()
+    for name in ("init_parser", "get_sdp_cards", "get_proposal_states", "get_tracked_txes", "epoch_init", "epoch_postprocess", "set_donation_states", "validate_cards"):
+        assert name in summary
+
+    assert summary["get_proposal_states"]["proposals"] == 2
+    assert summary["validate_cards"]["cards"] == len(untraced_cards)
+    assert summary["validate_cards"]["valid_cards"] == len(cards)
+    assert summary["set_donation_states"]["spans"] == 2
+    tx_types = [s["tx_type"] for s in tracer.spans if s["name"] == "get_tracked_txes"]
+    assert sorted(tx_types) == ["donation", "locking", "signalling", "voting"]
+
+
+def test_tracer_argument():
+    generator, decks = generate_chain(n_transfers=0, n_proposals=1, n_at_donations=1)
+    provider, deck = generator.provider, decks["dt"]
+    cards = [card for bundle in pa.get_card_bundles(provider, deck) for card in bundle]
+
+    tracer = ParserTracer()
+    valid_cards = dt_parser(cards, provider, deck, tracer=tracer)
+
+    epochs = [s["epoch"] for s in tracer.spans if s["name"] == "validate_cards"]
+    assert len(valid_cards) > 0
+    assert epochs == sorted(set(epochs))
@@ -0,0 +1,41 @@
+import pytest
+import pypeerassets.at.dt_states as ds
+from .at_dt_dummy_classes import TestObj
+
+
+class DummyVote(TestObj):
+
+    def set_weight(self, weight):
+        self.vote_weight = weight
+
+
+def get_proposal_state(vtxes):
+    # ProposalState without ProposalTransactions: only the attributes needed for vote counting.
+    ps = ds.ProposalState.__new__(ds.ProposalState)
+    ps.deck = TestObj(number_of_decimals=2)
+    ps.start_epoch, ps.end_epoch = 10, 12
+    ps.all_voting_txes = vtxes
+    ps.voting_txes = [[], []]
+    ps.voting_txes_by_epoch = None
+    return ps
+
+def test_process_votes_last_vote_counts():
+    vtxes = [DummyVote(txid="a", sender="voter1", vote=True, epoch=10, blockheight=100, blockseq=1),
+             DummyVote(txid="b", sender="voter1", vote=False, epoch=10, blockheight=105, blockseq=0),
+             DummyVote(txid="c", sender="voter2", vote=True, epoch=10, blockheight=105, blockseq=2),
+             DummyVote(txid="d", sender="voter3", vote=True, epoch=10, blockheight=106, blockseq=0),
+             DummyVote(txid="e", sender="voter1", vote=True, epoch=12, blockheight=121, blockseq=0)]
+    voters = {"voter1" : 5, "voter2" : 7}
+    ps = get_proposal_state(vtxes)
+    ps.process_votes(voters, phase=0, debug=False)
+    assert ps.initial_votes == {"positive" : 7, "negative" : 5}
+    assert [v.txid for v in ps.voting_txes[0]] == ["c", "b"]
+
+    ps.process_votes(voters, phase=1, debug=False)
+    assert ps.final_votes == {"positive" : 5, "negative" : 0}
+    assert set(ps.voting_txes_by_epoch) == {10, 12}
+
+def test_process_votes_without_votes_in_phase():
+    ps = get_proposal_state([DummyVote(txid="a", sender="voter1", vote=True, epoch=10, blockheight=100, blockseq=1)])
+    ps.process_votes({"voter1" : 5}, phase=1, debug=False)
+    assert ps.final_votes == {"positive" : 0, "negative" : 0}
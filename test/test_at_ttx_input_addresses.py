@@ -0,0 +1,91 @@
+import pytest
+import json
+import pickle
+from copy import deepcopy
+from pypeerassets.at.ttx_base import BaseTrackedTransaction, prefetch_parent_txes
+
+with open("dt_dummy_txes.json", "r") as dummyfile:
+    tx_json = json.load(dummyfile)[0]
+
+# The same transaction with a P2PK-style input: the scriptSig contains only the signature.
+p2pk_tx_json = deepcopy(tx_json)
+p2pk_tx_json["vin"][0]["scriptSig"]["hex"] = tx_json["vin"][0]["scriptSig"]["hex"][:2 + 0x47 * 2]
+
+class CountingProvider:
+    """Provider which records getrawtransaction calls. Parent txes have the output index as address."""
+
+    network = "tslm"
+
+    def __init__(self):
+        self.calls = []
+
+    def getblock(self, blockhash):
+        return {"height" : 100, "tx" : [tx_json["txid"]]}
+
+    def getrawtransaction(self, txid, json_mode):
+        self.calls.append(txid)
+        return {"vout" : [{"scriptPubKey" : {"addresses" : ["address" + str(n)]}} for n in range(5)]}
+
+
+def test_input_addresses_lazy():
+    provider = CountingProvider()
+    tx = BaseTrackedTransaction.from_json(p2pk_tx_json, provider=provider)
+    assert provider.calls == []
+    assert tx.input_addresses == ["address3"]
+    assert tx.input_addresses == ["address3"]
+    assert len(provider.calls) == 1
+
+def test_input_addresses_from_pubkey():
+    provider = CountingProvider()
+    tx = BaseTrackedTransaction.from_json(tx_json, provider=provider)
+    assert tx.input_addresses == ["msN5EUgocdFaAie9PsqKh8bJJ79shRnL91"]
+    assert provider.calls == []
+
+def test_prefetch_parent_txes():
+    provider = CountingProvider()
+    txes = [BaseTrackedTransaction.from_json(j, provider=provider) for j in (p2pk_tx_json, p2pk_tx_json, tx_json)]
+    parent_txes = prefetch_parent_txes(txes, provider)
+    assert list(parent_txes) == [p2pk_tx_json["vin"][0]["txid"]]
+    assert [tx.input_addresses for tx in txes[:2]] == [["address3"], ["address3"]]
+    assert len(provider.calls) == 1
+
+class BatchProvider(CountingProvider):
+    """Provider with batch requests, returning an error entry for the txids in missing."""
+
+    def __init__(self, missing=()):
+        super().__init__()
+        self.missing = missing
+        self.batches = []
+
+    def batch(self, reqs):
+        self.batches.append(reqs)
+        return [{"result" : None, "error" : {"code" : -5}} if params[0] in self.missing else {"result" : getattr(self, method)(*params)}
+                for (method, params) in reqs]
+
+def test_prefetch_parent_txes_batch():
+    provider = BatchProvider()
+    second_json = deepcopy(p2pk_tx_json)
+    second_json["vin"][0]["txid"] = "ab" * 32
+    txes = [BaseTrackedTransaction.from_json(j, provider=provider) for j in (p2pk_tx_json, second_json, p2pk_tx_json)]
+    parent_txes = prefetch_parent_txes(txes, provider)
+    assert len(provider.batches) == 1
+    assert [params[0] for (method, params) in provider.batches[0]] == [p2pk_tx_json["vin"][0]["txid"], "ab" * 32]
+    assert list(parent_txes) == [p2pk_tx_json["vin"][0]["txid"], "ab" * 32]
+    assert [tx.input_addresses for tx in txes] == [["address3"]] * 3
+    assert len(provider.batches) == 1 and len(provider.calls) == 2
+
+def test_prefetch_parent_txes_batch_error():
+    # parent txes missing in the batch result are retrieved when the input addresses are resolved.
+    provider = BatchProvider(missing=[p2pk_tx_json["vin"][0]["txid"]])
+    tx = BaseTrackedTransaction.from_json(p2pk_tx_json, provider=provider)
+    assert prefetch_parent_txes([tx], provider) == {}
+    assert tx.input_addresses == ["address3"]
+    assert provider.calls == [p2pk_tx_json["vin"][0]["txid"]]
+
+def test_copies_without_provider():
+    provider = CountingProvider()
+    tx = BaseTrackedTransaction.from_json(p2pk_tx_json, provider=provider)
+    assert deepcopy(tx)._provider is provider
+    unpickled_tx = pickle.loads(pickle.dumps(tx))
+    assert unpickled_tx._provider is None
+    assert unpickled_tx.input_addresses == ["address3"]
@@ -0,0 +1,63 @@
+import pytest
+import json
+import pypeerassets.at.dt_parser_utils as dpu
+from pypeerassets.at.ttx_record import TrackedTxRecord
+from pypeerassets.at.ttx_base import BaseTrackedTransaction, InvalidTrackedTransactionError
+from pypeerassets.at.dt_entities import SignallingTransaction
+from pypeerassets.at.dt_parser_state import ParserState
+from .at_dt_dummy_classes import TestObj
+
+with open("dt_dummy_txes.json", "r") as dummyfile:
+    tx_dummies = json.load(dummyfile)
+
+PROPOSAL_TXID = "25a497d15b39dbd93c39612de3330aba18e18afad1fbc14f3e0e0c7df167702b"
+
+class BlockProvider:
+
+    network = "tslm"
+
+    def getblock(self, blockhash):
+        return {"height" : 100, "tx" : [t["txid"] for t in tx_dummies]}
+
+
+def test_record_fields():
+    record = TrackedTxRecord.from_json(tx_dummies[1])
+    assert record.proposal_txid == PROPOSAL_TXID
+    assert record.first_input == (tx_dummies[1]["vin"][0]["txid"], tx_dummies[1]["vin"][0]["vout"])
+    assert record.output_value(2) == tx_dummies[1]["vout"][2]["value"]
+    assert record.output_address(3) == tx_dummies[1]["vout"][3]["scriptPubKey"]["addresses"][0]
+    # proposal transactions refer to no proposal
+    assert TrackedTxRecord.from_json(tx_dummies[4]).proposal_txid is None
+
+@pytest.mark.parametrize("tx_json", tx_dummies)
+def test_materialize(tx_json):
+    provider = BlockProvider()
+    tx = TrackedTxRecord.from_json(tx_json).materialize(BaseTrackedTransaction, provider)
+    expected = BaseTrackedTransaction.from_json(tx_json, provider)
+    assert tx == expected
+    assert (tx.txid, tx.timestamp, tx.blockheight, tx.blockseq) == (expected.txid, expected.timestamp, expected.blockheight, expected.blockseq)
+    assert [o.value for o in tx.outs] == [o.value for o in expected.outs]
+
+def test_tracked_txes_of_unknown_proposals_not_created(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Transaction object created.")
+    monkeypatch.setattr(dpu, "get_marked_txes", lambda *args, **kwargs: [tx_dummies[2]])
+    monkeypatch.setattr(SignallingTransaction, "from_json", fail)
+
+    pst = ParserState(TestObj(id="deck", sdp_deckid=None, epoch_length=10), [], provider=BlockProvider(), start_epoch=0)
+    pst.proposal_states = {}
+    assert pst.get_tracked_txes("signalling") == 0
+
+def test_tracked_txes_of_known_proposals_materialized_on_use(monkeypatch):
+    monkeypatch.setattr(dpu, "get_marked_txes", lambda *args, **kwargs: [tx_dummies[2]])
+
+    pst = ParserState(TestObj(id="deck", sdp_deckid=None, epoch_length=10), [], provider=BlockProvider(), start_epoch=0)
+    pst.proposal_states = {PROPOSAL_TXID : TestObj(id=PROPOSAL_TXID, all_signalling_txes=[])}
+    assert pst.get_tracked_txes("signalling") == 0
+    pstate = pst.proposal_states[PROPOSAL_TXID]
+    assert pstate.all_signalling_txes == []
+    assert [r.txid for r in pst.tracked_tx_records[PROPOSAL_TXID]["signalling"]] == [tx_dummies[2]["txid"]]
+
+    pst.materialize_tracked_txes(pstate)
+    assert [(type(tx), tx.txid) for tx in pstate.all_signalling_txes] == [(SignallingTransaction, tx_dummies[2]["txid"])]
+    assert pst.tracked_tx_records == {}
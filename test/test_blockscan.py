@@ -0,0 +1,96 @@
+import pytest
+from pypeerassets.protocol import Deck, IssueMode
+from pypeerassets.pa_constants import param_query
+from pypeerassets.pautils import find_deck_spawns
+from pypeerassets.at.dt_parser_utils import get_marked_txes
+from pypeerassets.blockscan import BlockScan, BlockScanProvider, P2THFilter, get_watched_addresses, address_hash160
+
+
+OTHER = "mxfu9BNbsaECVVBRiqzavcvp6xhB2cz9r8"
+
+deck = Deck(name="blockscan_test", number_of_decimals=2, issue_mode=IssueMode.MULTI.value, network="tppc",
+            production=True, version=1, issuer=OTHER, id="ab" * 32)
+
+
+class BlockProvider:
+    """Fake provider with a list of blocks. It has no wallet, so listtransactions is not available."""
+
+    network = "tppc"
+
+    def __init__(self, blocks):
+        self.blocks = blocks # list of lists of tx dicts
+
+    def getblockcount(self):
+        return len(self.blocks) - 1
+
+    def getblockhash(self, height):
+        return "block{}".format(height)
+
+    def getblock(self, blockhash, decode=True):
+        return {"tx" : [tx["txid"] for tx in self.blocks[int(blockhash[5:])]]}
+
+    def getrawtransaction(self, txid, verbose=1):
+        for block in self.blocks:
+            for tx in block:
+                if tx["txid"] == txid:
+                    return tx
+
+
+def p2pkh_hex(address):
+    return "76a914" + address_hash160(address).hex() + "88ac"
+
+def tx(txid, *addresses):
+    # the first output has a script hex, the others only addresses.
+    vouts = [{"n" : n, "value" : 0, "scriptPubKey" : {"addresses" : [a]}} for n, a in enumerate(addresses)]
+    vouts[0]["scriptPubKey"]["hex"] = p2pkh_hex(addresses[0])
+    return {"txid" : txid, "vin" : [], "vout" : vouts}
+
+@pytest.fixture
+def provider():
+    spawn_p2th = param_query("tppc").P2TH_addr
+    return BlockProvider([[tx("spawn", spawn_p2th, OTHER)],
+                          [tx("other", OTHER), tx("card2", deck.p2th_address, OTHER)],
+                          [tx("card1", deck.p2th_address, deck.p2th_address)], # both outputs to P2TH: stored once
+                          [tx("card3", deck.p2th_address)]])
+
+@pytest.fixture
+def block_scan(provider):
+    scan = BlockScan(provider, get_watched_addresses("tppc", [deck]), max_workers=3)
+    scan.scan(0)
+    return scan
+
+def test_watched_addresses():
+    watched = get_watched_addresses("tppc", [deck], prod=False)
+    assert watched == {param_query("tppc").test_P2TH_addr : "PATEST", deck.p2th_address : deck.id}
+
+def test_scan_chain_order(block_scan):
+    assert block_scan.scanned_height == 3
+    assert block_scan.get_txids(deck.id) == ["card2", "card1", "card3"]
+    assert block_scan.get_txids(deck.p2th_address) == ["card2", "card1", "card3"]
+    assert [t["txid"] for t in block_scan.get_txes(deck.id, min_blockheight=2, max_blockheight=2)] == ["card1"]
+
+def test_update(provider):
+    scan = BlockScan(provider, get_watched_addresses("tppc", [deck]))
+    scan.scan(0, 1)
+    provider.blocks.append([tx("card4", deck.p2th_address)])
+    assert scan.update() == 4
+    assert scan.get_txids(deck.id) == ["card2", "card1", "card3", "card4"]
+
+def test_discovery_functions(provider, block_scan):
+    scan_provider = BlockScanProvider(provider, block_scan)
+    assert list(find_deck_spawns(scan_provider)) == ["spawn"]
+    assert [t["txid"] for t in get_marked_txes(scan_provider, deck.id)] == ["card2", "card1", "card3"]
+    assert scan_provider.getblockcount() == 3 # other calls go to the provider
+
+def test_p2th_filter():
+    p2th_filter = P2THFilter.from_decks("tppc", [deck])
+    assert len(p2th_filter) == 2
+    # hash160 read from the script hex; the addresses field is not used in this case.
+    vout = {"scriptPubKey" : {"hex" : p2pkh_hex(deck.p2th_address), "addresses" : [OTHER]}}
+    assert p2th_filter.match_output(vout) == (deck.p2th_address, deck.id)
+    # P2SH script with the same hash is not a P2TH output
+    p2sh = {"scriptPubKey" : {"hex" : "a914" + address_hash160(deck.p2th_address).hex() + "87"}}
+    assert p2th_filter.match_output(p2sh) is None
+    assert p2th_filter.match_output({"scriptPubKey" : {"addresses" : [deck.p2th_address]}}) == (deck.p2th_address, deck.id)
+    assert p2th_filter.match_output({"scriptPubKey" : {"asm" : "OP_RETURN 00"}}) is None
+    assert p2th_filter.match(tx("x", OTHER, deck.p2th_address, deck.p2th_address)) == {deck.p2th_address : deck.id}
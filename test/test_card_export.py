@@ -0,0 +1,67 @@
+import json
+import os
+import pytest
+from pypeerassets.protocol import Deck, CardTransfer, DeckState, IssueMode
+from pypeerassets.card_export import CardExporter, export_cards, load_cards, load_deckstate
+
+
+ISSUER = "mxfu9BNbsaECVVBRiqzavcvp6xhB2cz9r8"
+ALICE = "miHhMLaMWubq4Wx6SdTEqZcUHEGp8RKMZt"
+BOB = "mvfR2sSxAfmDaGgPcmdsTwPqzS6R9nM5Bo"
+
+deck = Deck(name="export_test", number_of_decimals=2, issue_mode=IssueMode.MULTI.value, network="tppc",
+            production=True, version=1, issuer=ISSUER, id="ab" * 32)
+
+
+def card(n, sender, receiver, amount, **kwargs):
+    return CardTransfer(deck=deck, receiver=[receiver], amount=[amount], txid="{:064x}".format(n), sender=sender,
+                        blockhash="block{}".format(n), blocknum=n, blockseq=0, cardseq=0, **kwargs)
+
+@pytest.fixture
+def cards():
+    return [card(1, ISSUER, ALICE, 1000),
+            card(2, ALICE, BOB, 300, locktime=100, lockhash=b"\x01" * 19 + b"\x00", lockhash_type=2),
+            card(3, BOB, ISSUER, 50),
+            card(4, ISSUER, BOB, 2 ** 63 + 1)]
+
+@pytest.fixture(params=["parquet", "npy"])
+def fmt(request):
+    pytest.importorskip("pyarrow" if request.param == "parquet" else "numpy")
+    return request.param
+
+def test_roundtrip(tmp_path, cards, fmt):
+    meta = export_cards(cards, str(tmp_path), deck, chunk_size=3, fmt=fmt)
+    assert (meta["chunks"], meta["rows"]) == (2, 4)
+
+    loaded = list(load_cards(str(tmp_path)))
+    fields = ("txid", "blockhash", "blocknum", "blockseq", "cardseq", "sender", "receiver", "amount", "type", "cid", "network")
+    assert [[getattr(c, f) for f in fields] for c in loaded] == [[getattr(c, f) for f in fields] for c in cards]
+    assert (loaded[1].locktime, loaded[1].lockhash, loaded[1].lockhash_type) == (100, b"\x01" * 19 + b"\x00", 2)
+    assert not loaded[0].locktime and not hasattr(loaded[0], "lockhash")
+
+def test_load_deckstate(tmp_path, cards, fmt):
+    with CardExporter(str(tmp_path), deck, chunk_size=2, fmt=fmt) as exporter:
+        for c in cards:
+            exporter.write([c])
+
+    expected = DeckState(cards)
+    state = load_deckstate(str(tmp_path))
+    assert state.balances == expected.balances
+    assert state.locks == expected.locks
+    assert [c.txid for c in state.valid_cards] == [c.txid for c in expected.valid_cards]
+
+def test_empty_export(tmp_path, fmt):
+    export_cards([], str(tmp_path), deck, fmt=fmt)
+    assert list(load_cards(str(tmp_path))) == []
+
+def test_npy_dictionary(tmp_path, cards):
+    # only the addresses and types are dictionary-encoded, the hashes are stored in the chunks.
+    pytest.importorskip("numpy")
+    meta = export_cards(cards, str(tmp_path), deck, chunk_size=3, fmt="npy")
+    assert set(meta["strings"]) == {ISSUER, ALICE, BOB} | {c.type for c in cards}
+    with open(os.path.join(str(tmp_path), "meta.json")) as metafile:
+        assert json.load(metafile)["strings"] == meta["strings"]
+
+    import numpy
+    txids = numpy.load(os.path.join(str(tmp_path), "txid_0.npy"))
+    assert txids.dtype == numpy.dtype("S64")
@@ -0,0 +1,107 @@
+import pytest
+from pypeerassets.protocol import Deck, CardTransfer, IssueMode
+from pypeerassets.indexer import DeckIndexer
+
+
+ISSUER = "mj2yy9HzC9HTeUFFwgnwsxkWeBtjVsTbYq"
+ALICE = "n2KSiC1wfqpYNZA1j6pjsKWDrMQjr8KmBs"
+BOB = "mpmH4J9BzWGFcGm3nGmrr5ncwxNrXhg4HS"
+
+
+class ScriptedProvider:
+    """Fake provider with a scripted chain. Blocks can be added and replaced to simulate reorgs."""
+
+    network = "tppc"
+
+    def __init__(self):
+        self.chain = [] # list of (blockhash, txids)
+        self.txes = {}
+        self.forks = 0
+
+    def add_tx(self, tx_json):
+        self.txes.update({tx_json["txid"] : tx_json})
+
+    def mine(self, txids=[]):
+        height = len(self.chain)
+        self.chain.append(("block{}-{}".format(height, self.forks), list(txids)))
+
+    def reorg(self, fork_height):
+        # drops all blocks after fork_height. New blocks get different hashes.
+        self.forks += 1
+        del self.chain[fork_height + 1:]
+
+    def getblockcount(self):
+        return len(self.chain) - 1
+
+    def getblockhash(self, height):
+        return self.chain[height][0]
+
+    def getblock(self, blockhash):
+        for height, (bhash, txids) in enumerate(self.chain):
+            if bhash == blockhash:
+                previous = self.chain[height - 1][0] if height > 0 else None
+                return {"hash" : bhash, "height" : height, "tx" : txids, "previousblockhash" : previous}
+
+    def getrawtransaction(self, txid, verbose=1):
+        return self.txes[txid]
+
+
+deck = Deck(name="indexer_test", number_of_decimals=2, issue_mode=IssueMode.MULTI.value, network="tppc",
+            production=True, version=1, issuer=ISSUER, id="ab" * 32)
+
+
+def card_tx(provider, txid, sender, receiver, amount):
+    # adds a card transaction and the transaction funding it (which determines the sender).
+    provider.add_tx({"txid" : txid + "_in", "vout" : [{"n" : 0, "value" : 1, "scriptPubKey" : {"addresses" : [sender]}}]})
+    metainfo = CardTransfer(deck=deck, receiver=[receiver], amount=[amount]).metainfo_to_protobuf
+    provider.add_tx({"txid" : txid,
+                     "time" : 0,
+                     "vin" : [{"txid" : txid + "_in", "vout" : 0}],
+                     "vout" : [{"n" : 0, "value" : 0.01, "scriptPubKey" : {"addresses" : [deck.p2th_address]}},
+                               {"n" : 1, "value" : 0, "scriptPubKey" : {"asm" : "OP_RETURN " + metainfo.hex()}},
+                               {"n" : 2, "value" : 0, "scriptPubKey" : {"addresses" : [receiver]}}]})
+    return txid
+
+@pytest.fixture
+def provider():
+    provider = ScriptedProvider()
+    provider.add_tx({"txid" : "other", "vin" : [], "vout" : [{"n" : 0, "scriptPubKey" : {"addresses" : [BOB]}}]})
+    provider.mine()
+    provider.mine([card_tx(provider, "issue", ISSUER, ALICE, 1000), "other"])
+    return provider
+
+def test_incremental_sync(provider):
+    indexer = DeckIndexer(provider, [deck], start_height=0)
+    assert indexer.sync() == 1
+    assert indexer.get_balances(deck.id) == {ALICE : 1000}
+    state = indexer.get_deckstate(deck.id)
+
+    provider.mine([card_tx(provider, "transfer", ALICE, BOB, 300)])
+    assert indexer.sync() == 2
+    assert indexer.get_deckstate(deck.id) is state # updated, not recalculated
+    assert indexer.get_balances(deck.id) == {ALICE : 700, BOB : 300}
+    assert [c.txid for c in indexer.get_cards(deck.id, min_height=2)] == ["transfer"]
+
+def test_reorg_rollback(provider):
+    indexer = DeckIndexer(provider, [deck], start_height=0)
+    provider.mine([card_tx(provider, "transfer", ALICE, BOB, 300)])
+    provider.mine()
+    indexer.sync()
+    assert indexer.get_balance(deck.id, BOB) == 300
+
+    # the transfer is replaced by another one in the new chain, which is longer.
+    provider.reorg(1)
+    provider.mine([card_tx(provider, "transfer2", ALICE, BOB, 100)])
+    provider.mine()
+    provider.mine()
+    assert indexer.sync() == 4
+    assert indexer.get_balances(deck.id) == {ALICE : 900, BOB : 100}
+    assert indexer.block_hashes[2] == provider.getblockhash(2)
+
+def test_reorg_to_shorter_chain(provider):
+    indexer = DeckIndexer(provider, [deck], start_height=0)
+    provider.mine([card_tx(provider, "transfer", ALICE, BOB, 300)])
+    indexer.sync()
+    provider.reorg(1)
+    assert indexer.sync() == 1
+    assert indexer.get_balances(deck.id) == {ALICE : 1000}
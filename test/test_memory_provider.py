@@ -0,0 +1,82 @@
+import pytest
+import pypeerassets as pa
+from pypeerassets.provider import MemoryProvider, ProviderRecorder
+from pypeerassets.chain_generator import ChainGenerator, generate_chain
+
+
+@pytest.fixture(scope="module")
+def chain():
+    return generate_chain(n_transfers=300, n_proposals=2, n_at_donations=10, lock_ratio=0.2, transfers_per_block=30)
+
+
+def valid_balances(provider, deck_id):
+    deck = pa.find_deck(provider, deck_id, 1)
+    state = pa.DeckState(pa.find_all_valid_cards(provider, deck))
+    return {address : balance for address, balance in state.balances.items() if balance != 0}
+
+
+@pytest.mark.parametrize("deck_name", ["pa", "at", "sdp", "dt"])
+def test_generated_cards_are_valid(chain, deck_name):
+    # the generator only creates valid cards, so the parsed balances must match its bookkeeping.
+    generator, decks = chain
+    deck_id = decks[deck_name].id
+    expected = {address : balance for address, balance in generator.balances[deck_id].items() if balance != 0}
+
+    assert len(expected) > 0
+    assert valid_balances(generator.provider, deck_id) == expected
+
+
+def test_dt_rewards(chain):
+    generator, decks = chain
+    proposals = generator.proposals[decks["dt"].id]
+
+    assert len(proposals) == 2
+    for proposal in proposals:
+        assert all(donation["reward"] > 0 for donation in proposal["donations"])
+        assert proposal["proposer_reward"] > 0
+
+
+def test_deterministic(transfer_chain):
+    (first, deck), (second, deck) = [transfer_chain(7, "det", 20, n_holders=5) for i in range(2)]
+
+    assert first.provider.block_hashes == second.provider.block_hashes
+    assert list(first.provider.txes) == list(second.provider.txes)
+    assert list(ChainGenerator(seed=8).provider.txes) != list(first.provider.txes)
+
+
+def test_listtransactions_conventions(chain):
+    generator, decks = chain
+    provider = generator.provider
+    deck = decks["pa"]
+
+    txids = provider.listtransactions(deck.p2th_address)
+    entries = provider.listtransactions(account=deck.id, many=10, since=5)
+
+    assert provider.listtransactions(deck.id) == txids
+    assert [e["txid"] for e in entries] == txids[5:15]
+    assert all(e["address"] == deck.p2th_address and "blockindex" in e for e in entries)
+
+
+def test_save_load(chain, tmp_path):
+    generator, decks = chain
+    path = str(tmp_path / "chain.json")
+    generator.provider.save(path)
+    provider = MemoryProvider.load(path)
+
+    assert provider.getblockcount() == generator.provider.getblockcount()
+    assert valid_balances(provider, decks["pa"].id) == valid_balances(generator.provider, decks["pa"].id)
+
+
+def test_recorder_replay(chain, tmp_path):
+    generator, decks = chain
+    deck_id = decks["at"].id
+    recorder = ProviderRecorder(generator.provider)
+    expected = valid_balances(generator.provider, deck_id)
+    recorder.stop()
+
+    path = str(tmp_path / "recorded.json")
+    recorder.save(path)
+    provider = MemoryProvider.load(path)
+
+    assert len(provider.txes) < len(generator.provider.txes)
+    assert valid_balances(provider, deck_id) == expected
@@ -0,0 +1,81 @@
+import pytest
+from collections import Counter
+from pypeerassets.protocol import Deck, CardTransfer, IssueMode
+from pypeerassets.__main__ import find_all_valid_cards, find_all_valid_cards_multi, get_deckstates
+from pypeerassets.blockscan import BlockScan, BlockScanProvider, get_watched_addresses
+
+
+ISSUER = "mxfu9BNbsaECVVBRiqzavcvp6xhB2cz9r8"
+ALICE = "miHhMLaMWubq4Wx6SdTEqZcUHEGp8RKMZt"
+BOB = "mvfR2sSxAfmDaGgPcmdsTwPqzS6R9nM5Bo"
+
+decks = [Deck(name="deck{}".format(n), number_of_decimals=2, issue_mode=IssueMode.MULTI.value, network="tppc",
+              production=True, version=1, issuer=ISSUER, id=c * 64) for n, c in enumerate("abc")]
+
+
+class CountingProvider:
+    """Fake provider counting the calls to getblock and getrawtransaction."""
+
+    network = "tppc"
+
+    def __init__(self):
+        self.blocks = [] # list of lists of txids
+        self.txes = {}
+        self.calls = Counter()
+
+    def mine(self, txes):
+        for tx in txes:
+            tx.update({"blockhash" : "block{}".format(len(self.blocks)), "confirmations" : 1, "time" : 0})
+            self.txes.update({tx["txid"] : tx})
+        self.blocks.append([tx["txid"] for tx in txes])
+
+    def getblockcount(self):
+        return len(self.blocks) - 1
+
+    def getblockhash(self, height):
+        return "block{}".format(height)
+
+    def getblock(self, blockhash, decode=True):
+        self.calls["getblock"] += 1
+        height = int(blockhash[5:])
+        return {"height" : height, "tx" : self.blocks[height]}
+
+    def getrawtransaction(self, txid, verbose=1):
+        self.calls["getrawtransaction"] += 1
+        return self.txes[txid]
+
+
+def card_tx(txid, deck, receiver, amount, funding_txid="funding"):
+    metainfo = CardTransfer(deck=deck, receiver=[receiver], amount=[amount]).metainfo_to_protobuf
+    return {"txid" : txid,
+            "vin" : [{"txid" : funding_txid, "vout" : 0}],
+            "vout" : [{"n" : 0, "value" : 0.01, "scriptPubKey" : {"addresses" : [deck.p2th_address]}},
+                      {"n" : 1, "value" : 0, "scriptPubKey" : {"asm" : "OP_RETURN " + metainfo.hex()}},
+                      {"n" : 2, "value" : 0, "scriptPubKey" : {"addresses" : [receiver]}}]}
+
+@pytest.fixture
+def provider():
+    provider = CountingProvider()
+    provider.mine([{"txid" : "funding", "vin" : [], "vout" : [{"n" : 0, "value" : 1, "scriptPubKey" : {"addresses" : [ISSUER]}}]}])
+    # all issuances are in the same block and have the same sender.
+    provider.mine([card_tx("issue{}".format(n), deck, ALICE, 100 * (n + 1)) for n, deck in enumerate(decks)])
+    provider.mine([card_tx("issue_bob", decks[0], BOB, 5)])
+    block_scan = BlockScan(provider, get_watched_addresses("tppc", decks))
+    block_scan.scan(0)
+    provider.calls.clear()
+    return BlockScanProvider(provider, block_scan)
+
+def test_same_cards_as_single_deck_parsing(provider):
+    valid_cards = find_all_valid_cards_multi(provider, decks)
+    for deck in decks:
+        assert [c.txid for c in valid_cards[deck.id]] == [c.txid for c in find_all_valid_cards(provider, deck)]
+
+def test_lookups_shared(provider):
+    find_all_valid_cards_multi(provider, decks)
+    # one lookup per block and one for the shared sender tx
+    assert provider.calls == {"getblock" : 2, "getrawtransaction" : 1}
+
+def test_get_deckstates(provider):
+    states = get_deckstates(provider, decks)
+    assert states[decks[0].id].balances == {ALICE : 100, BOB : 5}
+    assert states[decks[2].id].balances == {ALICE : 300}
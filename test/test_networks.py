@@ -1,7 +1,7 @@
 import pytest
 
 from pypeerassets.exceptions import UnsupportedNetwork
-from pypeerassets.networks import net_query
+from pypeerassets.networks import net_query, networks
 
 
 def test_net_query():
@@ -18,3 +18,14 @@ def test_net_query():
     # Try to find a network we don't know about.
     with pytest.raises(UnsupportedNetwork):
         net_query("not a network name we know of.")
+
+
+def test_net_query_resolved():
+    "Resolved NetworkParams are passed through, unknown objects are rejected."
+
+    for net_params in networks:
+        assert net_query(net_params) is net_params
+        assert net_query(net_params.name) is net_query(net_params.shortname) is net_params
+
+    with pytest.raises(UnsupportedNetwork):
+        net_query(None)
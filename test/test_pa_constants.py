@@ -1,6 +1,7 @@
 import pytest
 
 from pypeerassets.exceptions import UnsupportedNetwork
+from pypeerassets.networks import net_query
 from pypeerassets.pa_constants import param_query
 
 
@@ -18,3 +19,9 @@ def test_param_query():
     # Try to find a network we don't know about.
     with pytest.raises(UnsupportedNetwork):
         param_query("not a network name we know")
+
+
+def test_param_query_network_params():
+    "PAParams can be found with the resolved NetworkParams of a network."
+
+    assert param_query(net_query("slimcoin-testnet")) is param_query("tslm")
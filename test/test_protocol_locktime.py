@@ -3,7 +3,9 @@ import random
 import itertools
 from pypeerassets import Kutil
 from pypeerassets.protocol import (CardTransfer, Deck, IssueMode,
-                                   validate_card_issue_modes, DeckState)
+                                   validate_card_issue_modes, DeckState,
+                                   calc_lock_address, _cached_lock_address)
+from pypeerassets.networks import net_query
 from pypeerassets.exceptions import OverSizeOPReturn, InvalidCardIssue
 
 # note: CardLocks are of type CardTransfer.
@@ -319,3 +321,23 @@ def test_deck_state_with_locktime():
     assert receiver_roster[1] not in state.locks
     assert len(state.locks[lock_address_roster[1]]) == 1
     assert state.locks[lock_address_roster[1]][0]["locktime"] == 100
+    # the lock address is calculated when the lock is added.
+    assert state.locks[lock_address_roster[1]][0]["lock_address"] == lock_address_roster[3]
+
+
+def test_calc_lock_address_cache():
+
+    lockhash = bytes.fromhex('418bc8cbe0ffd20cc7cf0caaa98f6e58d90e1d59')
+    lock = {"lockhash" : lockhash, "lockhash_type" : 2}
+    address = calc_lock_address(lock, "tslm")
+
+    hits = _cached_lock_address.cache_info().hits
+    assert address == 'mmVXfumjbbra6j8H26wRQEZA4u9dEHQNwN'
+    assert calc_lock_address(lock, net_query("tslm")) == address
+    assert _cached_lock_address.cache_info().hits == hits + 1
+    # bytearray lockhashes are converted, so they use the same cache entry.
+    assert calc_lock_address({"lockhash" : bytearray(lockhash), "lockhash_type" : 2}, "tslm") == address
+    assert _cached_lock_address.cache_info().hits == hits + 2
+    # errors inside the address calculation are not hidden.
+    with pytest.raises(TypeError):
+        calc_lock_address({"lockhash" : "ab" * 20, "lockhash_type" : 2}, "tslm") # hex string instead of bytes
@@ -0,0 +1,72 @@
+import logging
+import pytest
+import pypeerassets as pa
+from pypeerassets.protocol import DeckState, CardBundle
+from pypeerassets.pautils import card_bundle_parser
+
+
+@pytest.fixture(scope="module")
+def lock_cards(transfer_chain):
+    generator, deck = transfer_chain(5, "logging", 60, n_addresses=30, transfers_per_block=10, n_holders=5, lock_ratio=0.5)
+    return generator, deck, list(pa.find_all_valid_cards(generator.provider, deck))
+
+
+def test_no_debug_records_by_default(lock_cards, caplog, capsys):
+    generator, deck, cards = lock_cards
+    with caplog.at_level(logging.INFO):
+        state = DeckState(cards)
+
+    assert state.debug is False
+    assert caplog.records == []
+    assert capsys.readouterr().out == ""
+
+
+def test_debug_records(lock_cards, caplog):
+    generator, deck, cards = lock_cards
+    caplog.set_level(logging.DEBUG, logger="pypeerassets.protocol")
+    debug_state = DeckState(cards)
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert debug_state.debug is True
+    assert any(m.startswith("CardLock:") for m in messages)
+    assert any(m.startswith("Current locks at block") for m in messages)
+    # the debug output doesn't change the result.
+    assert debug_state.balances == DeckState(cards).balances
+
+
+def test_debug_flag(lock_cards, caplog):
+    # debug=True enables the debug records (printed to stdout if logging is not configured) for this state only.
+    generator, deck, cards = lock_cards
+    logger = logging.getLogger("pypeerassets.protocol")
+    level, handlers = logger.level, list(logger.handlers)
+    enabled = []
+
+    class StateHandler(logging.Handler):
+        def emit(self, record):
+            enabled.append(logger.isEnabledFor(logging.DEBUG))
+
+    handler = StateHandler()
+    logger.addHandler(handler)
+    try:
+        DeckState(cards, debug=True)
+    finally:
+        logger.removeHandler(handler)
+
+    assert any(r.getMessage().startswith("CardTransfer: blocknum") for r in caplog.records)
+    # the logger is not modified while the records are emitted, so other threads don't get them.
+    assert enabled and not any(enabled)
+    assert (logger.level, logger.handlers) == (level, handlers)
+
+    caplog.clear()
+    assert DeckState(cards).debug is False
+    assert caplog.records == []
+
+
+def test_card_bundle_parser_logs_invalid_bundles(lock_cards, caplog):
+    generator, deck, cards = lock_cards
+    caplog.set_level(logging.DEBUG, logger="pypeerassets.pautils")
+    bundle = CardBundle(deck=deck, sender=deck.issuer, txid="ab" * 32, blockhash=None, blocknum=0,
+                        blockseq=0, timestamp=0, tx_confirmations=0, vouts=[])
+
+    assert list(card_bundle_parser(bundle)) == []
+    assert caplog.records[0].getMessage().startswith("Invalid card bundle " + "ab" * 32)
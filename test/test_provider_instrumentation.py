@@ -0,0 +1,59 @@
+import pytest
+import pypeerassets as pa
+from pypeerassets.provider import MemoryProvider, ProviderInstrumentation, instrumented_run, format_report
+
+
+@pytest.fixture
+def small_chain(transfer_chain):
+    generator, deck = transfer_chain(3, "instrumented", 40, n_addresses=50, transfers_per_block=10, n_holders=5)
+    return generator.provider, deck
+
+
+def test_call_accounting(small_chain):
+    provider, deck = small_chain
+    blockhash = provider.getblockhash(1)
+
+    with ProviderInstrumentation(provider) as instrumentation:
+        provider.getblock(blockhash)
+        provider.getblock(blockhash)
+        provider.getblockhash(2)
+        report = instrumentation.report()
+
+    assert report["methods"]["getblock"]["calls"] == 2
+    assert report["methods"]["getblock"]["duplicates"] == 1
+    assert report["methods"]["getblockhash"]["duplicates"] == 0
+    assert sum(report["methods"]["getblock"]["histogram"].values()) == 2
+    assert report["calls"] == 3
+    # stop() restores the original methods.
+    assert "getblock" not in provider.__dict__
+
+
+def test_batch_requests_are_counted():
+
+    class BatchProvider(MemoryProvider):
+        def batch(self, reqs):
+            return [{"result" : getattr(self, method)(*params)} for (method, params) in reqs]
+
+    provider = BatchProvider()
+    provider.add_block([{"txid" : "aa" * 32, "vin" : [], "vout" : []}])
+
+    with ProviderInstrumentation(provider) as instrumentation:
+        provider.batch([("getrawtransaction", ["aa" * 32, 1])])
+        provider.getrawtransaction("aa" * 32, 1)
+        report = instrumentation.report()
+
+    # the direct call repeats the batched request; the nested call of the batch is counted too.
+    assert report["methods"]["batch"]["calls"] == 1
+    assert report["methods"]["getrawtransaction"]["batched"] == 1
+    assert report["methods"]["getrawtransaction"]["calls"] == 2
+    assert report["methods"]["getrawtransaction"]["duplicates"] == 2
+
+
+def test_instrumented_run(small_chain):
+    provider, deck = small_chain
+    cards, report = instrumented_run(provider, pa.find_all_valid_cards, provider, deck)
+
+    assert len(cards) == len(list(pa.find_all_valid_cards(provider, deck)))
+    assert report["methods"]["getrawtransaction"]["calls"] > 0
+    assert report["methods"]["listtransactions"]["calls"] == 1
+    assert "getrawtransaction" in format_report(report)
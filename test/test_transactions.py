@@ -74,11 +74,11 @@ def test_peercoin_tx_unhexilify():
 def test_calculate_transaction_fee(tx_size):
 
     if tx_size == 181:
-        assert calculate_tx_fee(tx_size) == Decimal(0.00181)
+        assert calculate_tx_fee(tx_size) == Decimal("0.00181")
     if tx_size == 311:
-        assert calculate_tx_fee(tx_size) == Decimal(0.00311)
+        assert calculate_tx_fee(tx_size) == Decimal("0.00311")
     if tx_size == 3903:
-        assert calculate_tx_fee(tx_size) == Decimal(0.03903)
+        assert calculate_tx_fee(tx_size) == Decimal("0.03903")
 
 
 @pytest.mark.parametrize("network", ['peercoin'])
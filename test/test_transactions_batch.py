@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.provider import MemoryProvider, ProviderInstrumentation
+from pypeerassets.transactions import (
+    prefetch_parent_outputs,
+    sign_transaction,
+    sign_transactions,
+)
+
+
+class BatchMemoryProvider(MemoryProvider):
+    '''MemoryProvider with the batch method of RpcNode.'''
+
+    def batch(self, reqs: list) -> list:
+        return [{"result" : getattr(self, method)(*params)} for (method, params) in reqs]
+
+
+@pytest.fixture(scope="module")
+def chain(funded_chain):
+    return funded_chain(3, "batch", "batch_signing", 6, Decimal(1), provider_class=BatchMemoryProvider)
+
+
+def card_transfers(generator, deck, key, number):
+
+    utxos = generator.provider.listunspent(key.address)
+    unsigned_txes = []
+    for i in range(number):
+        card = pa.CardTransfer(deck=deck, receiver=[generator.addresses[i]], amount=[1])
+        inputs = {"utxos" : generator.provider.select_inputs(key.address, Decimal(6))["utxos"][i:i + 1],
+                  "total" : Decimal(1)}
+        unsigned_txes.append(pa.card_transfer(generator.provider, card, inputs, key.address))
+    return unsigned_txes, utxos
+
+
+def test_prefetch_parent_outputs(chain):
+    generator, deck, key = chain
+    unsigned_txes, utxos = card_transfers(generator, deck, key, 3)
+    txids = set(tx.ins[0].txid for tx in unsigned_txes)
+
+    with ProviderInstrumentation(generator.provider) as instrumentation:
+        parent_outputs = prefetch_parent_outputs(generator.provider, unsigned_txes)
+        report = instrumentation.report()
+
+    assert report["methods"]["batch"]["calls"] == 1
+    assert report["methods"]["getrawtransaction"]["batched"] == len(txids)
+    assert set(parent_outputs.keys()) == set((tx.ins[0].txid, tx.ins[0].txout) for tx in unsigned_txes)
+
+    # with the UTXOs from listunspent no lookup is needed.
+    with ProviderInstrumentation(generator.provider) as instrumentation:
+        from_utxos = prefetch_parent_outputs(generator.provider, unsigned_txes, utxos=utxos)
+        assert instrumentation.report()["calls"] == 0
+
+    for outpoint, txout in parent_outputs.items():
+        assert from_utxos[outpoint].to_json() == txout.to_json()
+
+
+def test_prefetch_parent_outputs_batch_errors(chain, monkeypatch):
+    # a parent missing in the batch (e.g. pruned) is retrieved again when signing.
+    generator, deck, key = chain
+    unsigned_txes, utxos = card_transfers(generator, deck, key, 3)
+    missing = unsigned_txes[0].ins[0]
+    batch = generator.provider.batch
+
+    def batch_with_error(reqs):
+        return [{"result" : None, "error" : {"code" : -5, "message" : "No such transaction"}}
+                if params[0] == missing.txid else r for (method, params), r in zip(reqs, batch(reqs))]
+
+    monkeypatch.setattr(generator.provider, "batch", batch_with_error)
+    parent_outputs = prefetch_parent_outputs(generator.provider, unsigned_txes)
+    assert (missing.txid, missing.txout) not in parent_outputs
+    assert len(parent_outputs) == 2
+
+    signed = sign_transactions(generator.provider, unsigned_txes, key)
+    assert [tx.hexlify() for tx in signed] == [sign_transaction(generator.provider, tx, key).hexlify() for tx in unsigned_txes]
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_sign_transactions(chain, max_workers):
+    generator, deck, key = chain
+    unsigned_txes, utxos = card_transfers(generator, deck, key, 3)
+
+    signed = sign_transactions(generator.provider, unsigned_txes, key, max_workers=max_workers)
+
+    assert all(len(tx.ins) == 1 for tx in signed)
+    assert [tx.hexlify() for tx in signed] == [sign_transaction(generator.provider, tx, key).hexlify() for tx in unsigned_txes]
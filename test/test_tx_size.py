@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+import pytest
+
+import pypeerassets as pa
+import pypeerassets.at.dt_misc_utils as mu
+from pypeerassets.exceptions import OverSizeOPReturn
+from pypeerassets.networks import net_query
+from pypeerassets.provider import UtxoSet, UtxoCache
+from pypeerassets.transactions import (
+    estimate_tx_fee,
+    estimate_tx_size,
+    sign_transaction,
+    varint_size,
+)
+
+
+@pytest.fixture
+def chain(funded_chain):
+    generator, sdp_deck, key = funded_chain(11, "sdp", "tx_size", 40, Decimal("0.02"))
+    dt_deck = generator.spawn_dt_deck("dt", sdp_deck)
+    generator.mine()
+    return generator, sdp_deck, dt_deck, key
+
+
+@pytest.mark.parametrize("number, size", [(0, 1), (252, 1), (253, 3), (0xffff, 3), (0x10000, 5)])
+def test_varint_size(number, size):
+    assert varint_size(number) == size
+
+
+@pytest.mark.parametrize("tx_size, fee", [(250, 10000), (999, 10000), (1000, 20000), (4238, 50000)])
+def test_estimate_tx_fee(tx_size, fee):
+    # min_tx_fee (0.01 tppc) per started kB, in satoshis.
+    assert estimate_tx_fee(tx_size, "tppc") == fee
+
+
+@pytest.mark.parametrize("n_inputs", [1, 3, 10])
+def test_estimate_tx_size(chain, n_inputs):
+    generator, deck, dt_deck, key = chain
+    card = pa.CardTransfer(deck=deck, receiver=generator.addresses[:5], amount=[1] * 5)
+    inputs = generator.provider.select_inputs(key.address, Decimal("0.02") * n_inputs)
+    unsigned = pa.card_transfer(generator.provider, card, inputs, key.address)
+    signed = sign_transaction(generator.provider, unsigned, key)
+
+    estimate = estimate_tx_size("tppc", ["p2pkh"] * n_inputs, unsigned.outs)
+    # the estimate assumes signatures of the maximum size.
+    assert 0 <= estimate - len(signed.serialize()) <= 2 * n_inputs
+
+
+def test_pack_card_transfers(chain):
+    generator, deck, dt_deck, key = chain
+    receivers = generator.addresses[:200]
+    amounts = list(range(1, 201))
+
+    cards = pa.pack_card_transfers(generator.provider, deck, receivers, amounts)
+
+    assert 1 < len(cards) < 10
+    assert [r for card in cards for r in card.receiver] == receivers
+    assert [a for card in cards for a in card.amount] == amounts
+    assert all(len(card.metainfo_to_protobuf) <= net_query("tppc").op_return_max_bytes for card in cards)
+
+    # a further receiver doesn't fit into the first CardTransfer.
+    with pytest.raises(OverSizeOPReturn):
+        pa.CardTransfer(deck=deck, receiver=receivers[:len(cards[0].receiver) + 1],
+                        amount=amounts[:len(cards[0].receiver) + 1]).metainfo_to_protobuf
+
+    # the packed transfers can be built with the size-dependent fee.
+    txes = pa.bulk_card_transfer(generator.provider, cards, UtxoSet(generator.provider, key.address))
+    assert len(txes) == len(cards)
+
+
+@pytest.mark.parametrize("max_tx_size", [400, 600])
+def test_pack_card_transfers_max_tx_size(chain, max_tx_size):
+    generator, deck, dt_deck, key = chain
+    receivers = generator.addresses[:30]
+
+    class CountingProvider(type(generator.provider)):
+        # counts the lookups of the network, which is a RPC call with RpcNode.
+        lookups = 0
+
+        @property
+        def network(self):
+            CountingProvider.lookups += 1
+            return super().network
+
+    provider = CountingProvider(network="tppc")
+    cards = pa.pack_card_transfers(provider, deck, receivers, [1] * len(receivers), max_tx_size=max_tx_size)
+    assert CountingProvider.lookups == 1
+
+    # bulk_card_transfer looks up the network once, also when the transactions are signed.
+    provider.__dict__.update(generator.provider.__dict__)
+    utxo_set = UtxoSet(provider, key.address)
+    CountingProvider.lookups = 0
+    assert len(pa.bulk_card_transfer(provider, cards[:3], utxo_set, key=key)) == 3
+    assert CountingProvider.lookups == 1
+
+    def tx_size(receivers):
+        card = pa.CardTransfer(deck=deck, receiver=receivers, amount=[1] * len(receivers))
+        inputs = {"utxos" : generator.provider.select_inputs(key.address, Decimal("0.02"))["utxos"], "total" : Decimal("0.02")}
+        return estimate_tx_size("tppc", ["p2pkh"], pa.card_transfer(generator.provider, card, inputs, key.address).outs)
+
+    assert [r for card in cards for r in card.receiver] == receivers
+    # each CardTransfer is as large as possible.
+    for card in cards[:-1]:
+        n = len(card.receiver)
+        start = receivers.index(card.receiver[0])
+        assert tx_size(card.receiver) <= max_tx_size < tx_size(receivers[start:start + n + 1])
+
+
+def test_create_unsigned_tx_size_fee(chain):
+    # 28 inputs of 0.02 coins are needed, so the transaction is over 4 kB and needs a fee of 0.05 coins.
+    generator, deck, dt_deck, key = chain
+    unsigned = mu.create_unsigned_tx(dt_deck, generator.provider, "signalling", "tppc", input_address=key.address,
+                                     address=generator.addresses[0], amount=500000, data=b"signalling")
+    signed = sign_transaction(generator.provider, unsigned, key)
+
+    input_value = 20000 * len(unsigned.ins)
+    fee = input_value - sum(o.value for o in unsigned.outs)
+    assert fee == estimate_tx_fee(len(signed.serialize()), "tppc") == 50000
+
+    with pytest.raises(Exception, match="fee too low"):
+        mu.create_unsigned_tx(dt_deck, generator.provider, "signalling", "tppc", input_address=key.address,
+                              address=generator.addresses[0], amount=500000, data=b"signalling", tx_fee=10000)
+
+
+def test_create_unsigned_tx_fee_passes_with_utxo_cache(chain):
+    # the first selection (with the fee of 1 input) is too small, so the inputs are selected again.
+    generator, deck, dt_deck, key = chain
+    tx_args = dict(input_address=key.address, address=generator.addresses[0], amount=500000, data=b"signalling")
+
+    with UtxoCache(generator.provider) as cache:
+        first = mu.create_unsigned_tx(dt_deck, generator.provider, "signalling", "tppc", **tx_args)
+        assert cache.utxo_set(key.address).reserved == set()
+        # nothing is left reserved, so the same transaction can be built again.
+        second = mu.create_unsigned_tx(dt_deck, generator.provider, "signalling", "tppc", **tx_args)
+
+    assert len(first.ins) == 28
+    assert first.hexlify() == second.hexlify()
@@ -0,0 +1,168 @@
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pypeerassets as pa
+from pypeerassets.exceptions import InsufficientFunds
+from pypeerassets.provider import UtxoSet, UtxoCache, ProviderInstrumentation
+from pypeerassets.provider.utxoset import (
+    normalize_utxo,
+    select_by_confirmations,
+    select_largest_first,
+    select_branch_and_bound,
+)
+from pypeerassets.transactions import sign_transaction
+
+
+@pytest.fixture
+def chain(funded_chain):
+    return funded_chain(5, "bulk", "bulk_transfer", 3, Decimal(1))
+
+
+def cards(generator, deck, number):
+    return [pa.CardTransfer(deck=deck, receiver=[generator.addresses[i]], amount=[10]) for i in range(number)]
+
+
+def test_normalize_utxo():
+
+    explorer_utxo = {"tx_hash" : "ab" * 32, "tx_ouput_n" : 1, "value" : "150000000", "script" : "76a9", "confirmations" : 3}
+    assert normalize_utxo(explorer_utxo) == {"txid" : "ab" * 32, "vout" : 1, "amount" : Decimal("1.5"),
+                                             "scriptPubKey" : "76a9", "confirmations" : 3}
+
+
+def test_reservation(chain):
+    generator, deck, key = chain
+    utxo_set = UtxoSet(generator.provider, key.address)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        selections = list(executor.map(lambda i: utxo_set.select(Decimal("0.5")), range(3)))
+
+    outpoints = [(i.txid, i.txout) for s in selections for i in s["utxos"]]
+    assert len(set(outpoints)) == 3
+    assert utxo_set.available() == []
+
+    with pytest.raises(InsufficientFunds):
+        utxo_set.select(Decimal("0.5"))
+
+    utxo_set.release(selections[0]["utxos"])
+    assert utxo_set.balance == Decimal(1)
+
+
+def test_bulk_card_transfer_unsigned(chain):
+    generator, deck, key = chain
+    utxo_set = UtxoSet(generator.provider, key.address)
+
+    txes = pa.bulk_card_transfer(generator.provider, cards(generator, deck, 3), utxo_set)
+    assert len(txes) == 3
+    assert len(set((tx.ins[0].txid, tx.ins[0].txout) for tx in txes)) == 3
+
+    # without key the change outputs can't be chained, so all reservations of the failed call are released.
+    utxo_set.release([i for tx in txes for i in tx.ins])
+    with pytest.raises(InsufficientFunds):
+        pa.bulk_card_transfer(generator.provider, cards(generator, deck, 4), utxo_set)
+    assert len(utxo_set.available()) == 3
+
+
+def test_bulk_card_transfer_chained(chain):
+    generator, deck, key = chain
+    utxo_set = UtxoSet(generator.provider, key.address)
+
+    txes = pa.bulk_card_transfer(generator.provider, cards(generator, deck, 5), utxo_set, key=key)
+    txids = [tx.txid for tx in txes]
+    inputs = [(i.txid, i.txout) for tx in txes for i in tx.ins]
+
+    assert len(set(inputs)) == len(inputs)
+    # the confirmed UTXOs are spent first, then the change outputs of the first transactions.
+    assert all(txid not in txids for (txid, n) in inputs[:3])
+    assert all(txid in txids[:3] for (txid, n) in inputs[3:])
+    assert all(len(i.script_sig.hexlify()) > 0 for tx in txes for i in tx.ins)
+
+
+def test_bulk_card_transfer_chained_rollback(chain):
+    generator, deck, key = chain
+    utxo_set = UtxoSet(generator.provider, key.address)
+    outpoints = set(utxo_set.utxos.keys())
+    invalid_card = cards(generator, deck, 1)[0]
+    invalid_card.deck_p2th = None
+
+    with pytest.raises(Exception, match="deck_p2th"):
+        pa.bulk_card_transfer(generator.provider, cards(generator, deck, 4) + [invalid_card], utxo_set, key=key)
+
+    # the change outputs of the transactions which were not returned are removed again.
+    assert set(utxo_set.utxos.keys()) == outpoints
+    assert utxo_set.reserved == set()
+
+
+def utxo(amount, confirmations=1, n=0):
+    return {"txid" : "{:064x}".format(n), "vout" : 0, "amount" : Decimal(amount), "confirmations" : confirmations}
+
+
+def test_selection_strategies():
+
+    utxos = [utxo("0.5", 1, 0), utxo("3", 2, 1), utxo("1.2", 3, 2), utxo("0.8", 4, 3)]
+
+    assert [u["amount"] for u in select_by_confirmations(utxos, Decimal(2))] == [Decimal("0.5"), Decimal(3)]
+    assert [u["amount"] for u in select_largest_first(utxos, Decimal(2))] == [Decimal(3)]
+    assert sum(u["amount"] for u in select_branch_and_bound(utxos, Decimal(2))) == Decimal(2)
+    # no exact match: fallback to the default strategy.
+    assert select_branch_and_bound(utxos, Decimal("2.1")) == select_by_confirmations(utxos, Decimal("2.1"))
+
+    with pytest.raises(InsufficientFunds):
+        select_largest_first(utxos, Decimal(6))
+
+
+def test_utxo_cache(chain):
+    generator, deck, key = chain
+    provider = generator.provider
+    card = cards(generator, deck, 1)[0]
+
+    with ProviderInstrumentation(provider) as instrumentation, UtxoCache(provider, strategy="largest_first") as cache:
+        unsigned = pa.card_transfer(provider, card, provider.select_inputs(key.address, Decimal("0.5")), key.address)
+        signed = sign_transaction(provider, unsigned, key)
+        change = (signed.txid, len(signed.outs) - 1)
+
+        # the sent transaction spends the selected UTXO and adds its change output as unconfirmed UTXO.
+        provider.sendrawtransaction(signed.hexlify())
+        utxo_set = cache.utxo_set(key.address)
+        assert (signed.ins[0].txid, signed.ins[0].txout) not in utxo_set.utxos
+        assert utxo_set.utxos[change]["confirmations"] == 0
+        # the confirmed UTXOs are selected first.
+        assert change not in [(i.txid, i.txout) for i in provider.select_inputs(key.address, Decimal(2))["utxos"]]
+
+        generator.mine()
+        assert cache.utxo_set(key.address).utxos[change]["confirmations"] == 1
+        assert instrumentation.report()["methods"]["listunspent"]["calls"] == 1
+
+    assert "select_inputs" not in provider.__dict__
+
+
+def test_utxo_cache_select_inputs_does_not_reserve(chain):
+    generator, deck, key = chain
+
+    with UtxoCache(generator.provider) as cache:
+        first = generator.provider.select_inputs(key.address, Decimal("0.5"))
+        second = generator.provider.select_inputs(key.address, Decimal("0.5"))
+
+        assert [(i.txid, i.txout) for i in first["utxos"]] == [(i.txid, i.txout) for i in second["utxos"]]
+        assert cache.utxo_set(key.address).reserved == set()
+
+
+def test_stacked_wrappers(chain):
+    generator, deck, key = chain
+    provider = generator.provider
+
+    instrumentation = ProviderInstrumentation(provider, methods=("select_inputs", "getblockcount"))
+    cache = UtxoCache(provider)
+    provider.select_inputs(key.address, Decimal("0.5"))
+    assert "select_inputs" not in instrumentation.report()["methods"] # replaced by the cache
+
+    # the instrumentation of select_inputs is below the cache, so it can't be removed first.
+    with pytest.raises(RuntimeError):
+        instrumentation.stop()
+
+    cache.stop()
+    provider.select_inputs(key.address, Decimal("0.5"))
+    assert instrumentation.report()["methods"]["select_inputs"]["calls"] == 1
+    instrumentation.stop()
+    assert "select_inputs" not in provider.__dict__ and "getblockcount" not in provider.__dict__